@@ -0,0 +1,217 @@
+from datetime import datetime, timezone
+import json
+import math
+import platform
+import re
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Callable
+
+from compiler.tokenizer import tokenize, tokenize_stream
+from compiler.parser import parse
+from compiler.interpreter import interpret, engines
+
+from benchmarks.generator import ProgramShape, generate_program
+
+usage = """Usage:
+    python -m benchmarks run [--output=FILE] [--repeat=N] [--engines=tree,vm,...]
+    python -m benchmarks scaling [--output=FILE] [--max-size=SIZE] [--repeat=N]
+    python -m benchmarks compare BASELINE RESULTS [--threshold=0.1]
+"""
+
+cases = {
+    "default": ProgramShape(),
+    "deep_expressions": ProgramShape(depth=40),
+    "deep_blocks": ProgramShape(nesting=30),
+    "long_loops": ProgramShape(size=5_000, trip_count=2_000),
+    "large": ProgramShape(size=1_000_000, trip_count=1),
+}
+
+scaling_sizes = [10 ** e for e in range(3, 9)]
+
+# Scaling exponents above this are reported as superlinear.
+superlinear_exponent = 1.25
+# Phases faster than this are too noisy for a scaling exponent.
+min_scaling_seconds = 0.005
+
+Result = dict[str, Any]
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def result(seconds: float, size: int, shape: ProgramShape) -> Result:
+    return {
+        "seconds": seconds,
+        "bytes": size,
+        "mb_per_second": size / seconds / 1e6 if seconds > 0 else None,
+        "shape": asdict(shape),
+    }
+
+
+def run_cases(repeat: int, selected_engines: list[str]) -> dict[str, Result]:
+    results: dict[str, Result] = {}
+    for (name, shape) in cases.items():
+        source = generate_program(shape)
+        tokens = tokenize(source)
+        ast = parse(tokens)
+        results[f"{name}/tokenize"] = result(
+            best_time(lambda: tokenize(source), repeat), len(source), shape)
+        results[f"{name}/parse"] = result(
+            best_time(lambda: parse(tokens), repeat), len(source), shape)
+        for engine in selected_engines:
+            results[f"{name}/interpret/{engine}"] = result(
+                best_time(lambda: interpret(ast, engine), repeat),
+                len(source), shape)
+        for key in results:
+            if key.startswith(f"{name}/"):
+                print(format_result(key, results[key]), flush=True)
+    return results
+
+
+def run_scaling(max_size: int, repeat: int) -> dict[str, Result]:
+    """Tokenize and parse time for sources from 1 KB up to max_size.
+
+    Tokens are streamed rather than collected, so that memory use stays
+    proportional to the AST."""
+    results: dict[str, Result] = {}
+    previous: dict[str, tuple[int, float]] = {}
+    for size in scaling_sizes:
+        if size > max_size:
+            break
+        shape = ProgramShape(size=size, trip_count=1)
+        source = generate_program(shape)
+        phases: dict[str, Callable[[], object]] = {
+            "tokenize": lambda: sum(1 for _ in tokenize_stream(source)),
+            "parse": lambda: parse(tokenize_stream(source)),
+        }
+        for (phase, fn) in phases.items():
+            key = f"scaling/{phase}/{size}"
+            results[key] = result(best_time(fn, repeat), len(source), shape)
+            if phase in previous:
+                (previous_size, previous_seconds) = previous[phase]
+                seconds = results[key]["seconds"]
+                if previous_seconds >= min_scaling_seconds:
+                    exponent = (math.log(seconds / previous_seconds)
+                                / math.log(len(source) / previous_size))
+                    results[key]["exponent"] = exponent
+                    results[key]["superlinear"] = exponent > superlinear_exponent
+            previous[phase] = (len(source), results[key]["seconds"])
+            print(format_result(key, results[key]), flush=True)
+    return results
+
+
+def format_result(key: str, r: Result) -> str:
+    line = f"{key:<40} {r['seconds'] * 1000:>12.3f} ms"
+    if r.get("mb_per_second") is not None:
+        line += f" {r['mb_per_second']:>10.3f} MB/s"
+    if "exponent" in r:
+        line += f"   exponent {r['exponent']:.2f}"
+        if r["superlinear"]:
+            line += "  SUPERLINEAR"
+    return line
+
+
+def compare(baseline: dict[str, Result], current: dict[str, Result],
+            threshold: float) -> list[str]:
+    """Print the change of every result in both files and return the keys
+    of those that got slower by more than threshold."""
+    regressions = []
+    for (key, r) in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if base.get("shape") != r.get("shape"):
+            print(f"{key:<40} skipped: generated program differs")
+            continue
+        ratio = r["seconds"] / base["seconds"]
+        status = ""
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            status = "improved"
+        print(f"{key:<40} {base['seconds'] * 1000:>12.3f} ms "
+              f"-> {r['seconds'] * 1000:>12.3f} ms {ratio:>7.2f}x  {status}")
+    return regressions
+
+
+def parse_size(text: str) -> int:
+    m = re.fullmatch(r'(\d+)([KMG]?)B?', text.upper())
+    if m is None:
+        raise Exception(f"Invalid size: {text}")
+    return int(m[1]) * {"": 1, "K": 10 ** 3, "M": 10 ** 6, "G": 10 ** 9}[m[2]]
+
+
+def write_results(results: dict[str, Result], output_file: str | None) -> None:
+    if output_file is None:
+        return
+    document = {
+        "python": platform.python_version(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    with open(output_file, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def read_results(file_name: str) -> dict[str, Result]:
+    with open(file_name) as f:
+        results: dict[str, Result] = json.load(f)["results"]
+    return results
+
+
+def main() -> int:
+    command: str | None = None
+    files: list[str] = []
+    output_file: str | None = None
+    repeat = 3
+    selected_engines = list(engines)
+    max_size = 10 ** 7
+    threshold = 0.1
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
+            output_file = m[1]
+        elif (m := re.fullmatch(r'--repeat=(.+)', arg)) is not None:
+            repeat = int(m[1])
+        elif (m := re.fullmatch(r'--engines=(.+)', arg)) is not None:
+            selected_engines = m[1].split(",")
+        elif (m := re.fullmatch(r'--max-size=(.+)', arg)) is not None:
+            max_size = parse_size(m[1])
+        elif (m := re.fullmatch(r'--threshold=(.+)', arg)) is not None:
+            threshold = float(m[1])
+        elif arg.startswith('-'):
+            raise Exception(f"Unknown argument: {arg}")
+        elif command is None:
+            command = arg
+        else:
+            files.append(arg)
+
+    if command == "run":
+        write_results(run_cases(repeat, selected_engines), output_file)
+    elif command == "scaling":
+        results = run_scaling(max_size, repeat)
+        write_results(results, output_file)
+        if any(r.get("superlinear") for r in results.values()):
+            return 1
+    elif command == "compare" and len(files) == 2:
+        regressions = compare(
+            read_results(files[0]), read_results(files[1]), threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions")
+            return 1
+    else:
+        print(usage, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
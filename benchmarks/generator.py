@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+import random
+
+
+@dataclass
+class ProgramShape:
+    """Parameters of a generated program.
+
+    - size: approximate length of the source code in bytes
+    - depth: number of operators in the generated expressions
+    - trip_count: number of iterations of every loop
+    - nesting: number of blocks nested inside each other around the code
+      that runs before every loop"""
+    size: int = 10_000
+    depth: int = 4
+    trip_count: int = 10
+    nesting: int = 2
+    seed: int = 0
+
+
+# Loop variables are kept small so that deep expressions stay cheap.
+modulus = 1000003
+
+
+class Generator:
+    def __init__(self, shape: ProgramShape) -> None:
+        self.shape = shape
+        self.rng = random.Random(shape.seed)
+        self.counter = 0
+
+    def name(self, prefix: str) -> str:
+        # Identifiers cannot contain the digit 0, so number them in letters.
+        self.counter += 1
+        n = self.counter
+        letters = ""
+        while n > 0:
+            n, digit = divmod(n - 1, 26)
+            letters = chr(ord("a") + digit) + letters
+        return f"{prefix}_{letters}"
+
+    def int_expression(self, variables: list[str], depth: int) -> str:
+        """An int expression with depth operators.
+
+        Every operator has a leaf on one side, so the size of the expression
+        grows linearly with depth. Multiplication and division only ever
+        involve small literals, and division never divides by zero."""
+        rng = self.rng
+        if depth == 0:
+            if variables and rng.random() < 0.6:
+                return rng.choice(variables)
+            return str(rng.randint(0, 99))
+        inner = self.int_expression(variables, depth - 1)
+        op = rng.choice(["+", "-", "*", "/", "%", "+", "-"])
+        if op in ["*", "/", "%"]:
+            leaf = str(rng.randint(1, 9))
+        else:
+            leaf = self.int_expression(variables, 0)
+        if rng.random() < 0.5 or op in ["/", "%"]:
+            return f"({inner}) {op} {leaf}"
+        return f"{leaf} {op} ({inner})"
+
+    def bool_expression(self, variables: list[str], depth: int) -> str:
+        rng = self.rng
+        comparison = rng.choice(["<", ">", "<=", ">=", "==", "!="])
+        half = max(0, depth // 2)
+        result = (f"{self.int_expression(variables, half)} {comparison} "
+                  f"{self.int_expression(variables, half)}")
+        if rng.random() < 0.3:
+            result = f"not ({result})"
+        if rng.random() < 0.3:
+            connective = rng.choice(["and", "or"])
+            result = f"{result} {connective} {rng.choice(['true', 'false'])}"
+        return result
+
+    def unit(self) -> str:
+        """Some declarations and nested blocks followed by a loop.
+
+        Loops are never nested in other loops, so running a unit takes time
+        proportional to trip_count times the size of the loop body."""
+        shape = self.shape
+        total = self.name("v")
+        variables = [total]
+        lines = [f"var {total} = {self.int_expression([], shape.depth)};"]
+
+        inner_indent = ""
+        for _ in range(shape.nesting):
+            lines.append(f"{inner_indent}{{")
+            inner_indent += "    "
+            local = self.name("a")
+            lines.append(f"{inner_indent}var {local} = "
+                         f"{self.int_expression(variables, shape.depth)};")
+            variables.append(local)
+        lines.append(
+            f"{inner_indent}if {self.bool_expression(variables, shape.depth)} "
+            f"then {total} = ({total} + {self.int_expression(variables, shape.depth)}) % {modulus} "
+            f"else {total} = {total} - 1;")
+        for _ in range(shape.nesting):
+            inner_indent = inner_indent[:-4]
+            lines.append(f"{inner_indent}}}")
+
+        counter = self.name("i")
+        expression = self.int_expression([total, counter], shape.depth)
+        lines += [
+            f"var {counter} = 0;",
+            f"while {counter} < {shape.trip_count} do {{",
+            f"    {total} = ({total} + {expression}) % {modulus};",
+            f"    {counter} = {counter} + 1;",
+            "}",
+            f"checksum = (checksum + {total}) % {modulus};",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+# Largest source generated unit by unit; bigger ones repeat a chunk.
+chunk_size = 1 << 20
+
+
+def generate_program(shape: ProgramShape) -> str:
+    """A valid program of roughly shape.size bytes that prints nothing.
+
+    Sources up to a megabyte evaluate to a checksum of all the values they
+    computed. Bigger ones repeat such a source, each copy in its own block
+    so that its declarations do not clash with the other copies, and
+    evaluate to 0."""
+    generator = Generator(shape)
+    if shape.size > chunk_size:
+        chunk = generate_program(ProgramShape(
+            chunk_size, shape.depth, shape.trip_count, shape.nesting,
+            shape.seed))
+        block = "{\n" + chunk + "};\n"
+        parts = [block] * max(1, round(shape.size / len(block)))
+        return "".join(parts) + "0\n"
+    parts = ["var checksum = 0;\n"]
+    length = 0
+    while length < shape.size:
+        unit = generator.unit()
+        parts.append(unit)
+        length += len(unit)
+    return "".join(parts) + "checksum\n"
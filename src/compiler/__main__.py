@@ -1,50 +1,137 @@
-from base64 import b64encode
+import ast as py_ast
 import json
+import os
 import re
 import sys
-from socketserver import ForkingTCPServer, StreamRequestHandler
-from traceback import format_exception
-from typing import Any
+import time
+from contextlib import ExitStack
+from dataclasses import replace
+from typing import Callable
+
+from compiler.tokenizer import tokenize, tokenize_stream
+from compiler.parser import parse
+from compiler.ast import Expression
+from compiler.optimizer import optimize
+from compiler.typechecker import typecheck
+from compiler.interpreter import Limits, interpret
+from compiler.bytecode import Bytecode, compile_bytecode, run_bytecode
+from compiler.codegen import generate_assembly
+from compiler.ir import format_ir, generate_ir
+from compiler.transpiler import (
+    code_from_bytes, code_to_bytes, compile_python, run_python, transpile)
+from compiler.assembler import assemble
+from compiler.cache import CompileCache, DEFAULT_MAX_BYTES
+from compiler.console import Console, read_ints, use_console
+from compiler.batch import compile_batch, expand_inputs, format_result, read_manifest
+from compiler.server import run_server, run_prefork_server, run_async_server
+from compiler.stats import phase
+from compiler.profiler import Profiler
 
 
 def call_compiler(source_code: str, input_file_name: str) -> bytes:
-    # *** TODO ***
-    # Call your compiler here and return the compiled executable.
-    # Raise an exception on compilation error.
-    #
     # The input file name is informational only: you can optionally include in your source locations and error messages,
     # or you can ignore it.
-    # *** TODO ***
-    raise NotImplementedError("Compiler not implemented")
+    with phase("tokenize") as p:
+        tokens = p.output = tokenize(source_code)
+    with phase("parse") as p:
+        ast = p.output = parse(tokens)
+    with phase("typecheck"):
+        typecheck(ast)
+    with phase("optimize") as p:
+        ast = p.output = optimize(ast)
+    with phase("codegen") as p:
+        assembly = p.output = generate_assembly(ast)
+    with phase("assemble"):
+        return assemble(assembly)
 
 
 def main() -> int:
     # === Option parsing ===
     command: str | None = None
-    input_file: str | None = None
+    input_files: list[str] = []
     output_file: str | None = None
+    output_dir: str | None = None
+    manifest: str | None = None
+    jobs = os.cpu_count() or 1
     host = "127.0.0.1"
     port = 3000
+    engine = "tree"
+    optimize_ast = True
+    typecheck_ast = True
+    workers = 0
+    use_asyncio = False
+    unix_socket: str | None = None
+    cache_dir: str | None = None
+    profile_format: str | None = None
+    cache_size = DEFAULT_MAX_BYTES
+    inputs_file: str | None = None
+    flush_lines: int | None = None
+    record_file: str | None = None
+    limits: Limits | None = None
     for arg in sys.argv[1:]:
         if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
             output_file = m[1]
+        elif (m := re.fullmatch(r'--output-dir=(.+)', arg)) is not None:
+            output_dir = m[1]
+        elif (m := re.fullmatch(r'--manifest=(.+)', arg)) is not None:
+            manifest = m[1]
+        elif (m := re.fullmatch(r'--jobs=(.+)', arg)) is not None:
+            jobs = int(m[1])
         elif (m := re.fullmatch(r'--host=(.+)', arg)) is not None:
             host = m[1]
         elif (m := re.fullmatch(r'--port=(.+)', arg)) is not None:
             port = int(m[1])
+        elif (m := re.fullmatch(r'--engine=(.+)', arg)) is not None:
+            engine = m[1]
+        elif (m := re.fullmatch(r'--workers=(.+)', arg)) is not None:
+            workers = int(m[1])
+        elif (m := re.fullmatch(r'--unix-socket=(.+)', arg)) is not None:
+            unix_socket = m[1]
+        elif (m := re.fullmatch(r'--cache-dir=(.+)', arg)) is not None:
+            cache_dir = m[1]
+        elif (m := re.fullmatch(r'--cache-size=(.+)', arg)) is not None:
+            cache_size = int(m[1])
+        elif (m := re.fullmatch(r'--input=(.+)', arg)) is not None:
+            inputs_file = m[1]
+        elif (m := re.fullmatch(r'--flush-lines=(.+)', arg)) is not None:
+            flush_lines = int(m[1])
+        elif (m := re.fullmatch(r'--record=(.+)', arg)) is not None:
+            record_file = m[1]
+        elif (m := re.fullmatch(r'--max-steps=(.+)', arg)) is not None:
+            limits = replace(limits or Limits(), max_steps=int(m[1]))
+        elif (m := re.fullmatch(r'--max-seconds=(.+)', arg)) is not None:
+            limits = replace(limits or Limits(), max_seconds=float(m[1]))
+        elif (m := re.fullmatch(r'--max-int-bits=(.+)', arg)) is not None:
+            limits = replace(limits or Limits(), max_int_bits=int(m[1]))
+        elif (m := re.fullmatch(r'--max-scope-depth=(.+)', arg)) is not None:
+            limits = replace(limits or Limits(), max_scope_depth=int(m[1]))
+        elif arg == '--profile':
+            profile_format = 'text'
+        elif (m := re.fullmatch(r'--profile=(text|json)', arg)) is not None:
+            profile_format = m[1]
+        elif arg == '--async':
+            use_asyncio = True
+        elif arg == '--no-optimize':
+            optimize_ast = False
+        elif arg == '--no-typecheck':
+            typecheck_ast = False
         elif arg.startswith('-'):
             raise Exception(f"Unknown argument: {arg}")
         elif command is None:
             command = arg
-        elif input_file is None:
-            input_file = arg
         else:
-            raise Exception("Multiple input files not supported")
+            input_files.append(arg)
 
     if command is None:
         print(f"Error: command argument missing", file=sys.stderr)
         return 1
 
+    batch = command == 'compile' and (
+        output_dir is not None or manifest is not None or len(input_files) > 1)
+    if len(input_files) > 1 and not batch:
+        raise Exception("Multiple input files not supported")
+    input_file = input_files[0] if input_files else None
+
     def read_source_code() -> str:
         if input_file is not None:
             with open(input_file) as f:
@@ -52,53 +139,161 @@ def main() -> int:
         else:
             return sys.stdin.read()
 
-    # === Command implementations ===
+    def read_ast() -> Expression:
+        if profile_format is not None:
+            # Tokenize up front to profile tokenizing and parsing separately.
+            with phase("tokenize") as p:
+                tokens = p.output = tokenize(read_source_code())
+            with phase("parse") as p:
+                ast = p.output = parse(tokens)
+        elif input_file is not None:
+            with open(input_file) as f:
+                ast = parse(tokenize_stream(f))
+        else:
+            ast = parse(tokenize_stream(sys.stdin))
+        if typecheck_ast:
+            with phase("typecheck"):
+                typecheck(ast)
+        if optimize_ast:
+            with phase("optimize") as p:
+                ast = p.output = optimize(ast)
+        return ast
 
-    if command == 'compile':
-        source_code = read_source_code()
-        if output_file is None:
-            raise Exception("Output file flag --output=... required")
-        executable = call_compiler(source_code, input_file or '(source code)')
-        with open(output_file, 'wb') as f:
-            f.write(executable)
-    elif command == 'serve':
-        try:
-            run_server(host, port)
-        except KeyboardInterrupt:
-            pass
-    else:
-        print(f"Error: unknown command: {command}", file=sys.stderr)
-        return 1
-    return 0
+    def run_program(name: str, run: Callable[[], int | bool | None]) -> None:
+        """Run a program with the console that the flags ask for and print
+        its value."""
+        record: list[int] = []
+        with ExitStack() as stack:
+            inputs = None
+            if inputs_file == '-':
+                inputs = read_ints(sys.stdin)
+            elif inputs_file is not None:
+                inputs = read_ints(stack.enter_context(open(inputs_file)))
+            if record_file is not None:
+                # Also record the inputs of a run that fails.
+                stack.callback(write_record, record_file, record)
+            console = Console(sys.stdout if flush_lines is not None else None,
+                              inputs, flush_lines or 0,
+                              record if record_file is not None else None)
+            with use_console(console), phase(name):
+                result = run()
+        if result is not None:
+            print(result)
 
+    def write_record(path: str, record: list[int]) -> None:
+        with open(path, 'w') as f:
+            f.writelines(f"{value}\n" for value in record)
 
-def run_server(host: str, port: int) -> None:
-    class Server(ForkingTCPServer):
-        allow_reuse_address = True
-        request_queue_size = 32
+    cache: CompileCache | None = None
+    if cache_dir is not None:
+        cache = CompileCache(cache_dir, cache_size)
 
-    class Handler(StreamRequestHandler):
-        def handle(self) -> None:
-            result: dict[str, Any] = {}
+    # === Command implementations ===
+
+    def run_command() -> int:
+        if batch:
+            patterns = list(input_files)
+            if manifest is not None:
+                patterns += read_manifest(manifest)
+            if output_dir is None:
+                raise Exception("Output directory flag --output-dir=... required")
+            inputs = expand_inputs(patterns)
+            start = time.perf_counter()
+            failed = 0
+            for batch_result in compile_batch(
+                    inputs, output_dir, call_compiler, jobs, cache):
+                print(format_result(batch_result))
+                if batch_result.error is not None:
+                    failed += 1
+            print(f"{len(inputs) - failed} succeeded, {failed} failed "
+                  f"in {time.perf_counter() - start:.2f} s")
+            return 1 if failed else 0
+        elif command == 'compile':
+            source_code = read_source_code()
+            if output_file is None:
+                raise Exception("Output file flag --output=... required")
+            input_file_name = input_file or '(source code)'
+            if cache is not None:
+                executable = cache.get_or_compile(
+                    source_code, lambda s: call_compiler(s, input_file_name))
+            else:
+                executable = call_compiler(source_code, input_file_name)
+            with open(output_file, 'wb') as f:
+                f.write(executable)
+        elif command == 'interpret':
+            ast = read_ast()
+            run_program("interpret", lambda: interpret(ast, engine, limits))
+        elif command == 'bytecode':
+            if output_file is None:
+                raise Exception("Output file flag --output=... required")
+            ast = read_ast()
+            with phase("codegen") as p:
+                bytecode = p.output = compile_bytecode(ast)
+            with open(output_file, 'wb') as f:
+                f.write(bytecode.to_bytes())
+        elif command == 'ir':
+            ast = read_ast()
+            with phase("ir") as p:
+                function = p.output = generate_ir(ast)
+            print(format_ir(function), end="")
+        elif command == 'transpile':
+            ast = read_ast()
+            if output_file is None:
+                with phase("codegen") as p:
+                    module = p.output = transpile(ast)
+                print(py_ast.unparse(module))
+            else:
+                with phase("codegen") as p:
+                    code = p.output = compile_python(ast)
+                with open(output_file, 'wb') as f:
+                    f.write(code_to_bytes(code))
+        elif command == 'run-python':
+            if input_file is None:
+                raise Exception("Input file required for run-python")
+            with open(input_file, 'rb') as code_file:
+                code = code_from_bytes(code_file.read())
+            run_program("run", lambda: run_python(code))
+        elif command == 'run-bytecode':
+            if input_file is None:
+                raise Exception("Input file required for run-bytecode")
+            with open(input_file, 'rb') as bytecode_file:
+                bytecode = Bytecode.from_bytes(bytecode_file.read())
+            run_program("run", lambda: run_bytecode(bytecode))
+        elif command == 'serve':
             try:
-                input_str = self.rfile.read().decode()
-                input = json.loads(input_str)
-                if input["command"] == "compile":
-                    source_code = input["code"]
-                    executable = call_compiler(source_code, "(source code)")
-                    result["program"] = b64encode(executable).decode()
-                elif input["command"] == "ping":
-                    pass
+                def compile(source_code: str) -> bytes:
+                    return call_compiler(source_code, "(source code)")
+                if use_asyncio:
+                    run_async_server(host, port, compile,
+                                     workers or os.cpu_count() or 1,
+                                     unix_socket, cache)
+                elif workers > 0:
+                    run_prefork_server(
+                        host, port, compile, workers, unix_socket, cache)
+                elif unix_socket is not None:
+                    raise Exception("--unix-socket requires --workers=N")
                 else:
-                    result["error"] = "Unknown command: " + input['command']
-            except Exception as e:
-                result["error"] = "".join(format_exception(e))
-            result_str = json.dumps(result)
-            self.request.sendall(str.encode(result_str))
-
-    print(f"Starting TCP server at {host}:{port}")
-    with Server((host, port), Handler) as server:
-        server.serve_forever()
+                    run_server(host, port, compile, cache)
+            except KeyboardInterrupt:
+                pass
+        else:
+            print(f"Error: unknown command: {command}", file=sys.stderr)
+            return 1
+        return 0
+
+    if profile_format is None:
+        return run_command()
+    if batch or command == 'serve':
+        raise Exception(f"--profile is not supported for {command}")
+    profiler = Profiler()
+    try:
+        with profiler:
+            return run_command()
+    finally:
+        if profile_format == 'json':
+            print(json.dumps(profiler.to_json()), file=sys.stderr)
+        else:
+            print(profiler.report(), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,193 @@
+from array import array
+from sys import intern
+from compiler.ast import *
+from compiler.location import Loc, NO_LOC
+
+# Node kinds
+UNIT = 0
+LITERAL = 1
+IDENTIFIER = 2
+BINARY_OP = 3
+UNARY_OP = 4
+IF_BLOCK = 5
+WHILE = 6
+FUNCTION_CALL = 7
+BLOCK = 8
+VAR_DECLARATION = 9
+
+
+class Arena:
+    """An AST stored as index-linked records in typed arrays.
+
+    Node i has kind kinds[i] and up to three integer fields a[i], b[i] and
+    c[i], whose meaning depends on the kind:
+
+    - LITERAL: a = index into values
+    - IDENTIFIER: a = index into strings
+    - BINARY_OP: a = left node, b = operator (index into strings), c = right node
+    - UNARY_OP: a = operator (index into strings), b = target node
+    - IF_BLOCK: a = condition, b = then, c = else node or -1
+    - WHILE: a = condition, b = action
+    - FUNCTION_CALL: a = name (index into strings), b and c = start and length
+      of the argument nodes in children
+    - BLOCK: b and c = start and length of the expression nodes in children
+    - VAR_DECLARATION: a = name (index into strings), b = value node
+
+    Children always have a larger index than their parent and node 0 is the
+    root. Locations are kept in the lines and columns arrays, unless they
+    have been stripped, in which case both are empty and unpacked nodes get
+    NO_LOC."""
+
+    def __init__(self, keep_locations: bool = True) -> None:
+        self.kinds = array("B")
+        self.a = array("i")
+        self.b = array("i")
+        self.c = array("i")
+        self.children = array("i")
+        self.values: list[int | bool] = []
+        self.strings: list[str] = []
+        self.keep_locations = keep_locations
+        self.lines = array("i")
+        self.columns = array("i")
+        self._string_indices: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def string(self, s: str) -> int:
+        if s not in self._string_indices:
+            self._string_indices[s] = len(self.strings)
+            self.strings.append(intern(s))
+        return self._string_indices[s]
+
+    def loc(self, index: int) -> Loc:
+        if not self.keep_locations:
+            return NO_LOC
+        return Loc(self.lines[index], self.columns[index])
+
+    def strip_locations(self) -> None:
+        self.keep_locations = False
+        self.lines = array("i")
+        self.columns = array("i")
+
+    def nbytes(self) -> int:
+        """Approximate size of the arrays, excluding values and strings."""
+        arrays = [self.kinds, self.a, self.b, self.c, self.children,
+                  self.lines, self.columns]
+        return sum(len(a) * a.itemsize for a in arrays)
+
+
+def pack(ast: Expression, keep_locations: bool = True) -> Arena:
+    arena = Arena(keep_locations)
+    pending: list[Expression] = []
+
+    def allocate(node: Expression) -> int:
+        index = len(arena.kinds)
+        arena.kinds.append(UNIT)
+        arena.a.append(-1)
+        arena.b.append(-1)
+        arena.c.append(-1)
+        if keep_locations:
+            arena.lines.append(node.loc.line)
+            arena.columns.append(node.loc.column)
+        pending.append(node)
+        return index
+
+    def allocate_list(nodes: list[Expression]) -> int:
+        indices = [allocate(n) for n in nodes]
+        start = len(arena.children)
+        arena.children.extend(indices)
+        return start
+
+    allocate(ast)
+    index = 0
+    # Nodes are visited in allocation order, so pending[i] is node i.
+    while index < len(pending):
+        node = pending[index]
+        match node:
+            case Literal():
+                arena.kinds[index] = LITERAL
+                arena.a[index] = len(arena.values)
+                arena.values.append(node.value)
+            case Identifier():
+                arena.kinds[index] = IDENTIFIER
+                arena.a[index] = arena.string(node.name)
+            case BinaryOp():
+                arena.kinds[index] = BINARY_OP
+                arena.b[index] = arena.string(node.op)
+                arena.a[index] = allocate(node.left)
+                arena.c[index] = allocate(node.right)
+            case UnaryOp():
+                arena.kinds[index] = UNARY_OP
+                arena.a[index] = arena.string(node.op)
+                arena.b[index] = allocate(node.target)
+            case IfBlock():
+                arena.kinds[index] = IF_BLOCK
+                arena.a[index] = allocate(node.condition)
+                arena.b[index] = allocate(node.then)
+                if node.eelse is not None:
+                    arena.c[index] = allocate(node.eelse)
+            case While():
+                arena.kinds[index] = WHILE
+                arena.a[index] = allocate(node.condition)
+                arena.b[index] = allocate(node.action)
+            case FunctionCall():
+                arena.kinds[index] = FUNCTION_CALL
+                arena.a[index] = arena.string(node.name)
+                arena.b[index] = allocate_list(node.args)
+                arena.c[index] = len(node.args)
+            case Block():
+                arena.kinds[index] = BLOCK
+                arena.b[index] = allocate_list(node.expressions)
+                arena.c[index] = len(node.expressions)
+            case VarDeclaration():
+                arena.kinds[index] = VAR_DECLARATION
+                arena.a[index] = arena.string(node.name)
+                arena.b[index] = allocate(node.value)
+        index += 1
+    return arena
+
+
+def unpack(arena: Arena) -> Expression:
+    nodes: list[Expression | None] = [None] * len(arena)
+    kinds = arena.kinds
+    a = arena.a
+    b = arena.b
+    c = arena.c
+    strings = arena.strings
+    children = arena.children
+
+    def node(index: int) -> Expression:
+        result = nodes[index]
+        assert result is not None
+        return result
+
+    def node_list(start: int, length: int) -> list[Expression]:
+        return [node(i) for i in children[start:start + length]]
+
+    # Children come after their parents, so build the nodes back to front.
+    for i in reversed(range(len(arena))):
+        loc = arena.loc(i)
+        kind = kinds[i]
+        if kind == LITERAL:
+            nodes[i] = Literal(loc, arena.values[a[i]])
+        elif kind == IDENTIFIER:
+            nodes[i] = Identifier(loc, strings[a[i]])
+        elif kind == BINARY_OP:
+            nodes[i] = BinaryOp(loc, node(a[i]), strings[b[i]], node(c[i]))
+        elif kind == UNARY_OP:
+            nodes[i] = UnaryOp(loc, strings[a[i]], node(b[i]))
+        elif kind == IF_BLOCK:
+            nodes[i] = IfBlock(loc, node(a[i]), node(b[i]),
+                               node(c[i]) if c[i] >= 0 else None)
+        elif kind == WHILE:
+            nodes[i] = While(loc, node(a[i]), node(b[i]))
+        elif kind == FUNCTION_CALL:
+            nodes[i] = FunctionCall(loc, strings[a[i]], node_list(b[i], c[i]))
+        elif kind == BLOCK:
+            nodes[i] = Block(loc, node_list(b[i], c[i]))
+        elif kind == VAR_DECLARATION:
+            nodes[i] = VarDeclaration(loc, strings[a[i]], node(b[i]))
+        else:
+            nodes[i] = Expression(loc)
+    return node(0)
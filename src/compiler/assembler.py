@@ -0,0 +1,29 @@
+import os
+import subprocess
+import tempfile
+
+
+def assemble(assembly: str) -> bytes:
+    """Assemble and link a program with as and ld from GNU binutils.
+
+    The program must not need any libraries: the result is a static ELF
+    executable, returned as bytes."""
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "program.s")
+        obj = os.path.join(directory, "program.o")
+        executable = os.path.join(directory, "program")
+        with open(source, "w") as f:
+            f.write(assembly)
+        run_tool(["as", "--64", "-o", obj, source])
+        run_tool(["ld", "-static", "-o", executable, obj])
+        with open(executable, "rb") as f:
+            return f.read()
+
+
+def run_tool(command: list[str]) -> None:
+    try:
+        process = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise Exception(f"{command[0]} not found, is binutils installed?")
+    if process.returncode != 0:
+        raise Exception(f"{command[0]} failed:\n{process.stderr}")
@@ -1,61 +1,67 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from compiler.location import Loc
+from compiler.types import Type
 
 
-@dataclass
+@dataclass(slots=True)
 class Expression:
     loc: Loc
-    pass
+    # Type of the expression, filled in by the type checker.
+    type: Type | None = field(default=None, init=False, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expression):
     value: int | bool
 
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Expression):
     name: str
+    # Frame slot of the referenced variable, filled in by the resolver.
+    slot: int = field(default=-1, init=False, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expression):
     left: Expression
     op: str
     right: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     op: str
     target: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class IfBlock(Expression):
     condition: Expression
     then: Expression
     eelse: Expression | None
 
 
-@dataclass
+@dataclass(slots=True)
 class While(Expression):
     condition: Expression
     action: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(Expression):
     name: str
     args: list[Expression]
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(Expression):
     expressions: list[Expression]
 
 
-@dataclass
+@dataclass(slots=True)
 class VarDeclaration(Expression):
     name: str
     value: Expression
+    # Frame slot of the declared variable, filled in by the resolver.
+    slot: int = field(default=-1, init=False, compare=False, repr=False)
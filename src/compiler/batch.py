@@ -0,0 +1,129 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import glob
+import multiprocessing
+import os
+from pathlib import Path
+import time
+from typing import Callable, Iterable
+
+from compiler.cache import CompileCache
+
+# Compiles source code; the second argument is the input file name
+FileCompiler = Callable[[str, str], bytes]
+
+
+@dataclass
+class BatchResult:
+    input_file: str
+    output_file: str
+    seconds: float
+    error: str | None = None
+
+
+def read_manifest(manifest: str) -> list[str]:
+    """Input files and patterns listed in a manifest, one per line.
+
+    Blank lines and lines starting with # are ignored. Relative paths are
+    relative to the directory of the manifest."""
+    base = Path(manifest).parent
+    patterns = []
+    with open(manifest) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                patterns.append(str(base / line))
+    return patterns
+
+
+def expand_inputs(patterns: Iterable[str]) -> list[str]:
+    """Expand glob patterns, keeping the order and dropping duplicates.
+
+    A pattern without wildcards is kept even if the file does not exist, so
+    that it is reported as an error instead of silently skipped."""
+    inputs: dict[str, None] = {}
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    inputs[path] = None
+        else:
+            inputs[pattern] = None
+    return list(inputs)
+
+
+def output_files(inputs: list[str], output_dir: str) -> list[str]:
+    """One output file per input, named after the input without its suffix."""
+    outputs = [os.path.join(output_dir, Path(i).stem) for i in inputs]
+    seen: dict[str, str] = {}
+    for (input_file, output_file) in zip(inputs, outputs):
+        if output_file in seen:
+            raise Exception(f"{seen[output_file]} and {input_file} would both "
+                            f"be compiled to {output_file}")
+        seen[output_file] = input_file
+    return outputs
+
+
+# Set in every worker process when the pool starts
+_compile: FileCompiler | None = None
+_cache: CompileCache | None = None
+
+
+def _init_worker(compile: FileCompiler, cache: CompileCache | None) -> None:
+    global _compile, _cache
+    _compile = compile
+    _cache = cache
+
+
+def _compile_file(job: tuple[str, str]) -> BatchResult:
+    input_file, output_file = job
+    assert _compile is not None
+    compile = _compile
+    start = time.perf_counter()
+    try:
+        with open(input_file) as f:
+            source_code = f.read()
+        if _cache is not None:
+            executable = _cache.get_or_compile(
+                source_code, lambda s: compile(s, input_file))
+        else:
+            executable = compile(source_code, input_file)
+        with open(output_file, 'wb') as f:
+            f.write(executable)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        return BatchResult(input_file, output_file,
+                           time.perf_counter() - start, error)
+    return BatchResult(input_file, output_file, time.perf_counter() - start)
+
+
+def compile_batch(inputs: list[str], output_dir: str, compile: FileCompiler,
+                  jobs: int = 1,
+                  cache: CompileCache | None = None) -> Iterable[BatchResult]:
+    """Compile every input file into output_dir, yielding results in order.
+
+    With more than one job the files are compiled in a pool of forked
+    worker processes. A failing file does not stop the others."""
+    os.makedirs(output_dir, exist_ok=True)
+    batch = list(zip(inputs, output_files(inputs, output_dir)))
+    _init_worker(compile, cache)
+    if jobs <= 1 or len(batch) <= 1:
+        for job in batch:
+            yield _compile_file(job)
+        return
+    # Several files per task keeps the overhead low for many small inputs.
+    chunksize = max(1, min(64, len(batch) // (jobs * 4)))
+    with ProcessPoolExecutor(
+            jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(compile, cache)) as pool:
+        yield from pool.map(_compile_file, batch, chunksize=chunksize)
+
+
+def format_result(result: BatchResult) -> str:
+    ms = f"{result.seconds * 1000:8.1f} ms"
+    if result.error is None:
+        return f"ok    {ms}  {result.input_file} -> {result.output_file}"
+    first_line = result.error.splitlines()[0] if result.error else ""
+    return f"error {ms}  {result.input_file}: {first_line}"
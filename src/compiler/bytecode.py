@@ -0,0 +1,399 @@
+import marshal
+from array import array
+from dataclasses import dataclass, field
+from typing import Self
+from compiler.ast import *
+from compiler.console import current_console
+from compiler.location import Loc
+from compiler.resolver import resolve
+from compiler.operators import int_operators
+
+Value = int | bool | None
+
+# Every instruction takes two slots in the code array: opcode and argument.
+# Instructions that need no argument carry a zero.
+CONST = 0           # push consts[arg]
+NONE = 1            # push None
+POP = 2             # discard top of stack
+LOAD = 3            # push value of frame slot arg
+STORE = 4           # pop value, assign it to frame slot arg, push None
+DECLARE = 5         # pop value, initialize frame slot arg with it, push None
+JUMP = 6            # continue at instruction index arg
+JUMP_IF_FALSE = 7   # pop bool, jump to arg if it is false
+# The operators of BINARY.
+ADD = 8
+SUB = 9
+MUL = 10
+DIV = 11
+MOD = 12
+LT = 13
+GT = 14
+LE = 15
+GE = 16
+EQ = 17
+NE = 18
+JUMP_IF_FALSE_OR_POP = 19  # if top is false jump to arg, else pop it
+JUMP_IF_TRUE_OR_POP = 20   # if top is true jump to arg, else pop it
+NEG = 21
+NOT = 22
+PRINT = 23          # pop value, print it, push None
+READ_INT = 24       # push an int read from stdin
+ERROR = 25          # raise an exception with message consts[arg]
+CHECK_BOOL = 26     # fail unless top is a bool, consts[arg] is the operator
+BINARY = 27         # pop two values, push operator arg (ADD to NE) applied
+CHECK_INT = 28      # fail unless top is an int, consts[arg] is the operator
+CHECK_INT_BELOW = 29  # fail unless the value below top is an int, likewise
+
+binary_opcodes = {
+    "+": ADD,
+    "-": SUB,
+    "*": MUL,
+    "/": DIV,
+    "%": MOD,
+    "<": LT,
+    ">": GT,
+    "<=": LE,
+    ">=": GE,
+    "==": EQ,
+    "!=": NE,
+}
+
+short_circuit_opcodes = {
+    "and": JUMP_IF_FALSE_OR_POP,
+    "or": JUMP_IF_TRUE_OR_POP,
+}
+
+operator_symbols = {v: k for k, v in binary_opcodes.items()}
+operator_symbols.update({v: k for k, v in short_circuit_opcodes.items()})
+
+# Implementations of the binary opcodes, indexed by opcode.
+binary_functions = [int_operators.get(operator_symbols.get(op, ""))
+                    for op in range(NE + 1)]
+
+opcode_names = {
+    v: k for k, v in globals().items() if k.isupper() and isinstance(v, int)
+}
+
+MAGIC = b"HYBC"
+VERSION = 5
+
+
+@dataclass
+class Bytecode:
+    code: array = field(default_factory=lambda: array("q"))
+    consts: list[int | bool | str] = field(default_factory=list)
+    # Variable name of every frame slot, for disassembly.
+    names: list[str] = field(default_factory=list)
+    lines: array = field(default_factory=lambda: array("l"))
+    columns: array = field(default_factory=lambda: array("l"))
+
+    def loc(self, index: int) -> Loc:
+        return Loc(self.lines[index], self.columns[index])
+
+    def to_bytes(self) -> bytes:
+        return MAGIC + marshal.dumps((
+            VERSION,
+            self.code.tobytes(),
+            self.consts,
+            self.names,
+            self.lines.tobytes(),
+            self.columns.tobytes(),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Self:
+        if not data.startswith(MAGIC):
+            raise Exception("not a bytecode file")
+        (version, code, consts, names, lines, columns) = marshal.loads(
+            data[len(MAGIC):])
+        if version != VERSION:
+            raise Exception(f"unsupported bytecode version {version}")
+        result = cls(consts=consts, names=names)
+        result.code.frombytes(code)
+        result.lines.frombytes(lines)
+        result.columns.frombytes(columns)
+        return result
+
+    def disassemble(self) -> str:
+        lines = []
+        for i in range(0, len(self.code), 2):
+            op = self.code[i]
+            arg = self.code[i + 1]
+            text = f"{i // 2:5} {opcode_names[op]}"
+            if op in (CONST, ERROR, CHECK_BOOL, CHECK_INT, CHECK_INT_BELOW):
+                text += f" {self.consts[arg]!r}"
+            elif op == BINARY:
+                text += f" {operator_symbols[arg]}"
+            elif op in (LOAD, STORE, DECLARE):
+                text += f" {arg} ({self.names[arg]})"
+            elif op in (JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP):
+                text += f" {arg}"
+            lines.append(text)
+        return "\n".join(lines)
+
+
+class Label:
+    __slots__ = ("index",)
+
+    def __init__(self) -> None:
+        self.index = -1
+
+
+@dataclass
+class Emit:
+    op: int
+    arg: int | Label
+    loc: Loc
+
+
+Task = Expression | Emit | Label
+
+
+def compile_bytecode(ast: Expression) -> Bytecode:
+    """Lower an AST into a flat instruction stream.
+
+    The tree is walked with an explicit work stack instead of recursion so
+    that arbitrarily deep programs can be compiled. Type checked programs
+    get instructions that do not check the types of their operands."""
+    result = Bytecode()
+    result.names = [""] * resolve(ast)
+    const_indices: dict[tuple[type, int | bool | str], int] = {}
+    fixups: list[tuple[int, Label]] = []
+
+    def const(value: int | bool | str) -> int:
+        key = (type(value), value)
+        if key not in const_indices:
+            const_indices[key] = len(result.consts)
+            result.consts.append(value)
+        return const_indices[key]
+
+    def expand(ast: Expression) -> list[Task]:
+        loc = ast.loc
+        match ast:
+            case Block():
+                if not ast.expressions:
+                    return [Emit(NONE, 0, loc)]
+                tasks: list[Task] = []
+                for e in ast.expressions[:-1]:
+                    tasks += [e, Emit(POP, 0, loc)]
+                tasks.append(ast.expressions[-1])
+                return tasks
+            case Literal():
+                return [Emit(CONST, const(ast.value), loc)]
+            case Identifier():
+                if ast.slot < 0:
+                    return [Emit(ERROR, const("unknown identifier"), loc)]
+                return [Emit(LOAD, ast.slot, loc)]
+            case BinaryOp():
+                if ast.op == "=":
+                    if not isinstance(ast.left, Identifier):
+                        message = "not an identifier, expected for ="
+                        return [Emit(ERROR, const(message), ast.left.loc)]
+                    if ast.left.slot < 0:
+                        return [ast.left]
+                    # Declaring is assigning without the type check.
+                    store = DECLARE if ast.type is not None else STORE
+                    return [ast.right, Emit(store, ast.left.slot, ast.left.loc)]
+                if ast.op in short_circuit_opcodes:
+                    end_label = Label()
+                    if ast.type is not None:
+                        return [
+                            ast.left,
+                            Emit(short_circuit_opcodes[ast.op],
+                                 end_label, ast.left.loc),
+                            ast.right,
+                            end_label,
+                        ]
+                    return [
+                        ast.left,
+                        Emit(short_circuit_opcodes[ast.op],
+                             end_label, ast.left.loc),
+                        ast.right,
+                        Emit(CHECK_BOOL, const(ast.op), ast.right.loc),
+                        end_label,
+                    ]
+                if ast.op not in binary_opcodes:
+                    raise Exception(f"{loc}: unknown operator")
+                binary = Emit(BINARY, binary_opcodes[ast.op], loc)
+                if ast.type is not None:
+                    return [ast.left, ast.right, binary]
+                # Both operands are evaluated before either is checked, and
+                # the checks are located at the operands.
+                return [
+                    ast.left,
+                    ast.right,
+                    Emit(CHECK_INT_BELOW, const(ast.op), ast.left.loc),
+                    Emit(CHECK_INT, const(ast.op), ast.right.loc),
+                    binary,
+                ]
+            case UnaryOp():
+                if ast.op == "-":
+                    return [ast.target, Emit(NEG, 0, loc)]
+                if ast.op == "not":
+                    return [ast.target, Emit(NOT, 0, loc)]
+                raise Exception(f"{loc}: unknown operator")
+            case VarDeclaration():
+                result.names[ast.slot] = ast.name
+                return [ast.value, Emit(DECLARE, ast.slot, loc)]
+            case IfBlock():
+                else_label = Label()
+                end_label = Label()
+                if ast.type is not None and ast.eelse is None:
+                    # The type is Unit, whichever branch runs.
+                    return [
+                        ast.condition,
+                        Emit(JUMP_IF_FALSE, end_label, loc),
+                        ast.then,
+                        Emit(POP, 0, loc),
+                        end_label,
+                        Emit(NONE, 0, loc),
+                    ]
+                return [
+                    ast.condition,
+                    Emit(JUMP_IF_FALSE, else_label, loc),
+                    ast.then,
+                    Emit(JUMP, end_label, loc),
+                    else_label,
+                    ast.eelse if ast.eelse else Emit(NONE, 0, loc),
+                    end_label,
+                ]
+            case While():
+                start_label = Label()
+                end_label = Label()
+                return [
+                    start_label,
+                    ast.condition,
+                    Emit(JUMP_IF_FALSE, end_label, ast.condition.loc),
+                    ast.action,
+                    Emit(POP, 0, loc),
+                    Emit(JUMP, start_label, loc),
+                    end_label,
+                    Emit(NONE, 0, loc),
+                ]
+            case FunctionCall():
+                tasks = list(ast.args)
+                argc = len(ast.args)
+                if ast.name in ("print_int", "print_bool"):
+                    if argc != 1:
+                        message = f"invalid number of arguments for {ast.name}"
+                        return tasks + [Emit(ERROR, const(message), loc)]
+                    return tasks + [Emit(PRINT, const(ast.name), loc)]
+                if ast.name == "read_int":
+                    if argc != 0:
+                        message = "invalid number of arguments for read_int"
+                        return tasks + [Emit(ERROR, const(message), loc)]
+                    return [Emit(READ_INT, 0, loc)]
+                message = f"unknown function {ast.name}"
+                return tasks + [Emit(ERROR, const(message), loc)]
+            case Expression():
+                return [Emit(NONE, 0, loc)]
+        raise Exception(f"{ast.loc}: unknown ast node: {type(ast)}")
+
+    stack: list[Task] = [ast]
+    while stack:
+        task = stack.pop()
+        if isinstance(task, Label):
+            task.index = len(result.code) // 2
+        elif isinstance(task, Emit):
+            if isinstance(task.arg, Label):
+                fixups.append((len(result.code) + 1, task.arg))
+                result.code.extend((task.op, 0))
+            else:
+                result.code.extend((task.op, task.arg))
+            result.lines.append(task.loc.line)
+            result.columns.append(task.loc.column)
+        else:
+            stack.extend(reversed(expand(task)))
+    for (position, label) in fixups:
+        result.code[position] = label.index
+    return result
+
+
+def run_bytecode(bytecode: Bytecode) -> Value:
+    code = bytecode.code.tolist()
+    consts = bytecode.consts
+    frame: list[Value] = [None] * len(bytecode.names)
+    stack: list[Value] = []
+    push = stack.append
+    pop = stack.pop
+    pc = 0
+    end = len(code)
+    console = current_console()
+
+    def error(message: str) -> Exception:
+        return Exception(f"{bytecode.loc(pc // 2 - 1)}: {message}")
+
+    while pc < end:
+        op = code[pc]
+        arg = code[pc + 1]
+        pc += 2
+        if op == LOAD:
+            push(frame[arg])
+        elif op == CONST:
+            push(consts[arg])  # type: ignore
+        elif op == BINARY:
+            r = pop()
+            push(binary_functions[arg](pop(), r))  # type: ignore
+        elif op == CHECK_INT_BELOW:
+            if not isinstance(stack[-2], int):
+                raise error(f"expected int for {consts[arg]} operator")
+        elif op == CHECK_INT:
+            if not isinstance(stack[-1], int):
+                raise error(f"expected int for {consts[arg]} operator")
+        elif op == JUMP_IF_FALSE:
+            c = pop()
+            if c is False:
+                pc = arg * 2
+            elif c is not True:
+                raise error("expected bool")
+        elif op == JUMP:
+            pc = arg * 2
+        elif op == POP:
+            pop()
+        elif op == STORE:
+            value = pop()
+            if type(frame[arg]) != type(value):
+                raise error("tried changing variable type")
+            frame[arg] = value
+            push(None)
+        elif op == DECLARE:
+            frame[arg] = pop()
+            push(None)
+        elif op == NONE:
+            push(None)
+        elif op == JUMP_IF_FALSE_OR_POP or op == JUMP_IF_TRUE_OR_POP:
+            c = stack[-1]
+            if not isinstance(c, bool):
+                raise error(
+                    f"expected bool for {operator_symbols[op]} operator")
+            if c is (op == JUMP_IF_TRUE_OR_POP):
+                pc = arg * 2
+            else:
+                pop()
+        elif op == CHECK_BOOL:
+            if not isinstance(stack[-1], bool):
+                raise error(f"expected bool for {consts[arg]} operator")
+        elif op == NEG:
+            value = pop()
+            if not isinstance(value, int):
+                raise error("expected int")
+            push(-value)
+        elif op == NOT:
+            value = pop()
+            if not isinstance(value, bool):
+                raise error("expected bool")
+            push(not value)
+        elif op == PRINT:
+            value = pop()
+            if not isinstance(value, int):
+                kind = "an int" if consts[arg] == "print_int" else "a bool"
+                raise error(f"argument for {consts[arg]} is not {kind}")
+            console.write(value)
+            push(None)
+        elif op == READ_INT:
+            push(console.read_int())
+        elif op == ERROR:
+            raise error(str(consts[arg]))
+        else:
+            raise error(f"unknown opcode {op}")
+    return stack.pop()
@@ -0,0 +1,146 @@
+from hashlib import sha256
+from multiprocessing import Value
+from pathlib import Path
+import os
+from typing import Callable
+
+# Size of the cache directory, in bytes, before old entries are evicted
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_compiler_version: str | None = None
+
+
+def compiler_version() -> str:
+    """A hash of the compiler's own source code.
+
+    Cached results are keyed by it, so entries written by an older version
+    of the compiler are never returned."""
+    global _compiler_version
+    if _compiler_version is None:
+        h = sha256()
+        for path in sorted(Path(__file__).parent.glob("*.py")):
+            h.update(path.name.encode())
+            h.update(path.read_bytes())
+        _compiler_version = h.hexdigest()
+    return _compiler_version
+
+
+class CompileCache:
+    """A content-addressed store of compiled programs on disk.
+
+    Entries are files named after a hash of the source code and the compiler
+    version, so the cache survives restarts and is shared by every process
+    that uses the same directory. Writes go through a temporary file and an
+    atomic rename, so concurrent readers never see a partial entry.
+
+    The modification time of an entry is bumped on every hit, and when the
+    directory grows over max_bytes the least recently used entries are
+    removed until it is back under 90% of the limit.
+
+    Hit and miss counters live in shared memory, so a cache created before
+    forking counts the requests of all worker processes."""
+
+    def __init__(self, directory: str | Path,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = compiler_version()
+        self._hits = Value("q", 0)
+        self._misses = Value("q", 0)
+        self._evictions = Value("q", 0)
+        self._size = Value("q", sum(size for (_, _, size) in self._entries()))
+
+    def key(self, source_code: str) -> str:
+        h = sha256(self.version.encode())
+        h.update(b"\0")
+        h.update(source_code.encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key[2:]
+
+    def _entries(self) -> list[tuple[float, Path, int]]:
+        entries = []
+        for path in self.directory.glob("??/*"):
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((st.st_mtime, path, st.st_size))
+        return entries
+
+    def get(self, source_code: str) -> bytes | None:
+        path = self._path(self.key(source_code))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._misses.get_lock():
+                self._misses.value += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._hits.get_lock():
+            self._hits.value += 1
+        return data
+
+    def put(self, source_code: str, data: bytes) -> None:
+        path = self._path(self.key(source_code))
+        path.parent.mkdir(exist_ok=True)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._size.get_lock():
+            self._size.value += len(data) - replaced
+            too_big = self._size.value > self.max_bytes
+        if too_big:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until under 90% of the limit."""
+        entries = sorted(self._entries())
+        size = sum(size for (_, _, size) in entries)
+        target = self.max_bytes * 9 // 10
+        evicted = 0
+        for (_, path, entry_size) in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            evicted += 1
+        with self._size.get_lock():
+            self._size.value = size
+        with self._evictions.get_lock():
+            self._evictions.value += evicted
+
+    def get_or_compile(self, source_code: str,
+                       compile: Callable[[str], bytes]) -> bytes:
+        """Return the cached result for source_code, compiling it on a miss.
+
+        Compilation errors propagate and are not cached."""
+        data = self.get(source_code)
+        if data is None:
+            data = compile(source_code)
+            self.put(source_code, data)
+        return data
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self._hits.value,
+            "misses": self._misses.value,
+            "evictions": self._evictions.value,
+            "bytes": self._size.value,
+        }
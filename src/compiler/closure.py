@@ -0,0 +1,292 @@
+from typing import Callable
+from compiler.ast import *
+from compiler.console import current_console
+from compiler.resolver import resolve
+from compiler.operators import int_operators, short_circuit_operators
+
+Value = int | bool | None
+Frame = list[Value]
+Closure = Callable[[Frame], Value]
+
+
+def compile_program(ast: Expression) -> Callable[[], Value]:
+    """Compile a whole program into a closure that runs it in a fresh frame."""
+    size = resolve(ast)
+    body = compile_closure(ast)
+    return lambda: body([None] * size)
+
+
+def compile_closure(ast: Expression) -> Closure:
+    """Walk the tree once and turn every node into a specialized closure.
+
+    The tree must have been resolved first. The returned closure takes the
+    variable frame and evaluates the node without ever looking at the tree
+    again. Nodes annotated by the type checker get closures that skip the
+    run time type checks."""
+    match ast:
+        case Block():
+            return compile_block(ast)
+        case Literal():
+            return compile_literal(ast)
+        case Identifier():
+            return compile_identifier(ast)
+        case BinaryOp():
+            if ast.op == "=":
+                return compile_assignment(ast)
+            if ast.op in int_operators:
+                return compile_int_operator(ast)
+            if ast.op in short_circuit_operators:
+                return compile_short_circuit_operator(ast)
+            raise Exception(f"{ast.loc}: unknown operator")
+        case UnaryOp():
+            return compile_unary_operator(ast)
+        case VarDeclaration():
+            return compile_var_declaration(ast)
+        case IfBlock():
+            return compile_if(ast)
+        case While():
+            return compile_while(ast)
+        case FunctionCall():
+            return compile_function_call(ast)
+        case Expression():
+            return lambda frame: None
+    raise Exception(f"{ast.loc}: unknown ast node: {type(ast)}")
+
+
+def compile_block(ast: Block) -> Closure:
+    expressions = [compile_closure(e) for e in ast.expressions]
+
+    def block(frame: Frame) -> Value:
+        last = None
+        for e in expressions:
+            last = e(frame)
+        return last
+    return block
+
+
+def compile_literal(ast: Literal) -> Closure:
+    value = ast.value
+    return lambda frame: value
+
+
+def compile_identifier(ast: Identifier) -> Closure:
+    slot = ast.slot
+    loc = ast.loc
+    if slot < 0:
+        def unknown_identifier(frame: Frame) -> Value:
+            raise Exception(f"{loc}: unknown identifier")
+        return unknown_identifier
+    return lambda frame: frame[slot]
+
+
+def compile_assignment(ast: BinaryOp) -> Closure:
+    if not isinstance(ast.left, Identifier):
+        loc = ast.left.loc
+
+        def invalid(frame: Frame) -> Value:
+            raise Exception(f"{loc}: not an identifier, expected for =")
+        return invalid
+    if ast.left.slot < 0:
+        return compile_identifier(ast.left)
+    right = compile_closure(ast.right)
+    slot = ast.left.slot
+    loc = ast.left.loc
+
+    if ast.type is not None:
+        def typed_assignment(frame: Frame) -> Value:
+            frame[slot] = right(frame)
+            return None
+        return typed_assignment
+
+    def assignment(frame: Frame) -> Value:
+        value = right(frame)
+        if type(frame[slot]) != type(value):
+            raise Exception(f"{loc}: tried changing variable type")
+        frame[slot] = value
+        return None
+    return assignment
+
+
+def compile_int_operator(ast: BinaryOp) -> Closure:
+    left = compile_closure(ast.left)
+    right = compile_closure(ast.right)
+    fn = int_operators[ast.op]
+    error_left = f"{ast.left.loc}: expected int for {ast.op} operator"
+    error_right = f"{ast.right.loc}: expected int for {ast.op} operator"
+
+    if ast.type is not None:
+        if isinstance(ast.right, Literal):
+            constant = ast.right.value
+            return lambda frame: fn(left(frame), constant)  # type: ignore
+        return lambda frame: fn(left(frame), right(frame))  # type: ignore
+
+    def int_operator(frame: Frame) -> Value:
+        l = left(frame)
+        r = right(frame)
+        if type(l) is int and type(r) is int:
+            return fn(l, r)
+        if not isinstance(l, int):
+            raise Exception(error_left)
+        if not isinstance(r, int):
+            raise Exception(error_right)
+        return fn(l, r)
+    return int_operator
+
+
+def compile_short_circuit_operator(ast: BinaryOp) -> Closure:
+    left = compile_closure(ast.left)
+    right = compile_closure(ast.right)
+    decisive = short_circuit_operators[ast.op]
+    error_left = f"{ast.left.loc}: expected bool for {ast.op} operator"
+    error_right = f"{ast.right.loc}: expected bool for {ast.op} operator"
+
+    if ast.type is not None:
+        def typed_short_circuit_operator(frame: Frame) -> Value:
+            l = left(frame)
+            if l is decisive:
+                return l
+            return right(frame)
+        return typed_short_circuit_operator
+
+    def short_circuit_operator(frame: Frame) -> Value:
+        l = left(frame)
+        if l is decisive:
+            return l
+        if not isinstance(l, bool):
+            raise Exception(error_left)
+        r = right(frame)
+        if not isinstance(r, bool):
+            raise Exception(error_right)
+        return r
+    return short_circuit_operator
+
+
+def compile_unary_operator(ast: UnaryOp) -> Closure:
+    target = compile_closure(ast.target)
+    loc = ast.loc
+    if ast.type is not None and ast.op == "-":
+        return lambda frame: -target(frame)  # type: ignore
+    if ast.type is not None and ast.op == "not":
+        return lambda frame: not target(frame)
+    match ast.op:
+        case "-":
+            def negate(frame: Frame) -> Value:
+                value = target(frame)
+                if not isinstance(value, int):
+                    raise Exception(f"{loc}: expected int")
+                return -value
+            return negate
+        case "not":
+            def logical_not(frame: Frame) -> Value:
+                value = target(frame)
+                if not isinstance(value, bool):
+                    raise Exception(f"{loc}: expected bool")
+                return not value
+            return logical_not
+    raise Exception(f"{ast.loc}: unknown operator")
+
+
+def compile_var_declaration(ast: VarDeclaration) -> Closure:
+    slot = ast.slot
+    value = compile_closure(ast.value)
+
+    def var_declaration(frame: Frame) -> Value:
+        frame[slot] = value(frame)
+        return None
+    return var_declaration
+
+
+def compile_if(ast: IfBlock) -> Closure:
+    condition = compile_closure(ast.condition)
+    then = compile_closure(ast.then)
+    eelse = compile_closure(ast.eelse) if ast.eelse else None
+    loc = ast.loc
+
+    if ast.type is not None:
+        if eelse is None:
+            def typed_if_then(frame: Frame) -> Value:
+                if condition(frame):
+                    then(frame)
+                return None
+            return typed_if_then
+        typed_else = eelse
+        return lambda frame: then(frame) if condition(frame) else typed_else(frame)
+
+    def if_block(frame: Frame) -> Value:
+        c = condition(frame)
+        if not isinstance(c, bool):
+            raise Exception(f"{loc}: expected bool")
+        if c:
+            return then(frame)
+        if eelse is not None:
+            return eelse(frame)
+        return None
+    return if_block
+
+
+def compile_while(ast: While) -> Closure:
+    condition = compile_closure(ast.condition)
+    action = compile_closure(ast.action)
+    loc = ast.condition.loc
+
+    if ast.type is not None:
+        def typed_while_loop(frame: Frame) -> Value:
+            while condition(frame):
+                action(frame)
+            return None
+        return typed_while_loop
+
+    def while_loop(frame: Frame) -> Value:
+        while True:
+            c = condition(frame)
+            if c is True:
+                action(frame)
+            elif c is False:
+                return None
+            else:
+                raise Exception(f"{loc}: expected bool")
+    return while_loop
+
+
+def compile_function_call(ast: FunctionCall) -> Closure:
+    args = [compile_closure(e) for e in ast.args]
+    loc = ast.loc
+    name = ast.name
+
+    if ast.type is not None:
+        if name == "read_int":
+            return lambda frame: current_console().read_int()
+        arg = args[0]
+
+        def typed_print_value(frame: Frame) -> Value:
+            current_console().write(arg(frame))  # type: ignore
+            return None
+        return typed_print_value
+
+    if name == "print_int" or name == "print_bool":
+        def print_value(frame: Frame) -> Value:
+            values = [a(frame) for a in args]
+            if len(values) != 1:
+                raise Exception(
+                    f"{loc}: invalid number of arguments for {name}")
+            if not isinstance(values[0], int):
+                kind = "an int" if name == "print_int" else "a bool"
+                raise Exception(f"{loc}: argument for {name} is not {kind}")
+            current_console().write(values[0])
+            return None
+        return print_value
+    if name == "read_int":
+        def read_int(frame: Frame) -> Value:
+            for a in args:
+                a(frame)
+            if len(args) != 0:
+                raise Exception(
+                    f"{loc}: invalid number of arguments for read_int")
+            return current_console().read_int()
+        return read_int
+
+    def unknown_function(frame: Frame) -> Value:
+        for a in args:
+            a(frame)
+        raise Exception(f"{loc}: unknown function {name}")
+    return unknown_function
@@ -0,0 +1,185 @@
+from compiler.ast import Expression
+from compiler.ir import *
+from compiler.regalloc import Allocation, allocate_registers
+from compiler.runtime import runtime_assembly
+from compiler.stats import phase
+
+# Instructions for `dest = dest OP source`
+arithmetic_instructions = {"+": "add", "-": "sub", "*": "imul"}
+# Instructions setting %al to `left OP right` after `cmp right, left`
+comparison_instructions = {
+    "<": "setl",
+    ">": "setg",
+    "<=": "setle",
+    ">=": "setge",
+    "==": "sete",
+    "!=": "setne",
+}
+
+
+def fits_int32(value: int) -> bool:
+    return -(1 << 31) <= value < (1 << 31)
+
+
+def is_register(location: str) -> bool:
+    return location.startswith("%")
+
+
+def generate_assembly(ast: Expression) -> str:
+    """Translate a program to x86-64 assembly, including the runtime.
+
+    The program goes through the IR, whose variables are given registers by
+    the linear scan allocator, or stack slots when there are not enough.
+    Ints are 64-bit and wrap around on overflow; bools are 0 or 1. `/` and
+    `%` round towards negative infinity like the interpreter does, and
+    dividing by zero kills the program with SIGFPE.
+
+    Type errors and other compile errors raise an Exception with the
+    location, see generate_ir."""
+    with phase("ir") as p:
+        function = p.output = generate_ir(ast)
+    with phase("regalloc"):
+        allocation = allocate_registers(function)
+    return runtime_assembly + assembly_from_ir(function, allocation)
+
+
+def assembly_from_ir(function: IRFunction, allocation: Allocation) -> str:
+    saved = allocation.used_callee_saved()
+    lines: list[str] = []
+    label_count = 0
+
+    def emit(instruction: str) -> None:
+        lines.append(f"    {instruction}")
+
+    def new_label() -> str:
+        nonlocal label_count
+        label_count += 1
+        return f".Ldone{label_count}"
+
+    def location(var: Var) -> str:
+        register = allocation.registers.get(var)
+        if register is not None:
+            return register
+        # Spill slots are below the saved registers.
+        return f"{-8 * (len(saved) + allocation.spilled[var] + 1)}(%rbp)"
+
+    def move(source: str, dest: str) -> None:
+        if source == dest:
+            return
+        if not is_register(source) and not is_register(dest):
+            emit(f"mov {source}, %rax")
+            source = "%rax"
+        emit(f"mov {source}, {dest}")
+
+    def binary(instruction: Binary) -> None:
+        left = location(instruction.left)
+        right = location(instruction.right)
+        dest = location(instruction.dest)
+        op = instruction.op
+        if op in arithmetic_instructions:
+            # Compute in place unless that would overwrite the right operand.
+            target = dest if is_register(dest) and dest != right else "%rax"
+            move(left, target)
+            emit(f"{arithmetic_instructions[op]} {right}, {target}")
+            move(target, dest)
+        elif op in comparison_instructions:
+            if not is_register(left):
+                move(left, "%rax")
+                left = "%rax"
+            emit(f"cmp {right}, {left}")
+            emit(f"{comparison_instructions[op]} %al")
+            emit("movzbq %al, %rax")
+            move("%rax", dest)
+        elif op in ["/", "%"]:
+            move(left, "%rax")
+            move(right, "%rcx")
+            done = new_label()
+            emit("cqo")
+            emit("idiv %rcx")
+            # idiv truncates. Round down instead when the remainder is not
+            # zero and its sign differs from the divisor's.
+            emit("test %rdx, %rdx")
+            emit(f"jz {done}")
+            emit("mov %rdx, %r11")
+            emit("xor %rcx, %r11")
+            emit(f"jns {done}")
+            if op == "/":
+                emit("dec %rax")
+            else:
+                emit("add %rcx, %rdx")
+            lines.append(f"{done}:")
+            move("%rax" if op == "/" else "%rdx", dest)
+        else:
+            raise Exception(f"{instruction.loc}: unknown operator")
+
+    def unary(instruction: Unary) -> None:
+        dest = location(instruction.dest)
+        target = dest if is_register(dest) else "%rax"
+        move(location(instruction.source), target)
+        if instruction.op == "-":
+            emit(f"neg {target}")
+        elif instruction.op == "not":
+            emit(f"xor $1, {target}")
+        else:
+            raise Exception(f"{instruction.loc}: unknown operator")
+        move(target, dest)
+
+    def epilogue() -> None:
+        if allocation.spilled:
+            emit(f"add ${8 * len(allocation.spilled)}, %rsp")
+        for register in reversed(saved):
+            emit(f"pop {register}")
+        emit("pop %rbp")
+        emit("ret")
+
+    lines += [
+        "    .text",
+        "program:",
+        "    push %rbp",
+        "    mov %rsp, %rbp",
+    ]
+    for register in saved:
+        emit(f"push {register}")
+    if allocation.spilled:
+        emit(f"sub ${8 * len(allocation.spilled)}, %rsp")
+
+    blocks = function.blocks
+    for (index, block) in enumerate(blocks):
+        # Jumps to the next block fall through instead.
+        following = blocks[index + 1].label if index + 1 < len(blocks) else None
+        lines.append(f".L{block.label}:")
+        for instruction in block.instructions:
+            match instruction:
+                case Const():
+                    dest = location(instruction.dest)
+                    if fits_int32(instruction.value):
+                        emit(f"movq ${instruction.value}, {dest}")
+                    else:
+                        emit(f"movabs ${instruction.value}, %rax")
+                        move("%rax", dest)
+                case Copy():
+                    move(location(instruction.source), location(instruction.dest))
+                case Binary():
+                    binary(instruction)
+                case Unary():
+                    unary(instruction)
+                case Call():
+                    for arg in instruction.args:
+                        move(location(arg), "%rdi")
+                    emit(f"call {instruction.function}")
+                    if instruction.dest is not None:
+                        move("%rax", location(instruction.dest))
+                case Jump():
+                    if instruction.target != following:
+                        emit(f"jmp .L{instruction.target}")
+                case CondJump():
+                    emit(f"cmpq $0, {location(instruction.condition)}")
+                    if instruction.then_target == following:
+                        emit(f"je .L{instruction.else_target}")
+                    else:
+                        emit(f"jne .L{instruction.then_target}")
+                        if instruction.else_target != following:
+                            emit(f"jmp .L{instruction.else_target}")
+                case Return():
+                    epilogue()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from typing import Iterable, Iterator, TextIO
+
+
+class Console:
+    """Where running programs print values to and read ints from.
+
+    By default every value is printed with print() and every int is read
+    with input(), prompting with `read_int: `, as at a terminal.
+
+    - output: a file to write the values to instead. Lines are collected
+      and written flush_lines at a time, or only when flush() is called if
+      flush_lines is 0.
+    - inputs: ints to read instead of prompting for them, for example
+      from read_ints(), or ones recorded earlier to replay a run.
+    - record: a list that every int read is appended to, for replaying.
+
+    Output still waiting is written before prompting, so that it is seen
+    before the question."""
+
+    def __init__(self, output: TextIO | None = None,
+                 inputs: Iterable[int] | None = None,
+                 flush_lines: int = 1,
+                 record: list[int] | None = None) -> None:
+        self.output = output
+        self.inputs = iter(inputs) if inputs is not None else None
+        self.flush_lines = flush_lines
+        self.record = record
+        self._lines: list[str] = []
+
+    def write(self, value: int | bool) -> None:
+        if self.output is None:
+            print(value)
+            return
+        self._lines.append(f"{value}\n")
+        if len(self._lines) == self.flush_lines:
+            self.flush()
+
+    def read_int(self) -> int:
+        if self.inputs is None:
+            self.flush()
+            value = int(input("read_int: "))
+        else:
+            try:
+                value = next(self.inputs)
+            except StopIteration:
+                raise EOFError("read_int: no more input") from None
+        if self.record is not None:
+            self.record.append(value)
+        return value
+
+    def flush(self) -> None:
+        if self.output is None:
+            return
+        if self._lines:
+            self.output.write("".join(self._lines))
+            self._lines.clear()
+        self.output.flush()
+
+
+def read_ints(file: TextIO, chunk_size: int = 1 << 16) -> Iterator[int]:
+    """The whitespace separated ints in file, reading chunk_size characters
+    at a time. Raises ValueError at the first word that is not an int."""
+    rest = ""
+    while chunk := file.read(chunk_size):
+        words = (rest + chunk).split()
+        # The last word may continue in the next chunk.
+        rest = words.pop() if words and not chunk[-1].isspace() else ""
+        yield from map(int, words)
+    if rest:
+        yield int(rest)
+
+
+_console = Console()
+
+
+def current_console() -> Console:
+    """The console of programs running now, see use_console."""
+    return _console
+
+
+@contextmanager
+def use_console(console: Console) -> Iterator[Console]:
+    """Have programs run inside the with block use console. Its output is
+    flushed at the end, also when the program fails."""
+    global _console
+    previous = _console
+    _console = console
+    try:
+        yield console
+    finally:
+        _console = previous
+        console.flush()
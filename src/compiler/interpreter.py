@@ -1,130 +1,161 @@
+import sys
 from dataclasses import dataclass
-from typing import Self
+from time import perf_counter
 from compiler.ast import *
+from compiler.resolver import resolve
+from compiler.operators import int_operators, short_circuit_operators
+from compiler.closure import compile_program
+from compiler.console import current_console
+from compiler.bytecode import compile_bytecode, run_bytecode
+from compiler.transpiler import compile_python, run_python
+from compiler.types import Unit
 
+Frame = list[int | bool | None]
 
-@dataclass
-class SymbolTable:
-    symbols: dict[str, int | bool | None]
-    parent: Self | None
 
+class LimitExceeded(Exception):
+    """A program used up one of its Limits."""
 
-def interpret_rec(ast: Expression, symboltable: SymbolTable) -> int | bool | None:
+
+@dataclass(frozen=True)
+class Limits:
+    """Budgets for running a program with interpret(), None meaning no limit.
+
+    - max_steps: AST nodes evaluated.
+    - max_seconds: wall clock time, looked at every Budget.check_interval
+      steps.
+    - max_int_bits: bit length of ints computed by operators or read.
+    - max_scope_depth: blocks running inside each other."""
+    max_steps: int | None = None
+    max_seconds: float | None = None
+    max_int_bits: int | None = None
+    max_scope_depth: int | None = None
+
+
+class Budget:
+    """What a running program has left of its Limits."""
+    __slots__ = ["limits", "steps", "depth", "deadline", "next_check"]
+
+    # Reading the clock costs much more than a step.
+    check_interval = 1024
+
+    def __init__(self, limits: Limits) -> None:
+        self.limits = limits
+        self.steps = 0
+        self.depth = 0
+        self.deadline: float | None = None
+        if limits.max_seconds is not None:
+            self.deadline = perf_counter() + limits.max_seconds
+        self.next_check = 0
+        self.schedule()
+
+    def schedule(self) -> None:
+        """Set the step at which the step and time limits are checked next."""
+        self.next_check = sys.maxsize
+        if self.deadline is not None:
+            self.next_check = self.steps + self.check_interval
+        if self.limits.max_steps is not None:
+            self.next_check = min(self.next_check, self.limits.max_steps + 1)
+
+    def step(self, loc: Loc) -> None:
+        self.steps += 1
+        if self.steps >= self.next_check:
+            if self.limits.max_steps is not None and self.steps > self.limits.max_steps:
+                raise LimitExceeded(
+                    f"{loc}: step limit of {self.limits.max_steps} exceeded")
+            if self.deadline is not None and perf_counter() > self.deadline:
+                raise LimitExceeded(
+                    f"{loc}: time limit of {self.limits.max_seconds} s exceeded")
+            self.schedule()
+
+    def enter(self, loc: Loc) -> None:
+        self.depth += 1
+        if self.limits.max_scope_depth is not None \
+                and self.depth > self.limits.max_scope_depth:
+            raise LimitExceeded(f"{loc}: scope depth limit of "
+                                f"{self.limits.max_scope_depth} exceeded")
+
+    def leave(self) -> None:
+        self.depth -= 1
+
+    def check_int(self, value: int, loc: Loc) -> None:
+        if self.limits.max_int_bits is not None \
+                and value.bit_length() > self.limits.max_int_bits:
+            raise LimitExceeded(
+                f"{loc}: int longer than {self.limits.max_int_bits} bits")
+
+
+def interpret_rec(ast: Expression, frame: Frame,
+                  budget: Budget | None = None) -> int | bool | None:
+    """Run a program, checking types at run time. With a budget, every node
+    evaluated takes a step from it."""
+    if budget is not None:
+        budget.step(ast.loc)
     match ast:
         case Block():
             last = None
-            block_context = SymbolTable(dict(), symboltable)
+            if budget is not None:
+                budget.enter(ast.loc)
             for e in ast.expressions:
-                last = interpret_rec(e, block_context)
+                last = interpret_rec(e, frame, budget)
+            if budget is not None:
+                budget.leave()
             return last
         case Literal():
             return ast.value
 
         case Identifier():
-            value = None
-            current: SymbolTable | None = symboltable
-            while True:
-                if current is None:
-                    raise Exception(f"{ast.loc}: unknown identifier")
-                if ast.name in current.symbols:
-                    return current.symbols[ast.name]
-                current = current.parent
+            if ast.slot < 0:
+                raise Exception(f"{ast.loc}: unknown identifier")
+            return frame[ast.slot]
 
         case BinaryOp():
-            left = interpret_rec(ast.left, symboltable)
-            right = interpret_rec(ast.right, symboltable)
-
-            def validate_ints(left: int | bool | None, right: int | bool | None, op: str) -> tuple[int, int]:
-                if not isinstance(left, int):
+            if ast.op == "=":
+                if not isinstance(ast.left, Identifier):
                     raise Exception(
-                        f"{ast.left}: expected int for {op} operator")
-                if not isinstance(right, int):
+                        f"{ast.left.loc}: not an identifier, expected for =")
+                value = interpret_rec(ast.right, frame, budget)
+                if ast.left.slot < 0:
+                    raise Exception(f"{ast.left.loc}: unknown identifier")
+                if type(frame[ast.left.slot]) != type(value):
                     raise Exception(
-                        f"{ast.right}: expected int for {op} operator")
-                return (left, right)
+                        f"{ast.left.loc}: tried changing variable type")
+                frame[ast.left.slot] = value
+                return None
 
-            def validate_bools(left: int | bool | None, right: int | bool | None, op: str) -> tuple[bool, bool]:
+            if ast.op in short_circuit_operators:
+                decisive = short_circuit_operators[ast.op]
+                left = interpret_rec(ast.left, frame, budget)
                 if not isinstance(left, bool):
                     raise Exception(
-                        f"{ast.left}: expected bool for {op} operator")
+                        f"{ast.left.loc}: expected bool for {ast.op} operator")
+                if left is decisive:
+                    return left
+                right = interpret_rec(ast.right, frame, budget)
                 if not isinstance(right, bool):
                     raise Exception(
-                        f"{ast.right}: expected bool for {op} operator")
-                return (left, right)
+                        f"{ast.right.loc}: expected bool for {ast.op} operator")
+                return right
 
-            match ast.op:
-                case "+":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l + r
-                case "-":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l - r
-                case "%":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l % r
-                case "*":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l * r
-                case "/":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l // r  # TODO: maybe this is correct? language spec does not specify
-                case "<":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l < r
-                case ">":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l > r
-                case "<=":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l <= r
-                case ">=":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l >= r
-                case "==":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l == r
-                case "!=":
-                    (l, r) = validate_ints(interpret_rec(ast.left, symboltable),
-                                           interpret_rec(ast.right, symboltable), ast.op)
-                    return l != r
-                case "or":
-                    (l, r) = validate_bools(interpret_rec(ast.left, symboltable),
-                                            interpret_rec(ast.right, symboltable), ast.op)
-                    return l or r
-                case "and":
-                    (l, r) = validate_bools(interpret_rec(ast.left, symboltable),
-                                            interpret_rec(ast.right, symboltable), ast.op)
-                    return l and r
-                case "=":
-                    if not isinstance(ast.left, Identifier):
-                        raise Exception(
-                            f"{ast.left.loc}: not an identifier, expected for =")
-                    value = interpret_rec(ast.right, symboltable)
-                    current_context: SymbolTable | None = symboltable
-                    while current_context:
-                        if ast.left.name in current_context.symbols:
-                            if type(current_context.symbols[ast.left.name]) != type(value):
-                                raise Exception(
-                                    f"{ast.left.loc}: tried changing variable type")
-                            current_context.symbols[ast.left.name] = value
-                            return None
-                        current_context = current_context.parent
-                    raise Exception(f"{ast.left.loc}: unknown identifier")
+            fn = int_operators.get(ast.op)
+            if fn is None:
+                raise Exception(f"{ast.loc}: unknown operator")
+            left = interpret_rec(ast.left, frame, budget)
+            right = interpret_rec(ast.right, frame, budget)
+            if type(left) is not int or type(right) is not int:
+                if not isinstance(left, int):
+                    raise Exception(
+                        f"{ast.left.loc}: expected int for {ast.op} operator")
+                if not isinstance(right, int):
+                    raise Exception(
+                        f"{ast.right.loc}: expected int for {ast.op} operator")
+            result = fn(left, right)
+            if budget is not None and type(result) is int:
+                budget.check_int(result, ast.loc)
+            return result
 
-                case _:
-                    raise Exception(f"{ast.loc}: unknown operator")
         case UnaryOp():
-            target = interpret_rec(ast.target, symboltable)
+            target = interpret_rec(ast.target, frame, budget)
             match ast.op:
                 case "-":
                     if not isinstance(target, int):
@@ -136,32 +167,33 @@ def interpret_rec(ast: Expression, symboltable: SymbolTable) -> int | bool | Non
                     return not target
 
         case VarDeclaration():
-            symboltable.symbols[ast.name] = interpret_rec(
-                ast.value, symboltable)
+            frame[ast.slot] = interpret_rec(ast.value, frame, budget)
             return None
 
         case IfBlock():
-            condition = interpret_rec(ast.condition, symboltable)
+            condition = interpret_rec(ast.condition, frame, budget)
             if not isinstance(condition, bool):
                 raise Exception(f"{ast.loc}: expected bool")
             if condition:
-                return interpret_rec(ast.then, symboltable)
+                value = interpret_rec(ast.then, frame, budget)
+                # Type checked ifs without else have no value.
+                return None if ast.type == Unit else value
             if ast.eelse:
-                return interpret_rec(ast.eelse, symboltable)
+                return interpret_rec(ast.eelse, frame, budget)
             return None
 
         case While():
             while True:
-                condition = interpret_rec(ast.condition, symboltable)
+                condition = interpret_rec(ast.condition, frame, budget)
                 if not isinstance(condition, bool):
                     raise Exception(f"{ast.condition.loc}: expected bool")
                 if not condition:
                     break
-                interpret_rec(ast.action, symboltable)
+                interpret_rec(ast.action, frame, budget)
             return None
 
         case FunctionCall():
-            args = [interpret_rec(e, symboltable) for e in ast.args]
+            args = [interpret_rec(e, frame, budget) for e in ast.args]
             if ast.name == "print_int":
                 if len(args) != 1:
                     raise Exception(
@@ -169,7 +201,7 @@ def interpret_rec(ast: Expression, symboltable: SymbolTable) -> int | bool | Non
                 if not isinstance(args[0], int):
                     raise Exception(
                         f"{ast.loc}: argument for print_int is not an int")
-                print(args[0])
+                current_console().write(args[0])
                 return None
             elif ast.name == "print_bool":
                 if len(args) != 1:
@@ -178,13 +210,15 @@ def interpret_rec(ast: Expression, symboltable: SymbolTable) -> int | bool | Non
                 if not isinstance(args[0], int):
                     raise Exception(
                         f"{ast.loc}: argument for print_bool is not a bool")
-                print(args[0])
+                current_console().write(args[0])
                 return None
             elif ast.name == "read_int":
                 if len(args) != 0:
                     raise Exception(
                         f"{ast.loc}: invalid number of arguments for read_int")
-                value = int(input("read_int: "))
+                value = current_console().read_int()
+                if budget is not None:
+                    budget.check_int(value, ast.loc)
                 return value
 
         case Expression():
@@ -193,7 +227,85 @@ def interpret_rec(ast: Expression, symboltable: SymbolTable) -> int | bool | Non
     raise Exception(f"{ast.loc}: unknown ast node: {type(ast)}")
 
 
-def interpret(ast: Expression) -> int | bool | None:
-    table = SymbolTable(dict(), None)
-    result = interpret_rec(ast, table)
-    return result
+def interpret_typed(ast: Expression, frame: Frame) -> int | bool | None:
+    """interpret_rec for programs that passed the type checker, without any
+    run time type checks. An `if` without `else` evaluates to None, as its
+    type is Unit."""
+    match ast:
+        case Block():
+            last = None
+            for e in ast.expressions:
+                last = interpret_typed(e, frame)
+            return last
+        case Literal():
+            return ast.value
+        case Identifier():
+            return frame[ast.slot]
+        case BinaryOp():
+            fn = int_operators.get(ast.op)
+            if fn is not None:
+                return fn(interpret_typed(ast.left, frame),  # type: ignore
+                          interpret_typed(ast.right, frame))  # type: ignore
+            if ast.op == "=":
+                frame[ast.left.slot] = interpret_typed(ast.right, frame)  # type: ignore
+                return None
+            left = interpret_typed(ast.left, frame)
+            if left is short_circuit_operators[ast.op]:
+                return left
+            return interpret_typed(ast.right, frame)
+        case UnaryOp():
+            if ast.op == "-":
+                return -interpret_typed(ast.target, frame)  # type: ignore
+            return not interpret_typed(ast.target, frame)
+        case VarDeclaration():
+            frame[ast.slot] = interpret_typed(ast.value, frame)
+            return None
+        case IfBlock():
+            if interpret_typed(ast.condition, frame):
+                value = interpret_typed(ast.then, frame)
+                return value if ast.eelse is not None else None
+            if ast.eelse is not None:
+                return interpret_typed(ast.eelse, frame)
+            return None
+        case While():
+            while interpret_typed(ast.condition, frame):
+                interpret_typed(ast.action, frame)
+            return None
+        case FunctionCall():
+            if ast.name == "read_int":
+                return current_console().read_int()
+            current_console().write(interpret_typed(ast.args[0], frame))  # type: ignore
+            return None
+    return None
+
+
+engines = ["tree", "closure", "vm", "python"]
+
+
+def interpret(ast: Expression, engine: str = "tree",
+              limits: Limits | None = None) -> int | bool | None:
+    """Run a program with one of the engines.
+
+    If the program has been type checked (its root has a type), the engines
+    skip the run time type checks. The python engine always type checks, as
+    it runs the program translated to Python by the transpiler.
+
+    Programs run with limits raise LimitExceeded when they use up one of
+    them. Only the tree engine can count steps, and it then takes the path
+    with run time checks; without limits nothing is counted."""
+    if limits is not None:
+        if engine != "tree":
+            raise Exception(f"limits are not supported by the {engine} engine")
+        return interpret_rec(ast, [None] * resolve(ast), Budget(limits))
+    if engine == "tree":
+        frame: Frame = [None] * resolve(ast)
+        if ast.type is not None:
+            return interpret_typed(ast, frame)
+        return interpret_rec(ast, frame)
+    elif engine == "closure":
+        return compile_program(ast)()
+    elif engine == "vm":
+        return run_bytecode(compile_bytecode(ast))
+    elif engine == "python":
+        return run_python(compile_python(ast))
+    raise Exception(f"unknown engine: {engine}")
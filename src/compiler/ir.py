@@ -0,0 +1,336 @@
+from dataclasses import dataclass
+
+from compiler.ast import *
+from compiler.location import Loc
+from compiler.optimizer import assigned_slots
+from compiler.resolver import resolve
+from compiler.typechecker import typecheck
+from compiler.types import Bool, Int, Unit
+
+# IR variables are strings. Source variables keep their name, with a suffix
+# like `x.1` when it is shadowed, and temporaries are named `$1`, `$2`, ...
+# Neither can clash with an identifier, which contains no `.` or `$`.
+Var = str
+
+
+@dataclass(slots=True)
+class Instruction:
+    loc: Loc
+
+
+@dataclass(slots=True)
+class Const(Instruction):
+    value: int
+    dest: Var
+
+
+@dataclass(slots=True)
+class Copy(Instruction):
+    source: Var
+    dest: Var
+
+
+@dataclass(slots=True)
+class Binary(Instruction):
+    op: str
+    left: Var
+    right: Var
+    dest: Var
+
+
+@dataclass(slots=True)
+class Unary(Instruction):
+    op: str
+    source: Var
+    dest: Var
+
+
+@dataclass(slots=True)
+class Call(Instruction):
+    function: str
+    args: list[Var]
+    dest: Var | None
+
+
+@dataclass(slots=True)
+class Jump(Instruction):
+    target: str
+
+
+@dataclass(slots=True)
+class CondJump(Instruction):
+    condition: Var
+    then_target: str
+    else_target: str
+
+
+@dataclass(slots=True)
+class Return(Instruction):
+    pass
+
+
+@dataclass(slots=True)
+class BasicBlock:
+    """Straight-line code ending in a Jump, CondJump or Return."""
+    label: str
+    instructions: list[Instruction]
+
+
+@dataclass(slots=True)
+class IRFunction:
+    """A control-flow graph. The first block is the entry point, and the
+    blocks are in the order the code should be laid out in."""
+    blocks: list[BasicBlock]
+
+    def successors(self, block: BasicBlock) -> list[str]:
+        match block.instructions[-1]:
+            case Jump(target=target):
+                return [target]
+            case CondJump(then_target=then_target, else_target=else_target):
+                return [then_target, else_target]
+        return []
+
+    def instruction_count(self) -> int:
+        return sum(len(block.instructions) for block in self.blocks)
+
+
+def uses(instruction: Instruction) -> list[Var]:
+    """The variables an instruction reads."""
+    match instruction:
+        case Copy():
+            return [instruction.source]
+        case Binary():
+            return [instruction.left, instruction.right]
+        case Unary():
+            return [instruction.source]
+        case Call():
+            return list(instruction.args)
+        case CondJump():
+            return [instruction.condition]
+    return []
+
+
+def definition(instruction: Instruction) -> Var | None:
+    """The variable an instruction writes, if any."""
+    match instruction:
+        case Const() | Copy() | Binary() | Unary() | Call():
+            return instruction.dest
+    return None
+
+
+def format_instruction(instruction: Instruction) -> str:
+    match instruction:
+        case Const():
+            return f"{instruction.dest} = {instruction.value}"
+        case Copy():
+            return f"{instruction.dest} = {instruction.source}"
+        case Binary():
+            return (f"{instruction.dest} = {instruction.left} "
+                    f"{instruction.op} {instruction.right}")
+        case Unary():
+            separator = " " if instruction.op == "not" else ""
+            return f"{instruction.dest} = {instruction.op}{separator}{instruction.source}"
+        case Call():
+            call = f"{instruction.function}({', '.join(instruction.args)})"
+            if instruction.dest is None:
+                return call
+            return f"{instruction.dest} = {call}"
+        case Jump():
+            return f"goto {instruction.target}"
+        case CondJump():
+            return (f"if {instruction.condition} goto {instruction.then_target} "
+                    f"else {instruction.else_target}")
+        case Return():
+            return "return"
+    raise Exception(f"unknown instruction: {instruction}")
+
+
+def format_ir(function: IRFunction) -> str:
+    lines = []
+    for block in function.blocks:
+        lines.append(f"{block.label}:")
+        for instruction in block.instructions:
+            lines.append(f"    {format_instruction(instruction)}")
+    return "\n".join(lines) + "\n"
+
+
+int64_min = -(1 << 63)
+int64_max = (1 << 63) - 1
+
+
+def generate_ir(ast: Expression) -> IRFunction:
+    """Translate a program to three-address code in basic blocks.
+
+    `and`, `or`, `if` and `while` become conditional jumps between blocks.
+    Every operand is a variable: literals are first loaded into temporaries.
+    Expressions of type Unit have no value, and nothing is copied out of them.
+    At the end, the value of the program is printed with print_int or
+    print_bool if it is an int or a bool.
+
+    The program is type checked first unless it has been already, so type
+    errors raise here. So do int literals that do not fit in 64 bits."""
+    if ast.type is None:
+        typecheck(ast)
+    resolve(ast)
+    blocks: list[BasicBlock] = []
+    current = BasicBlock("entry", [])
+    blocks.append(current)
+    counters: dict[str, int] = {}
+    slot_vars: dict[int, Var] = {}
+    used_names: set[str] = set()
+
+    def fresh(prefix: str) -> str:
+        counters[prefix] = counters.get(prefix, 0) + 1
+        return f"{prefix}{counters[prefix]}"
+
+    def temporary() -> Var:
+        return fresh("$")
+
+    def emit(instruction: Instruction) -> None:
+        current.instructions.append(instruction)
+
+    def start_block(label: str) -> None:
+        nonlocal current
+        current = BasicBlock(label, [])
+        blocks.append(current)
+
+    def declare(e: VarDeclaration) -> Var:
+        name = e.name
+        while name in used_names:
+            name = fresh(f"{e.name}.")
+        used_names.add(name)
+        slot_vars[e.slot] = name
+        return name
+
+    def value_of(e: Expression) -> Var:
+        value = visit(e)
+        assert value is not None, f"{e.loc}: no value"
+        return value
+
+    def visit(e: Expression) -> Var | None:
+        value = visit_node(e)
+        return None if e.type == Unit else value
+
+    def visit_node(e: Expression) -> Var | None:
+        match e:
+            case Literal():
+                number = int(e.value)
+                if not int64_min <= number <= int64_max:
+                    raise Exception(f"{e.loc}: integer literal out of range")
+                dest = temporary()
+                emit(Const(e.loc, number, dest))
+                return dest
+
+            case Identifier():
+                return slot_vars[e.slot]
+
+            case BinaryOp(op="=", left=Identifier(slot=slot)):
+                value = visit(e.right)
+                if value is not None:
+                    emit(Copy(e.loc, value, slot_vars[slot]))
+                return None
+
+            case BinaryOp(op="and" | "or"):
+                label = fresh(e.op)
+                right_label = f"{label}_right"
+                end_label = f"{label}_end"
+                dest = temporary()
+                emit(Copy(e.loc, value_of(e.left), dest))
+                if e.op == "and":
+                    emit(CondJump(e.loc, dest, right_label, end_label))
+                else:
+                    emit(CondJump(e.loc, dest, end_label, right_label))
+                start_block(right_label)
+                emit(Copy(e.loc, value_of(e.right), dest))
+                emit(Jump(e.loc, end_label))
+                start_block(end_label)
+                return dest
+
+            case BinaryOp():
+                left = value_of(e.left)
+                if (not isinstance(e.right, (Literal, Identifier))
+                        and left in {slot_vars[slot] for slot in assigned_slots(e.right)
+                                     if slot in slot_vars}):
+                    # The left operand is a variable, possibly the value of
+                    # a block, that the right operand changes, so the
+                    # operator must see its value from before that.
+                    snapshot = temporary()
+                    emit(Copy(e.loc, left, snapshot))
+                    left = snapshot
+                right = value_of(e.right)
+                dest = temporary()
+                emit(Binary(e.loc, e.op, left, right, dest))
+                return dest
+
+            case UnaryOp():
+                source = value_of(e.target)
+                dest = temporary()
+                emit(Unary(e.loc, e.op, source, dest))
+                return dest
+
+            case VarDeclaration():
+                value = visit(e.value)
+                name = declare(e)
+                if value is not None:
+                    emit(Copy(e.loc, value, name))
+                return None
+
+            case Block():
+                result: Var | None = None
+                for sub in e.expressions:
+                    result = visit(sub)
+                return result
+
+            case IfBlock():
+                label = fresh("if")
+                then_label = f"{label}_then"
+                else_label = f"{label}_else"
+                end_label = f"{label}_end"
+                if_value = temporary() if e.type != Unit else None
+                condition = value_of(e.condition)
+                emit(CondJump(e.loc, condition, then_label,
+                              end_label if e.eelse is None else else_label))
+                start_block(then_label)
+                value = visit(e.then)
+                if if_value is not None and value is not None:
+                    emit(Copy(e.loc, value, if_value))
+                emit(Jump(e.loc, end_label))
+                if e.eelse is not None:
+                    start_block(else_label)
+                    value = visit(e.eelse)
+                    if if_value is not None and value is not None:
+                        emit(Copy(e.loc, value, if_value))
+                    emit(Jump(e.loc, end_label))
+                start_block(end_label)
+                return if_value
+
+            case While():
+                label = fresh("while")
+                condition_label = f"{label}_condition"
+                body_label = f"{label}_body"
+                end_label = f"{label}_end"
+                emit(Jump(e.loc, condition_label))
+                start_block(condition_label)
+                condition = value_of(e.condition)
+                emit(CondJump(e.loc, condition, body_label, end_label))
+                start_block(body_label)
+                visit(e.action)
+                emit(Jump(e.loc, condition_label))
+                start_block(end_label)
+                return None
+
+            case FunctionCall():
+                args = [value_of(arg) for arg in e.args]
+                returned = temporary() if e.type != Unit else None
+                emit(Call(e.loc, e.name, args, returned))
+                return returned
+
+        return None
+
+    result = visit(ast)
+    if result is not None and ast.type == Int:
+        emit(Call(ast.loc, "print_int", [result], None))
+    elif result is not None and ast.type == Bool:
+        emit(Call(ast.loc, "print_bool", [result], None))
+    emit(Return(ast.loc))
+    return IRFunction(blocks)
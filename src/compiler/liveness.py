@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+
+from compiler.ir import IRFunction, Var, definition, uses
+
+
+@dataclass(slots=True)
+class Liveness:
+    """The variables live at the start and at the end of each block, by
+    label. A variable is live if its current value may still be read."""
+    live_in: dict[str, set[Var]]
+    live_out: dict[str, set[Var]]
+
+
+def analyze_liveness(function: IRFunction) -> Liveness:
+    """Backward dataflow analysis over the control-flow graph, iterated with
+    a worklist until nothing changes."""
+    gen: dict[str, set[Var]] = {}
+    kill: dict[str, set[Var]] = {}
+    predecessors: dict[str, list[str]] = {b.label: [] for b in function.blocks}
+    for block in function.blocks:
+        block_gen: set[Var] = set()
+        block_kill: set[Var] = set()
+        for instruction in reversed(block.instructions):
+            dest = definition(instruction)
+            if dest is not None:
+                block_gen.discard(dest)
+                block_kill.add(dest)
+            block_gen.update(uses(instruction))
+        gen[block.label] = block_gen
+        kill[block.label] = block_kill
+        for successor in function.successors(block):
+            predecessors[successor].append(block.label)
+
+    live_in: dict[str, set[Var]] = {b.label: set() for b in function.blocks}
+    live_out: dict[str, set[Var]] = {b.label: set() for b in function.blocks}
+    successors = {b.label: function.successors(b) for b in function.blocks}
+    # Visiting blocks last to first lets most information flow in one pass.
+    worklist = [b.label for b in function.blocks]
+    queued = set(worklist)
+    while worklist:
+        label = worklist.pop()
+        queued.discard(label)
+        out: set[Var] = set()
+        for successor in successors[label]:
+            out |= live_in[successor]
+        live_out[label] = out
+        new_in = gen[label] | (out - kill[label])
+        if new_in != live_in[label]:
+            live_in[label] = new_in
+            for predecessor in predecessors[label]:
+                if predecessor not in queued:
+                    queued.add(predecessor)
+                    worklist.append(predecessor)
+    return Liveness(live_in, live_out)
+
+
+@dataclass(slots=True)
+class Interval:
+    """Instruction positions, in layout order, from where a variable is
+    first live or written to where it is last live."""
+    start: int
+    end: int
+
+
+def live_intervals(function: IRFunction,
+                   liveness: Liveness) -> dict[Var, Interval]:
+    """One interval per variable, covering every position it is live at.
+
+    Instructions are numbered consecutively through the blocks in layout
+    order. A variable live around a loop gets an interval spanning the whole
+    loop, holes included."""
+    intervals: dict[Var, Interval] = {}
+
+    def extend(var: Var, position: int) -> None:
+        interval = intervals.get(var)
+        if interval is None:
+            intervals[var] = Interval(position, position)
+        elif position < interval.start:
+            interval.start = position
+        elif position > interval.end:
+            interval.end = position
+
+    position = 0
+    for block in function.blocks:
+        first = position
+        last = position + len(block.instructions) - 1
+        for var in liveness.live_in[block.label]:
+            extend(var, first)
+        for var in liveness.live_out[block.label]:
+            extend(var, last)
+        for instruction in block.instructions:
+            for var in uses(instruction):
+                extend(var, position)
+            dest = definition(instruction)
+            if dest is not None:
+                extend(dest, position)
+            position += 1
+    return intervals
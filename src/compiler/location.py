@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class Loc:
     line: int
     column: int
@@ -14,8 +14,13 @@ class Loc:
         return self.line == value.line and self.column == value.column
 
     def __str__(self) -> str:
+        if self.line < 0:
+            return "unknown location"
         return f"line {self.line}, column {self.column}"
 
 
 # Dummy location, is always equal to another location. Useful in tests.
 L = Loc(1, 1)
+
+# Location of nodes whose location information has been stripped.
+NO_LOC = Loc(-1, -1)
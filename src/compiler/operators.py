@@ -0,0 +1,26 @@
+import operator
+from typing import Callable
+
+Value = int | bool | None
+
+# Operators taking two ints. Both operands are always evaluated.
+int_operators: dict[str, Callable[[int, int], Value]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "%": operator.mod,
+    "/": operator.floordiv,  # TODO: maybe this is correct? language spec does not specify
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# Operators taking two bools. The right operand is only evaluated when the
+# left one does not decide the result: `and` stops at false, `or` at true.
+short_circuit_operators: dict[str, bool] = {
+    "and": False,
+    "or": True,
+}
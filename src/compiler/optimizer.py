@@ -0,0 +1,954 @@
+from bisect import bisect_left
+from typing import Any, Callable, Generator, TypeVar
+from compiler.ast import *
+from compiler.resolver import resolve
+from compiler.operators import int_operators, short_circuit_operators
+from compiler.stats import phase
+from compiler.typechecker import children
+from compiler.types import Bool, Int, Type, Unit
+
+arithmetic_operators = ["+", "-", "*", "/", "%"]
+comparison_operators = ["<", ">", "<=", ">=", "==", "!="]
+
+# Operations x OP c that evaluate to x when x is an int.
+right_identities: dict[str, int] = {"+": 0, "-": 0, "*": 1, "/": 1}
+# Operations c OP x that evaluate to x when x is an int.
+left_identities: dict[str, int] = {"+": 0, "*": 1}
+
+# Results of operators longer than this many bits are not folded: they could
+# take arbitrarily long to compute, and limits on ints only apply at run time.
+max_folded_bits = 64
+
+# Identifies a value in eliminate_common_subexpressions.
+Key = tuple[object, ...]
+
+T = TypeVar("T")
+# A step of a pass over a tree, see run.
+Task = Generator["Task[Any]", Any, T]
+
+
+def run(task: Task[T]) -> T:
+    """The result of task, run without recursion.
+
+    A task is a generator that yields the tasks whose results it needs, for
+    example those for its subexpressions, and is sent each result back. They
+    are kept on an explicit stack instead of the call stack, so passes
+    written this way work on arbitrarily deep programs."""
+    stack: list[Task[Any]] = [task]
+    value: Any = None
+    while True:
+        try:
+            sub = stack[-1].send(value)
+        except StopIteration as done:
+            stack.pop()
+            if not stack:
+                return done.value  # type: ignore[no-any-return]
+            value = done.value
+        else:
+            stack.append(sub)
+            value = None
+
+
+def assigned_slots(ast: Expression) -> set[int]:
+    """Slots of all variables that are the target of an assignment."""
+    result: set[int] = set()
+    stack = [ast]
+    while stack:
+        e = stack.pop()
+        match e:
+            case BinaryOp():
+                if e.op == "=" and isinstance(e.left, Identifier):
+                    result.add(e.left.slot)
+                stack += [e.left, e.right]
+            case Block():
+                stack += e.expressions
+            case UnaryOp():
+                stack.append(e.target)
+            case VarDeclaration():
+                stack.append(e.value)
+            case IfBlock():
+                stack += [e.condition, e.then]
+                if e.eelse is not None:
+                    stack.append(e.eelse)
+            case While():
+                stack += [e.condition, e.action]
+            case FunctionCall():
+                stack += e.args
+    return result
+
+
+def declared_slots(ast: Expression) -> set[int]:
+    """Slots of all variables declared in ast."""
+    result: set[int] = set()
+    stack = [ast]
+    while stack:
+        e = stack.pop()
+        if isinstance(e, VarDeclaration):
+            result.add(e.slot)
+        stack += children(e)
+    return result
+
+
+def map_children(e: Expression,
+                 fn: Callable[[Expression], Task[Expression]]) -> Task[Expression]:
+    """A copy of e with each subexpression replaced by the result of running
+    fn on it as a task, in evaluation order. The copy has the location,
+    type and slot of e."""
+    subs: list[Expression] = []
+    for c in children(e):
+        subs.append((yield fn(c)))
+    result: Expression
+    match e:
+        case BinaryOp():
+            result = BinaryOp(e.loc, subs[0], e.op, subs[1])
+        case UnaryOp():
+            result = UnaryOp(e.loc, e.op, subs[0])
+        case VarDeclaration():
+            result = VarDeclaration(e.loc, e.name, subs[0])
+            result.slot = e.slot
+        case IfBlock():
+            result = IfBlock(e.loc, subs[0], subs[1],
+                             subs[2] if e.eelse is not None else None)
+        case While():
+            result = While(e.loc, subs[0], subs[1])
+        case FunctionCall():
+            result = FunctionCall(e.loc, e.name, subs)
+        case Block():
+            result = Block(e.loc, subs)
+        case _:
+            return e
+    result.type = e.type
+    return result
+
+
+def set_child(e: Expression, index: int, child: Expression) -> None:
+    """Make child the subexpression children(e)[index] of e."""
+    match e:
+        case BinaryOp():
+            if index == 0:
+                e.left = child
+            else:
+                e.right = child
+        case UnaryOp():
+            e.target = child
+        case VarDeclaration():
+            e.value = child
+        case IfBlock():
+            if index == 0:
+                e.condition = child
+            elif index == 1:
+                e.then = child
+            else:
+                e.eelse = child
+        case While():
+            if index == 0:
+                e.condition = child
+            else:
+                e.action = child
+        case FunctionCall():
+            e.args[index] = child
+        case Block():
+            e.expressions[index] = child
+
+
+def optimize(ast: Expression) -> Expression:
+    """Run the optimization passes: fold_constants, and then on type checked
+    programs eliminate_common_subexpressions, eliminate_dead_code and
+    hoist_loop_invariants."""
+    with phase("fold") as p:
+        ast = p.output = fold_constants(ast)
+    if ast.type is not None:
+        with phase("cse") as p:
+            ast = p.output = eliminate_common_subexpressions(ast)
+        with phase("dce") as p:
+            ast = p.output = eliminate_dead_code(ast)
+        with phase("licm") as p:
+            ast = p.output = hoist_loop_invariants(ast)
+    return ast
+
+
+def unit(loc: Loc) -> Expression:
+    """An expression without a value, of type Unit."""
+    result = Expression(loc)
+    result.type = Unit
+    return result
+
+
+def pure_nodes(ast: Expression) -> set[int]:
+    """Ids of the nodes of ast that can be skipped when their value is not
+    needed: they have no side effects, always terminate and cannot raise.
+
+    Only valid for type checked programs, where operators cannot fail on
+    the types of their operands."""
+    result: set[int] = set()
+    # Nodes whose children have been marked are marked with True.
+    stack: list[tuple[Expression, bool]] = [(ast, False)]
+    while stack:
+        (e, ready) = stack.pop()
+        if not ready:
+            stack.append((e, True))
+            stack.extend((c, False) for c in reversed(children(e)))
+            continue
+        operands = all(id(c) in result for c in children(e))
+        match e:
+            case Literal() | Identifier():
+                pure = True
+            case BinaryOp():
+                pure = e.op != "=" and operands
+                if e.op in ["/", "%"]:
+                    pure = pure and isinstance(e.right, Literal) \
+                        and e.right.value != 0
+            case UnaryOp() | IfBlock() | Block():
+                pure = operands
+            case _:
+                pure = type(e) is Expression
+        if pure:
+            result.add(id(e))
+    return result
+
+
+def fold_constants(ast: Expression) -> Expression:
+    """Fold constant expressions and propagate constants.
+
+    - Operators applied to literals are replaced by their result, unless
+      evaluating them would raise (for example division by zero or a type
+      error) or the result is longer than max_folded_bits, in which case
+      they are left for run time.
+    - Variables that are initialized with a constant and never assigned to
+      are replaced by that constant.
+    - `x + 0`, `x * 1`, `- - x`, `not not b` and similar identities are
+      simplified when the operand is known to be of the right type.
+    - `if` expressions with a constant condition are replaced by the branch
+      that would be taken.
+
+    New nodes keep the location of the node they replace. If the program has
+    been type checked, they also keep its type, and the types decide which
+    operands are ints or bools."""
+    resolve(ast)
+    assigned = assigned_slots(ast)
+    constants: dict[int, int | bool] = {}
+    # Slots whose variable can only ever hold an int or a bool: assignments
+    # must keep the type the variable was declared with.
+    int_slots: set[int] = set()
+    bool_slots: set[int] = set()
+
+    def is_int(e: Expression) -> bool:
+        if e.type is not None:
+            return e.type == Int
+        match e:
+            case Literal():
+                return type(e.value) is int
+            case Identifier():
+                return e.slot in int_slots
+            case BinaryOp():
+                return e.op in arithmetic_operators
+            case UnaryOp():
+                return e.op == "-"
+            case FunctionCall():
+                return e.name == "read_int"
+        return False
+
+    def is_bool(e: Expression) -> bool:
+        if e.type is not None:
+            return e.type == Bool
+        match e:
+            case Literal():
+                return type(e.value) is bool
+            case Identifier():
+                return e.slot in bool_slots
+            case BinaryOp():
+                return e.op in comparison_operators or e.op in short_circuit_operators
+            case UnaryOp():
+                return e.op == "not"
+        return False
+
+    def fold_binary(ast: BinaryOp) -> Task[Expression]:
+        if ast.op == "=":
+            right = yield fold(ast.right)
+            return BinaryOp(ast.loc, ast.left, ast.op, right)
+
+        left = yield fold(ast.left)
+        if ast.op in short_circuit_operators:
+            if isinstance(left, Literal) and type(left.value) is bool:
+                if left.value is short_circuit_operators[ast.op]:
+                    return left
+                right = yield fold(ast.right)
+                if isinstance(right, Literal) and type(right.value) is bool:
+                    return right
+                return BinaryOp(ast.loc, left, ast.op, right)
+            right = yield fold(ast.right)
+            return BinaryOp(ast.loc, left, ast.op, right)
+
+        right = yield fold(ast.right)
+        fn = int_operators.get(ast.op)
+        if fn is None:
+            return BinaryOp(ast.loc, left, ast.op, right)
+        if isinstance(left, Literal) and isinstance(right, Literal):
+            if isinstance(left.value, int) and isinstance(right.value, int):
+                try:
+                    value = fn(left.value, right.value)
+                except ArithmeticError:
+                    pass
+                else:
+                    assert value is not None
+                    if type(value) is bool or value.bit_length() <= max_folded_bits:
+                        return Literal(ast.loc, value)
+        if (isinstance(right, Literal) and type(right.value) is int
+                and right_identities.get(ast.op) == right.value and is_int(left)):
+            return left
+        if (isinstance(left, Literal) and type(left.value) is int
+                and left_identities.get(ast.op) == left.value and is_int(right)):
+            return right
+        return BinaryOp(ast.loc, left, ast.op, right)
+
+    def fold_unary(ast: UnaryOp) -> Task[Expression]:
+        target = yield fold(ast.target)
+        if isinstance(target, Literal):
+            if ast.op == "-" and isinstance(target.value, int):
+                return Literal(ast.loc, -target.value)
+            if ast.op == "not" and isinstance(target.value, bool):
+                return Literal(ast.loc, not target.value)
+        if isinstance(target, UnaryOp) and target.op == ast.op:
+            if ast.op == "-" and is_int(target.target):
+                return target.target
+            if ast.op == "not" and is_bool(target.target):
+                return target.target
+        return UnaryOp(ast.loc, ast.op, target)
+
+    def fold(ast: Expression) -> Task[Expression]:
+        result = yield from fold_node(ast)
+        if result.type is None:
+            result.type = ast.type
+        return result
+
+    def fold_node(ast: Expression) -> Task[Expression]:
+        match ast:
+            case Literal():
+                return ast
+            case Identifier():
+                if ast.slot in constants:
+                    return Literal(ast.loc, constants[ast.slot])
+                return ast
+            case BinaryOp():
+                return (yield from fold_binary(ast))
+            case UnaryOp():
+                return (yield from fold_unary(ast))
+            case VarDeclaration():
+                value = yield fold(ast.value)
+                if is_int(value):
+                    int_slots.add(ast.slot)
+                elif is_bool(value):
+                    bool_slots.add(ast.slot)
+                if isinstance(value, Literal) and ast.slot not in assigned:
+                    constants[ast.slot] = value.value
+                return VarDeclaration(ast.loc, ast.name, value)
+            case IfBlock():
+                condition = yield fold(ast.condition)
+                if isinstance(condition, Literal) and type(condition.value) is bool:
+                    if condition.value and ast.eelse is None and ast.type is not None:
+                        # Keep the type Unit.
+                        unit = Expression(ast.loc)
+                        unit.type = Unit
+                        then = yield fold(ast.then)
+                        return Block(ast.loc, [then, unit])
+                    if condition.value:
+                        return (yield fold(ast.then))
+                    if ast.eelse is not None:
+                        return (yield fold(ast.eelse))
+                    return Expression(ast.loc)
+                then = yield fold(ast.then)
+                eelse = None
+                if ast.eelse is not None:
+                    eelse = yield fold(ast.eelse)
+                return IfBlock(ast.loc, condition, then, eelse)
+            case While():
+                condition = yield fold(ast.condition)
+                action = yield fold(ast.action)
+                return While(ast.loc, condition, action)
+            case FunctionCall():
+                args = []
+                for e in ast.args:
+                    args.append((yield fold(e)))
+                return FunctionCall(ast.loc, ast.name, args)
+            case Block():
+                expressions = []
+                for e in ast.expressions:
+                    expressions.append((yield fold(e)))
+                return Block(ast.loc, expressions)
+        return ast
+
+    return run(fold(ast))
+
+
+def hoist_loop_invariants(ast: Expression) -> Expression:
+    """Compute expressions whose value is the same on every iteration of a
+    loop once, before the loop.
+
+    An operator is invariant when its operands are literals, variables that
+    are neither assigned nor declared anywhere in the loop, or invariant
+    operators themselves. The largest invariant operators in the condition
+    and body are moved into new variables `licm$1`, `licm$2` and so on,
+    which cannot clash with the program's own variables, declared just
+    before the loop in a new block around it. Inner loops are done first,
+    so their hoisted variables may move further out.
+
+    Function calls are never moved, as read_int and printing have side
+    effects. Neither are `/` and `%` unless dividing by a non-zero literal,
+    as dividing by zero must not fail before a loop that would not have
+    done it. For the same reason this only works on type checked programs,
+    where no operator can fail on the types of its operands.
+
+    Invariance is found once for the whole program: every operator that
+    could move gets the nesting depth of the innermost loop that assigns a
+    variable it reads, and is invariant in the loops nested deeper than
+    that. Each loop then only looks at its own code, not at inner loops,
+    which have nothing left in them that could move further."""
+    resolve(ast)
+    count = 0
+    # Preorder indices of the first node of each subtree and of the first
+    # node after it, and the indices of the assignments and declarations of
+    # each slot, in order.
+    spans: dict[int, tuple[int, int]] = {}
+    writes: dict[int, list[int]] = {}
+    stack: list[tuple[Expression, bool]] = [(ast, False)]
+    index = 0
+    while stack:
+        (e, ready) = stack.pop()
+        if ready:
+            spans[id(e)] = (spans[id(e)][0], index)
+            continue
+        spans[id(e)] = (index, index)
+        if isinstance(e, VarDeclaration):
+            writes.setdefault(e.slot, []).append(index)
+        elif isinstance(e, BinaryOp) and e.op == "=" and isinstance(e.left, Identifier):
+            writes.setdefault(e.left.slot, []).append(index)
+        index += 1
+        stack.append((e, True))
+        stack.extend((c, False) for c in reversed(children(e)))
+    # For each operator that can move and the leaves it reads, the loop
+    # depth at which it stops being invariant.
+    levels: dict[int, int] = {}
+
+    def written_in(slot: int, loop: While) -> bool:
+        (start, end) = spans[id(loop)]
+        indices = writes.get(slot, [])
+        i = bisect_left(indices, start)
+        return i < len(indices) and indices[i] < end
+
+    def level(e: Expression, loops: list[While]) -> int | None:
+        """The level of e, whose operands have theirs already, or None if
+        e can never move."""
+        match e:
+            case Literal():
+                return 0
+            case Identifier() if e.slot >= 0:
+                # The loops assigning the variable are the outermost ones.
+                return bisect_left(range(len(loops)), True,
+                                   key=lambda i: not written_in(e.slot, loops[i]))
+            case BinaryOp() if e.op != "=":
+                if e.op in ["/", "%"] and not (
+                        isinstance(e.right, Literal) and e.right.value != 0):
+                    return None
+            case UnaryOp():
+                pass
+            case _:
+                return None
+        operands = [levels.get(id(c)) for c in children(e)]
+        if None in operands:
+            return None
+        return max(operands)  # type: ignore[type-var]
+
+    def hoist(e: Expression, loops: list[While]) -> Task[Expression]:
+        if isinstance(e, While):
+            loops.append(e)
+        result = yield from map_children(e, lambda c: hoist(c, loops))
+        if isinstance(e, While):
+            loops.pop()
+            return hoist_from(result, len(loops) + 1)
+        result_level = level(result, loops)
+        if result_level is not None and result.type is not None:
+            levels[id(result)] = result_level
+        return result
+
+    def hoist_from(loop: Expression, depth: int) -> Expression:
+        """Move the operators invariant in loop, at the given depth, out of
+        it. The loop is a copy that may be changed."""
+        nonlocal count
+        hoisted: list[Expression] = []
+        # Subexpressions still to visit, as their parent and index.
+        stack = [(loop, i) for i in reversed(range(len(children(loop))))]
+        while stack:
+            (parent, i) = stack.pop()
+            e = children(parent)[i]
+            if not isinstance(e, (BinaryOp, UnaryOp)) \
+                    or levels.get(id(e), depth) >= depth:
+                if not isinstance(e, While):
+                    stack.extend((e, j) for j in reversed(range(len(children(e)))))
+                continue
+            count += 1
+            name = f"licm${count}"
+            declaration = VarDeclaration(e.loc, name, e)
+            declaration.type = Unit
+            hoisted.append(declaration)
+            variable = Identifier(e.loc, name)
+            variable.type = e.type
+            set_child(parent, i, variable)
+        if not hoisted:
+            return loop
+        block = Block(loop.loc, hoisted + [loop])
+        block.type = loop.type
+        return block
+
+    result = run(hoist(ast, []))
+    resolve(result)
+    return result
+
+
+def eliminate_dead_code(ast: Expression) -> Expression:
+    """Remove code whose execution cannot make a difference.
+
+    - Branches of `if` that a constant condition rules out, and loops whose
+      condition is the literal false.
+    - Expressions without side effects (see pure_nodes) whose value is not
+      used, such as all but the last expression of a block.
+    - Dead stores: declarations and assignments whose value is never read,
+      because the variable is assigned again or goes out of scope first.
+      A declaration whose variable is still assigned and read later stays,
+      but gets a literal value if its own value had no side effects.
+
+    Which stores are dead is found by liveness analysis over the tree: it is
+    walked backwards from the end of the program, keeping the set of slots
+    whose current value may still be read. Since every declaration has its
+    own slot, this respects scoping and shadowing without further work;
+    loops are iterated until their live sets stop growing.
+
+    Only works on type checked programs. Nodes whose value is no longer
+    used may get the type Unit."""
+    resolve(ast)
+    pure = pure_nodes(ast)
+    live_stores: set[int] = set()
+    read_slots: set[int] = set()
+
+    def constant_condition(e: IfBlock | While) -> bool | None:
+        if isinstance(e.condition, Literal) and type(e.condition.value) is bool:
+            return e.condition.value
+        return None
+
+    def live(e: Expression, after: frozenset[int],
+             used: bool) -> Task[frozenset[int]]:
+        """Slots live before e, given those live after it. Records the live
+        stores and the slots read in code that will be kept."""
+        if not used and id(e) in pure:
+            return after
+        match e:
+            case Identifier():
+                read_slots.add(e.slot)
+                return after | {e.slot}
+            case BinaryOp(op="=", left=Identifier(slot=slot)):
+                if slot in after:
+                    live_stores.add(id(e))
+                return (yield live(e.right, after - {slot}, id(e) in live_stores))
+            case BinaryOp(op="and" | "or"):
+                right = yield live(e.right, after, True)
+                return (yield live(e.left, after | right, True))
+            case VarDeclaration():
+                if e.slot in after:
+                    live_stores.add(id(e))
+                if id(e) not in live_stores and id(e.value) in pure:
+                    return after - {e.slot}
+                return (yield live(e.value, after - {e.slot}, True))
+            case Block():
+                for (i, sub) in reversed(list(enumerate(e.expressions))):
+                    after = yield live(sub, after, used and i == len(e.expressions) - 1)
+                return after
+            case IfBlock():
+                condition = constant_condition(e)
+                branch_used = used and e.eelse is not None
+                then = yield live(e.then, after, branch_used)
+                eelse = after
+                if e.eelse is not None:
+                    eelse = yield live(e.eelse, after, branch_used)
+                if condition is not None:
+                    return then if condition else eelse
+                return (yield live(e.condition, then | eelse, True))
+            case While():
+                if constant_condition(e) is False:
+                    return after
+                entry: frozenset[int] = frozenset()
+                while True:
+                    body = yield live(e.action, entry, False)
+                    new_entry = yield live(e.condition, after | body, True)
+                    if new_entry == entry:
+                        return entry
+                    entry = new_entry
+        for sub in reversed(children(e)):
+            after = yield live(sub, after, True)
+        return after
+
+    def default(e: Expression) -> Expression:
+        """A literal of the type of e, or a unit."""
+        if e.type == Int or e.type == Bool:
+            result = Literal(e.loc, 0 if e.type == Int else False)
+            result.type = e.type
+            return result
+        return unit(e.loc)
+
+    def visit(e: Expression, used: bool) -> Task[Expression | None]:
+        """e without dead code, or None if nothing is left. Used expressions
+        keep their value and type."""
+        result = yield from rewrite(e, used)
+        if not used:
+            return result
+        if result is None:
+            return unit(e.loc)
+        if result.type != e.type:
+            # A dead store of Unit type left its value behind.
+            block = Block(e.loc, [result, unit(e.loc)])
+            block.type = Unit
+            return block
+        return result
+
+    def value(e: Expression) -> Task[Expression]:
+        result = yield visit(e, True)
+        assert result is not None
+        return result
+
+    def rewrite(e: Expression, used: bool) -> Task[Expression | None]:
+        if not used and id(e) in pure:
+            return None
+        result: Expression
+        match e:
+            case BinaryOp(op="="):
+                if id(e) not in live_stores:
+                    return (yield visit(e.right, False))
+                result = BinaryOp(e.loc, e.left, e.op, (yield value(e.right)))
+            case VarDeclaration():
+                if id(e) in live_stores or id(e.value) not in pure:
+                    if id(e) not in live_stores and e.slot not in read_slots:
+                        return (yield value(e.value))
+                    result = VarDeclaration(e.loc, e.name, (yield value(e.value)))
+                elif e.slot in read_slots:
+                    result = VarDeclaration(e.loc, e.name, default(e.value))
+                else:
+                    return None
+                result.slot = e.slot
+            case Block():
+                last = len(e.expressions) - 1
+                expressions = []
+                for (i, sub) in enumerate(e.expressions):
+                    kept = yield visit(sub, used and i == last)
+                    if kept is not None:
+                        expressions.append(kept)
+                if not expressions and not used:
+                    return None
+                result = Block(e.loc, expressions)
+            case IfBlock():
+                condition = constant_condition(e)
+                branch_used = used and e.eelse is not None
+                if condition is True:
+                    return (yield visit(e.then, branch_used))
+                if condition is False:
+                    if e.eelse is None:
+                        return None
+                    return (yield visit(e.eelse, branch_used))
+                then = yield visit(e.then, branch_used)
+                eelse = None
+                if e.eelse is not None:
+                    eelse = yield visit(e.eelse, branch_used)
+                if then is None and eelse is None and not used:
+                    if id(e.condition) in pure:
+                        return None
+                    return (yield value(e.condition))
+                result = IfBlock(e.loc, (yield value(e.condition)),
+                                 then if then is not None else unit(e.then.loc),
+                                 eelse)
+            case While():
+                if constant_condition(e) is False:
+                    return None
+                action = yield visit(e.action, False)
+                result = While(e.loc, (yield value(e.condition)),
+                               action if action is not None else unit(e.action.loc))
+            case _:
+                return (yield from map_children(e, value))
+        result.type = e.type if used or e.type is None else Unit
+        return result
+
+    run(live(ast, frozenset(), True))
+    result = run(value(ast))
+    resolve(result)
+    return result
+
+
+def eliminate_common_subexpressions(ast: Expression) -> Expression:
+    """Reuse values that have already been computed, by value numbering.
+
+    Operators on literals and variables get a key made of the operator and
+    the numbers given to the keys of its operands, where a variable stands
+    for its slot, so that keys stay small however deep the expression. After
+    `var t = e` or `t = e`, the value of e is available in t until t or a
+    variable read by e is assigned, and later occurrences of e read t
+    instead. After a copy `var t = x` or `t = x`, reads of t read x instead,
+    which usually leaves the copy as a dead store.
+
+    An operator that a statement of a block computes more than once, every
+    time the statement runs, is computed once into a new variable `cse$1`,
+    `cse$2` and so on, declared just before the statement. Not if the
+    statement assigns a variable it reads, and not for `/` and `%` unless
+    dividing by a non-zero literal, as the division could then fail before
+    side effects of the statement that come first.
+
+    What is available follows evaluation order. Values found inside a
+    block, a branch of an `if` or the right operand of `and` and `or` are
+    forgotten after it, as are those reading variables assigned there, and
+    a loop starts without those reading variables assigned anywhere in it.
+    Function calls are never reused, so two read_int() calls stay two; they
+    cannot assign variables, so nothing else is forgotten at them. A value
+    is only reused where the variable holding it is not shadowed.
+
+    Only works on type checked programs."""
+    count = 0
+    next_slot = resolve(ast)
+    # For each key, the variable holding its value and the slots it reads.
+    available: dict[Key, tuple[str, int, frozenset[int]]] = {}
+    # For each variable holding a copy, the variable it was copied from.
+    copies: dict[int, Identifier] = {}
+    scopes: list[dict[str, int]] = [{}]
+    # The number of each operand key, and the slots each operator key reads.
+    numbers: dict[Key, int] = {}
+    operator_reads: dict[Key, frozenset[int]] = {}
+
+    def operator_key(op: str, operands: list[Key | None]) -> Key:
+        """The key of op applied to values with these keys, none None."""
+        numbered: list[int] = []
+        reads: frozenset[int] = frozenset()
+        for operand in operands:
+            assert operand is not None
+            numbered.append(numbers.setdefault(operand, len(numbers)))
+            reads |= key_slots(operand)
+        key = (op, *numbered)
+        operator_reads.setdefault(key, reads)
+        return key
+
+    def key_slots(key: Key) -> frozenset[int]:
+        """Slots of the variables that a value with this key reads."""
+        match key:
+            case ("variable", int(slot)):
+                return frozenset([slot])
+            case ("literal", *_):
+                return frozenset()
+        return operator_reads[key]
+
+    def visible(name: str, slot: int) -> bool:
+        for scope in reversed(scopes):
+            if name in scope:
+                return scope[name] == slot
+        return False
+
+    def variable(loc: Loc, name: str, slot: int, type: Type | None) -> Identifier:
+        result = Identifier(loc, name)
+        result.slot = slot
+        result.type = type
+        return result
+
+    def save() -> tuple[dict[Key, tuple[str, int, frozenset[int]]],
+                        dict[int, Identifier]]:
+        return (dict(available), dict(copies))
+
+    def restore(saved: tuple[dict[Key, tuple[str, int, frozenset[int]]],
+                             dict[int, Identifier]],
+                assigned: set[int]) -> None:
+        available.clear()
+        available.update(saved[0])
+        copies.clear()
+        copies.update(saved[1])
+        invalidate(assigned)
+
+    def invalidate(slots: set[int]) -> None:
+        if not slots:
+            return
+        for (key, (_, slot, reads)) in list(available.items()):
+            if slot in slots or not reads.isdisjoint(slots):
+                del available[key]
+        for (slot, source) in list(copies.items()):
+            if slot in slots or source.slot in slots:
+                del copies[slot]
+
+    def remember(name: str, slot: int, value: Expression, key: Key | None) -> None:
+        """Record that the variable name in slot now holds value."""
+        if isinstance(value, Identifier):
+            if value.slot != slot:
+                copies[slot] = value
+        elif isinstance(value, (BinaryOp, UnaryOp)) and key is not None:
+            reads = key_slots(key)
+            if slot not in reads:
+                available[key] = (name, slot, reads)
+
+    def repeated(e: Expression) -> list[Expression]:
+        """Operators that e computes more than once every time it runs and
+        that can be computed before it instead, smallest first."""
+        assigned = assigned_slots(e)
+        keys: dict[int, Key] = {}
+        sizes: dict[int, int] = {}
+        hoistable: set[int] = set()
+
+        def mark(e: Expression) -> None:
+            """Record the keys and sizes of the nodes of e, and which of
+            them can be hoisted."""
+            stack: list[tuple[Expression, bool]] = [(e, False)]
+            while stack:
+                (node, ready) = stack.pop()
+                if not ready:
+                    stack.append((node, True))
+                    stack.extend((c, False) for c in reversed(children(node)))
+                    continue
+                operands = [keys.get(id(c)) for c in children(node)]
+                key: Key | None = None
+                match node:
+                    case Literal():
+                        key = literal_key(node)
+                    case Identifier():
+                        key = ("variable", node.slot)
+                    case BinaryOp() | UnaryOp() if node.op != "=" and None not in operands:
+                        key = operator_key(node.op, operands)
+                        # Operators that cannot move keep those using them too.
+                        safe = all(id(c) in hoistable for c in children(node)
+                                   if isinstance(c, (BinaryOp, UnaryOp)))
+                        if isinstance(node, BinaryOp) and node.op in ["/", "%"]:
+                            safe = safe and isinstance(node.right, Literal) \
+                                and node.right.value != 0
+                        if safe and key_slots(key).isdisjoint(assigned):
+                            hoistable.add(id(node))
+                if key is not None:
+                    keys[id(node)] = key
+                sizes[id(node)] = 1 + sum(sizes[id(c)] for c in children(node))
+
+        def unconditional(e: Expression) -> list[Expression]:
+            """Subexpressions evaluated every time e is."""
+            match e:
+                case BinaryOp(op="and" | "or"):
+                    return [e.left]
+                case BinaryOp() | UnaryOp() | VarDeclaration() | FunctionCall():
+                    return children(e)
+                case IfBlock():
+                    return [e.condition]
+            return []
+
+        mark(e)
+        chosen: dict[Key, Expression] = {}
+        while True:
+            counts: dict[Key, int] = {}
+            first: dict[Key, Expression] = {}
+            stack = [e]
+            while stack:
+                node = stack.pop()
+                key = keys.get(id(node))
+                if key is not None and key in chosen:
+                    continue
+                if key is not None and id(node) in hoistable and key not in available:
+                    counts[key] = counts.get(key, 0) + 1
+                    first.setdefault(key, node)
+                stack += unconditional(node)
+            candidates = [key for (key, n) in counts.items() if n > 1]
+            if not candidates:
+                return sorted(chosen.values(), key=lambda node: sizes[id(node)])
+            largest = max(candidates, key=lambda key: sizes[id(first[key])])
+            chosen[largest] = first[largest]
+
+    def visit(e: Expression) -> Task[tuple[Expression, Key | None]]:
+        """e with values reused, and its key if it has one."""
+        nonlocal count, next_slot
+        result: Expression
+        key: Key | None = None
+        match e:
+            case Literal():
+                return (e, literal_key(e))
+            case Identifier():
+                source = copies.get(e.slot)
+                if source is not None and visible(source.name, source.slot):
+                    e = variable(e.loc, source.name, source.slot, e.type)
+                return (e, ("variable", e.slot))
+            case BinaryOp(op="=", left=Identifier(slot=slot, name=name)):
+                (right, right_key) = yield visit(e.right)
+                invalidate({slot})
+                remember(name, slot, right, right_key)
+                result = BinaryOp(e.loc, e.left, e.op, right)
+            case BinaryOp():
+                (left, left_key) = yield visit(e.left)
+                if e.op in short_circuit_operators:
+                    saved = save()
+                    (right, right_key) = yield visit(e.right)
+                    restore(saved, assigned_slots(e.right))
+                else:
+                    (right, right_key) = yield visit(e.right)
+                result = BinaryOp(e.loc, left, e.op, right)
+                if left_key is not None and right_key is not None:
+                    key = operator_key(e.op, [left_key, right_key])
+            case UnaryOp():
+                (target, target_key) = yield visit(e.target)
+                result = UnaryOp(e.loc, e.op, target)
+                if target_key is not None:
+                    key = operator_key(e.op, [target_key])
+            case VarDeclaration():
+                (value, value_key) = yield visit(e.value)
+                invalidate({e.slot})
+                scopes[-1][e.name] = e.slot
+                remember(e.name, e.slot, value, value_key)
+                result = VarDeclaration(e.loc, e.name, value)
+                result.slot = e.slot
+            case Block():
+                saved = save()
+                scopes.append({})
+                expressions: list[Expression] = []
+                for sub in e.expressions:
+                    for hoisted in repeated(sub):
+                        count += 1
+                        declaration = VarDeclaration(hoisted.loc, f"cse${count}", hoisted)
+                        declaration.slot = next_slot
+                        declaration.type = Unit
+                        next_slot += 1
+                        expressions.append((yield visit(declaration))[0])
+                    expressions.append((yield visit(sub))[0])
+                scopes.pop()
+                restore(saved, assigned_slots(e))
+                result = Block(e.loc, expressions)
+            case IfBlock():
+                (condition, _) = yield visit(e.condition)
+                saved = save()
+                (then, _) = yield visit(e.then)
+                restore(saved, set())
+                eelse = None
+                if e.eelse is not None:
+                    (eelse, _) = yield visit(e.eelse)
+                    restore(saved, set())
+                invalidate(assigned_slots(e))
+                result = IfBlock(e.loc, condition, then, eelse)
+            case While():
+                invalidate(assigned_slots(e))
+                saved = save()
+                (condition, _) = yield visit(e.condition)
+                (action, _) = yield visit(e.action)
+                restore(saved, set())
+                result = While(e.loc, condition, action)
+            case FunctionCall():
+                args = []
+                for a in e.args:
+                    args.append((yield visit(a))[0])
+                result = FunctionCall(e.loc, e.name, args)
+            case _:
+                return (e, None)
+        result.type = e.type
+        if key is not None and key in available:
+            (name, slot, _) = available[key]
+            if visible(name, slot):
+                return (variable(e.loc, name, slot, e.type), key)
+        return (result, key)
+
+    result = run(visit(ast))[0]
+    resolve(result)
+    return result
+
+
+def literal_key(e: Literal) -> Key:
+    # True == 1 in Python, so the type must be part of the key.
+    return ("literal", type(e.value).__name__, e.value)
+
@@ -1,4 +1,7 @@
-from compiler.tokenizer import Token
+from itertools import chain
+from sys import intern
+from typing import Callable, Iterable, Iterator
+from compiler.tokenizer import Token, fixed_kinds, INT_LITERAL, BOOL_LITERAL, IDENTIFIER
 from compiler.location import L
 from compiler.ast import *
 
@@ -12,26 +15,56 @@ la_operators = [
     ["/", "*", "%"],
 ]
 
+# Precedence level of each binary operator, by token kind
+precedences: dict[int, int] = {
+    fixed_kinds[op]: level for (level, ops) in enumerate(la_operators) for op in ops
+}
 
-def parse(tokens: list[Token]) -> Expression:
+LPAREN = fixed_kinds["("]
+RPAREN = fixed_kinds[")"]
+LBRACE = fixed_kinds["{"]
+RBRACE = fixed_kinds["}"]
+COMMA = fixed_kinds[","]
+SEMICOLON = fixed_kinds[";"]
+ASSIGN = fixed_kinds["="]
+VAR = fixed_kinds["var"]
+ELSE = fixed_kinds["else"]
 
-    pos = 0
+# What the parser loop does next: start parsing an expression, start parsing
+# a term, or hand the value that was just parsed to the innermost construct
+# that is waiting for it.
+EXPRESSION = 0
+TERM = 1
+VALUE = 2
+
+
+def parse(tokens: Iterable[Token]) -> Expression:
+    """Parse a program from a list or any other iterable of tokens.
+
+    Tokens are consumed one at a time, so a lazy token stream never has to be
+    held in memory as a whole.
+
+    The parser does not recurse: every construct that is waiting for a
+    sub-expression pushes a continuation onto an explicit stack, and binary
+    operators are combined by precedence with an operand and an operator
+    stack. Nesting depth is therefore only limited by memory."""
+
+    source = iter(tokens)
+    end = Token(L, "end", "")
+    stream: Iterator[Token] = iter([])
+    lookahead = end
     last_token: Token | None = None
+    value: Expression = Expression(L)
+    # Continuations waiting for the value of the expression being parsed
+    stack: list[Callable[[Expression], int]] = []
 
     def peek() -> Token:
-        if pos < len(tokens):
-            return tokens[pos]
-        else:
-            return Token(
-                tokens[-1].loc,
-                "end",
-                "",
-            )
+        return lookahead
 
     def consume(expected: str | list[str] | None = None) -> Token:
-        nonlocal pos
+        nonlocal lookahead
         nonlocal last_token
-        token = peek()
+        token = lookahead
         last_token = token
         if isinstance(expected, str) and token.text != expected:
             raise Exception(f'{token.loc}: expected "{expected}"')
@@ -39,147 +72,207 @@ def parse(tokens: list[Token]) -> Expression:
             comma_separated = ", ".join([f'"{e}"' for e in expected])
             raise Exception(
                 f'{token.loc}: expected one of: {comma_separated}')
-        pos += 1
+        lookahead = next(stream, end)
         return token
 
+    def produce(result: Expression) -> int:
+        nonlocal value
+        value = result
+        return VALUE
+
     def semicolon_needed_after(e: Expression) -> bool:
         return not (last_token is not None and last_token.text == "}")
 
-    def parse_literal() -> Literal:
-        value = consume()
-        if value.type == "int_literal":
-            return Literal(value.loc, int(value.text))
-        elif value.type == "bool_literal":
-            return Literal(value.loc, value.text == "true")
-        else:
-            raise Exception(f"{value.loc}: expected literal")
-
-    def parse_arg_list() -> list[Expression]:
-        result = [parse_expression()]
-        while peek().text == ",":
-            consume(",")
-            result.append(parse_expression())
-        return result
-
-    def parse_identifier_or_function() -> Expression:
-        value = consume()
-        if value.type != "identifier":
-            raise Exception(f"{value.loc}: expected identifier")
-        if peek().text != "(":
-            return Identifier(value.loc, value.text)
+    def parse_int_literal() -> int:
+        token = consume()
+        return produce(Literal(token.loc, int(token.text)))
+
+    def parse_bool_literal() -> int:
+        token = consume()
+        return produce(Literal(token.loc, token.text == "true"))
+
+    def parse_identifier_or_function() -> int:
+        token = consume()
+        name = intern(token.text)
+        if peek().kind != LPAREN:
+            return produce(Identifier(token.loc, name))
         consume("(")
-        args = parse_arg_list()
-        consume(")")
-        return FunctionCall(value.loc, value.text, args)
-
-    def parse_term() -> Expression:
-        value = peek()
-        result = None
-        unary = None
-        if value.text in ["-", "not"]:
-            unary = value.text
-            consume()
-        if value.type == "identifier":
-            result = parse_identifier_or_function()
-        elif value.type == "int_literal" or value.type == "bool_literal":
-            result = parse_literal()
-        elif value.text == "(":
-            result = parse_parenthesized()
-        elif value.text == "{":
-            result = parse_block()
-        elif value.text == "if":
-            result = parse_if_then_else()
-        elif value.text == "while":
-            result = parse_while()
-        elif value.text in ["-", "not"]:
-            result = parse_term()
-        else:
-            raise Exception(f"{value.loc}: expected term")
-        if not unary:
-            return result
-        return UnaryOp(value.loc, unary, result)
-
-    def parse_la_operator(level: int) -> Expression:
-        if level == len(la_operators):
-            return parse_term()
-        left = parse_la_operator(level + 1)
-        while peek().text in la_operators[level]:
-            operator_token = consume(
-                la_operators[level])
-            right = parse_la_operator(level + 1)
-            left = BinaryOp(operator_token.loc, left,
-                            operator_token.text, right)
-        return left
-
-    def parse_assignment_operator() -> Expression:
-        left = parse_la_operator(0)
-        if peek().text != "=":
-            return left
-        l = consume("=").loc
-        right = parse_assignment_operator()
-        return BinaryOp(l, left, "=", right)
-
-    def parse_parenthesized() -> Expression:
+        args: list[Expression] = []
+        if peek().kind == RPAREN:
+            consume(")")
+            return produce(FunctionCall(token.loc, name, args))
+
+        def after_argument(argument: Expression) -> int:
+            args.append(argument)
+            if peek().kind == COMMA:
+                consume(",")
+                stack.append(after_argument)
+                return EXPRESSION
+            consume(")")
+            return produce(FunctionCall(token.loc, name, args))
+        stack.append(after_argument)
+        return EXPRESSION
+
+    def parse_unary() -> int:
+        token = consume()
+        op = intern(token.text)
+        stack.append(lambda target: produce(UnaryOp(token.loc, op, target)))
+        return TERM
+
+    def parse_parenthesized() -> int:
         consume('(')
-        result = parse_expression()
-        consume(')')
-        return result
 
-    def parse_block() -> Block:
-        expressions: list[Expression] = []
+        def after_expression(result: Expression) -> int:
+            consume(')')
+            return produce(result)
+        stack.append(after_expression)
+        return EXPRESSION
+
+    def parse_block() -> int:
         l = consume("{").loc
-        return_last = False
-        while peek().text != "}":
-            if peek().text == "var":
+        expressions: list[Expression] = []
+
+        def next_expression() -> int:
+            if peek().kind == RBRACE:
+                consume("}")
+                expressions.append(Expression(l))
+                return produce(Block(l, expressions))
+            stack.append(after_expression)
+            if peek().kind == VAR:
                 # var only allowed directly inside blocks
-                expressions.append(parse_variable_declaration())
-            else:
-                expressions.append(parse_expression())
-            if peek().text == "}":
-                return_last = True
-                break
-            if semicolon_needed_after(expressions[-1]) or peek().text == ";":
+                return parse_variable_declaration()
+            return EXPRESSION
+
+        def after_expression(e: Expression) -> int:
+            expressions.append(e)
+            if peek().kind == RBRACE:
+                consume("}")
+                return produce(Block(l, expressions))
+            if semicolon_needed_after(e) or peek().kind == SEMICOLON:
                 consume(";")  # a semicolon is optional after }
-        consume("}")
-        if not return_last:
-            expressions.append(Expression(l))
-        return Block(l, expressions)
+            return next_expression()
+
+        return next_expression()
 
-    def parse_if_then_else() -> IfBlock:
+    def parse_if_then_else() -> int:
         l = consume('if').loc
-        condition = parse_expression()
-        consume('then')
-        then = parse_expression()
-        if peek().text != "else":
-            return IfBlock(l, condition, then, None)
-        consume("else")
-        eelse = parse_expression()
-        return IfBlock(l, condition, then, eelse)
-
-    def parse_while() -> While:
+
+        def after_condition(condition: Expression) -> int:
+            consume('then')
+
+            def after_then(then: Expression) -> int:
+                if peek().kind != ELSE:
+                    return produce(IfBlock(l, condition, then, None))
+                consume("else")
+                stack.append(lambda eelse: produce(
+                    IfBlock(l, condition, then, eelse)))
+                return EXPRESSION
+            stack.append(after_then)
+            return EXPRESSION
+        stack.append(after_condition)
+        return EXPRESSION
+
+    def parse_while() -> int:
         l = consume("while").loc
-        condition = parse_expression()
-        consume("do")
-        action = parse_expression()
-        return While(l, condition, action)
 
-    def parse_variable_declaration() -> VarDeclaration:
+        def after_condition(condition: Expression) -> int:
+            consume("do")
+            stack.append(lambda action: produce(While(l, condition, action)))
+            return EXPRESSION
+        stack.append(after_condition)
+        return EXPRESSION
+
+    def parse_variable_declaration() -> int:
         l = consume("var").loc
-        name = consume().text
+        name = intern(consume().text)
         consume("=")
-        value = parse_expression()
-        return VarDeclaration(l, name, value)
+        stack.append(lambda value: produce(VarDeclaration(l, name, value)))
+        return EXPRESSION
+
+    def parse_operators() -> int:
+        operands: list[Expression] = []
+        operators: list[Token] = []
+
+        def reduce() -> None:
+            right = operands.pop()
+            left = operands.pop()
+            operator_token = operators.pop()
+            operands.append(BinaryOp(operator_token.loc, left,
+                                     intern(operator_token.text), right))
 
-    def parse_expression() -> Expression:
-        if peek().text == "{":
+        def after_operand(operand: Expression) -> int:
+            operands.append(operand)
+            precedence = precedences.get(peek().kind)
+            if precedence is None:
+                while operators:
+                    reduce()
+                return produce(operands[0])
+            while operators and precedences[operators[-1].kind] >= precedence:
+                reduce()
+            operators.append(consume())
+            stack.append(after_operand)
+            return TERM
+        stack.append(after_operand)
+        return TERM
+
+    def parse_assignment_operator() -> int:
+        targets: list[tuple[Expression, Loc]] = []
+
+        def after_operand(operand: Expression) -> int:
+            if peek().kind == ASSIGN:
+                targets.append((operand, consume("=").loc))
+                stack.append(after_operand)
+                return parse_operators()
+            result = operand
+            for (left, l) in reversed(targets):
+                result = BinaryOp(l, left, "=", result)
+            return produce(result)
+        stack.append(after_operand)
+        return parse_operators()
+
+    def parse_expression() -> int:
+        if peek().kind == LBRACE:
             return parse_block()
         return parse_assignment_operator()
 
-    if not tokens:
+    term_parsers: dict[int, Callable[[], int]] = {
+        INT_LITERAL: parse_int_literal,
+        BOOL_LITERAL: parse_bool_literal,
+        IDENTIFIER: parse_identifier_or_function,
+        # and/or are plain identifiers where a term is expected
+        fixed_kinds["and"]: parse_identifier_or_function,
+        fixed_kinds["or"]: parse_identifier_or_function,
+        fixed_kinds["-"]: parse_unary,
+        fixed_kinds["not"]: parse_unary,
+        LPAREN: parse_parenthesized,
+        LBRACE: parse_block,
+        fixed_kinds["if"]: parse_if_then_else,
+        fixed_kinds["while"]: parse_while,
+    }
+
+    first = next(source, None)
+    if first is None:
         return Expression(Loc(1, 1))
-    tokens.append(Token(L, "punctuation", "}"))
-    tokens.insert(0, Token(L, "punctuation", "{"))
-    result = parse_expression()
-    if pos != len(tokens):
+    stream = chain(
+        [Token(L, "punctuation", "{"), first],
+        source,
+        [Token(L, "punctuation", "}")])
+    lookahead = next(stream)
+
+    state = parse_expression()
+    while True:
+        if state == VALUE:
+            if not stack:
+                break
+            state = stack.pop()(value)
+        elif state == TERM:
+            term_parser = term_parsers.get(peek().kind)
+            if term_parser is None:
+                raise Exception(f"{peek().loc}: expected term")
+            state = term_parser()
+        else:
+            state = parse_expression()
+
+    if lookahead is not end:
         raise Exception("expected EOF")
-    return result
+    return value
@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from time import perf_counter, process_time
+import tracemalloc
+from types import TracebackType
+from typing import Any, Iterator
+
+from compiler.ast import *
+from compiler.bytecode import Bytecode
+from compiler.ir import IRFunction
+from compiler.stats import Phase, observe_phases
+from compiler.tokenizer import TokenBuffer
+
+
+def count_nodes(ast: Expression) -> int:
+    count = 0
+    stack = [ast]
+    while stack:
+        e = stack.pop()
+        count += 1
+        match e:
+            case BinaryOp():
+                stack += [e.left, e.right]
+            case Block():
+                stack += e.expressions
+            case UnaryOp():
+                stack.append(e.target)
+            case VarDeclaration():
+                stack.append(e.value)
+            case IfBlock():
+                stack += [e.condition, e.then]
+                if e.eelse is not None:
+                    stack.append(e.eelse)
+            case While():
+                stack += [e.condition, e.action]
+            case FunctionCall():
+                stack += e.args
+    return count
+
+
+@dataclass
+class PhaseProfile:
+    name: str
+    # Number of enclosing phases
+    depth: int
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    # Most memory allocated during the phase, on top of what was allocated
+    # when it started
+    peak_memory_bytes: int = 0
+    tokens: int | None = None
+    nodes: int | None = None
+    instructions: int | None = None
+
+
+class Profiler:
+    """Measure every compiler phase run while the profiler is active.
+
+    Each phase gets its wall and CPU time, its peak memory according to
+    tracemalloc, and the size of what it produced: the number of tokens,
+    AST nodes or bytecode or IR instructions. Tracing allocations slows Python
+    down considerably, which the times include."""
+
+    def __init__(self) -> None:
+        self.phases: list[PhaseProfile] = []
+        # Open phases and the memory allocated when each started
+        self._open: list[tuple[PhaseProfile, int]] = []
+
+    def __enter__(self) -> "Profiler":
+        tracemalloc.start()
+        observe_phases(self.observe)
+        return self
+
+    def __exit__(self, type: type[BaseException] | None,
+                 value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        observe_phases(None)
+        tracemalloc.stop()
+
+    @contextmanager
+    def observe(self, phase: Phase) -> Iterator[None]:
+        profile = PhaseProfile(phase.name, len(self._open))
+        self.phases.append(profile)
+        current, peak = tracemalloc.get_traced_memory()
+        # The peak is reset for this phase, so save it for the enclosing ones.
+        for (enclosing, start) in self._open:
+            enclosing.peak_memory_bytes = max(
+                enclosing.peak_memory_bytes, peak - start)
+        tracemalloc.reset_peak()
+        self._open.append((profile, current))
+        wall = perf_counter()
+        cpu = process_time()
+        try:
+            yield
+        finally:
+            profile.wall_seconds = perf_counter() - wall
+            profile.cpu_seconds = process_time() - cpu
+            self._open.pop()
+            _, peak = tracemalloc.get_traced_memory()
+            profile.peak_memory_bytes = max(
+                profile.peak_memory_bytes, peak - current)
+            if self._open:
+                enclosing, start = self._open[-1]
+                enclosing.peak_memory_bytes = max(
+                    enclosing.peak_memory_bytes, peak - start)
+            self._count_output(profile, phase.output)
+
+    def _count_output(self, profile: PhaseProfile, output: Any) -> None:
+        if isinstance(output, (list, TokenBuffer)):
+            profile.tokens = len(output)
+        elif isinstance(output, Expression):
+            profile.nodes = count_nodes(output)
+        elif isinstance(output, Bytecode):
+            profile.instructions = len(output.code) // 2
+        elif isinstance(output, IRFunction):
+            profile.instructions = output.instruction_count()
+
+    def to_json(self) -> dict[str, Any]:
+        return {"phases": [asdict(p) for p in self.phases]}
+
+    def report(self) -> str:
+        lines = [f"{'phase':<20} {'wall ms':>10} {'cpu ms':>10} "
+                 f"{'peak KiB':>10}  output"]
+        for p in self.phases:
+            name = "  " * p.depth + p.name
+            output = ""
+            if p.tokens is not None:
+                output = f"{p.tokens} tokens"
+            elif p.nodes is not None:
+                output = f"{p.nodes} nodes"
+            elif p.instructions is not None:
+                output = f"{p.instructions} instructions"
+            lines.append(
+                f"{name:<20} {p.wall_seconds * 1000:>10.3f} "
+                f"{p.cpu_seconds * 1000:>10.3f} "
+                f"{p.peak_memory_bytes / 1024:>10.1f}  {output}")
+        return "\n".join(lines)
@@ -0,0 +1,101 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+
+from compiler.ir import Call, IRFunction, Var
+from compiler.liveness import Interval, analyze_liveness, live_intervals
+
+# Registers the runtime functions preserve. Values live across a call must
+# be kept in one of these, or on the stack.
+callee_saved_registers = ["%rbx", "%r12", "%r13", "%r14", "%r15"]
+# Registers the runtime functions may overwrite. %rax, %rcx, %rdx and %r11
+# are left out: the code generator uses them as scratch registers.
+caller_saved_registers = ["%rsi", "%rdi", "%r8", "%r9", "%r10"]
+
+
+@dataclass(slots=True)
+class Allocation:
+    """Where each IR variable lives: a register, or the stack slot with the
+    given index."""
+    registers: dict[Var, str]
+    spilled: dict[Var, int]
+
+    def used_callee_saved(self) -> list[str]:
+        used = set(self.registers.values())
+        return [r for r in callee_saved_registers if r in used]
+
+
+def call_positions(function: IRFunction) -> list[int]:
+    positions = []
+    position = 0
+    for block in function.blocks:
+        for instruction in block.instructions:
+            if isinstance(instruction, Call):
+                positions.append(position)
+            position += 1
+    return positions
+
+
+def allocate_registers(function: IRFunction) -> Allocation:
+    """Linear scan register allocation (Poletto and Sarkar).
+
+    Intervals are visited in order of their start. Registers of intervals
+    that have ended are freed, and when none is free, whichever of the new
+    interval and the active ones ends last is spilled to the stack. An
+    interval that contains a call gets a callee-saved register, so the value
+    survives the call.
+
+    An interval may take the register of one ending at its first
+    instruction: the code generator reads all operands before writing the
+    result."""
+    intervals = live_intervals(function, analyze_liveness(function))
+    calls = call_positions(function)
+    registers: dict[Var, str] = {}
+    spilled: dict[Var, int] = {}
+    free_callee_saved = list(reversed(callee_saved_registers))
+    free_caller_saved = list(reversed(caller_saved_registers))
+    # Variables in a register, and their intervals
+    active: list[tuple[Var, Interval]] = []
+
+    def crosses_call(interval: Interval) -> bool:
+        # The first call strictly after the start must be before the end.
+        index = bisect_right(calls, interval.start)
+        return index < len(calls) and calls[index] < interval.end
+
+    def release(register: str) -> None:
+        if register in callee_saved_registers:
+            free_callee_saved.append(register)
+        else:
+            free_caller_saved.append(register)
+
+    def spill(var: Var) -> None:
+        spilled[var] = len(spilled)
+
+    ordered = sorted(intervals.items(), key=lambda item: (item[1].start, item[0]))
+    for (var, interval) in ordered:
+        still_active = []
+        for (other, other_interval) in active:
+            if other_interval.end <= interval.start:
+                release(registers[other])
+            else:
+                still_active.append((other, other_interval))
+        active = still_active
+
+        needs_callee_saved = crosses_call(interval)
+        if not needs_callee_saved and free_caller_saved:
+            registers[var] = free_caller_saved.pop()
+        elif free_callee_saved:
+            registers[var] = free_callee_saved.pop()
+        else:
+            candidates = [
+                (other, other_interval) for (other, other_interval) in active
+                if not needs_callee_saved
+                or registers[other] in callee_saved_registers]
+            victim = max(candidates, key=lambda c: c[1].end, default=None)
+            if victim is None or victim[1].end <= interval.end:
+                spill(var)
+                continue
+            registers[var] = registers.pop(victim[0])
+            spill(victim[0])
+            active.remove(victim)
+        active.append((var, interval))
+    return Allocation(registers, spilled)
@@ -0,0 +1,72 @@
+from compiler.ast import *
+
+# Work items: a node to visit, "enter"/"exit" for block boundaries, or a
+# declaration whose value has been visited and which can now be bound.
+Task = Expression | str | tuple[VarDeclaration]
+
+
+def resolve(ast: Expression) -> int:
+    """Assign every variable declaration its own slot in a flat frame.
+
+    Each Identifier and VarDeclaration gets its `slot` filled in, so the
+    execution engines can read and write variables by index instead of
+    searching through nested scopes. Identifiers that do not refer to any
+    declaration visible at that point get slot -1, which the engines report
+    as an unknown identifier when (and if) they are evaluated.
+
+    Declarations are resolved in textual order, which is also the order they
+    are executed in, so shadowing works exactly as with nested scopes.
+
+    Returns the number of slots the frame needs."""
+    slots = 0
+    visible: dict[str, int] = {}
+    # For each open block, the bindings shadowed by its declarations.
+    shadowed: list[list[tuple[str, int | None]]] = [[]]
+    stack: list[Task] = [ast]
+
+    while stack:
+        task = stack.pop()
+        if isinstance(task, str):
+            if task == "enter":
+                shadowed.append([])
+            else:
+                for (name, previous) in reversed(shadowed.pop()):
+                    if previous is None:
+                        del visible[name]
+                    else:
+                        visible[name] = previous
+            continue
+        if isinstance(task, tuple):
+            declaration = task[0]
+            shadowed[-1].append(
+                (declaration.name, visible.get(declaration.name)))
+            declaration.slot = slots
+            visible[declaration.name] = slots
+            slots += 1
+            continue
+        match task:
+            case Identifier():
+                task.slot = visible.get(task.name, -1)
+            case Block():
+                stack.append("exit")
+                stack.extend(reversed(task.expressions))
+                stack.append("enter")
+            case VarDeclaration():
+                stack.append((task,))
+                stack.append(task.value)
+            case BinaryOp():
+                stack.append(task.right)
+                stack.append(task.left)
+            case UnaryOp():
+                stack.append(task.target)
+            case IfBlock():
+                if task.eelse is not None:
+                    stack.append(task.eelse)
+                stack.append(task.then)
+                stack.append(task.condition)
+            case While():
+                stack.append(task.action)
+                stack.append(task.condition)
+            case FunctionCall():
+                stack.extend(reversed(task.args))
+    return slots
@@ -0,0 +1,197 @@
+# The runtime linked into every executable, in GNU assembler syntax.
+#
+# It does not use libc: the program starts at _start, talks to the kernel
+# with system calls and exits with status 0. Output is buffered and flushed
+# when the buffer fills up, before reading input and at exit. The generated
+# program is expected to define a function called program.
+#
+# print_int, print_bool and read_int take their argument in %rdi and return
+# their result in %rax. They may clobber %rax, %rcx, %rdx, %rsi, %rdi and
+# %r8-%r11, but nothing else.
+
+runtime_assembly = r"""
+    .section .bss
+    .lcomm output_buffer, 4096
+    .lcomm output_length, 8
+    .lcomm input_buffer, 4096
+    .lcomm input_position, 8
+    .lcomm input_length, 8
+
+    .section .rodata
+true_text:
+    .ascii "true\n"
+false_text:
+    .ascii "false\n"
+read_error_text:
+    .ascii "Error: read_int expected an integer\n"
+    .equ read_error_length, . - read_error_text
+
+    .text
+    .global _start
+_start:
+    call program
+    call flush_output
+    mov $60, %eax                   # exit(0)
+    xor %edi, %edi
+    syscall
+
+# Append %rdx bytes at %rsi to the output buffer.
+write_bytes:
+    mov output_length(%rip), %rax
+    add %rdx, %rax
+    cmp $4096, %rax
+    jbe 1f
+    push %rsi
+    push %rdx
+    call flush_output
+    pop %rdx
+    pop %rsi
+1:
+    lea output_buffer(%rip), %rdi
+    add output_length(%rip), %rdi
+    add %rdx, output_length(%rip)
+    mov %rdx, %rcx
+    rep movsb
+    ret
+
+flush_output:
+    mov output_length(%rip), %rdx
+    lea output_buffer(%rip), %rsi
+1:
+    test %rdx, %rdx
+    jz 2f
+    mov $1, %eax                    # write(1, %rsi, %rdx)
+    mov $1, %edi
+    push %rsi
+    push %rdx
+    syscall
+    pop %rdx
+    pop %rsi
+    test %rax, %rax
+    jle 2f                          # nothing more can be written
+    add %rax, %rsi
+    sub %rax, %rdx
+    jmp 1b
+2:
+    movq $0, output_length(%rip)
+    ret
+
+print_int:
+    sub $32, %rsp
+    lea 31(%rsp), %rsi              # digits are written backwards from here
+    movb $10, (%rsi)
+    mov %rdi, %rax
+    test %rax, %rax
+    jns 1f
+    neg %rax                        # as unsigned, correct for the minimum too
+1:
+    mov $10, %ecx
+2:
+    xor %edx, %edx
+    div %rcx
+    add $48, %dl
+    dec %rsi
+    mov %dl, (%rsi)
+    test %rax, %rax
+    jnz 2b
+    test %rdi, %rdi
+    jns 3f
+    dec %rsi
+    movb $45, (%rsi)
+3:
+    lea 32(%rsp), %rdx
+    sub %rsi, %rdx
+    call write_bytes
+    add $32, %rsp
+    ret
+
+print_bool:
+    test %rdi, %rdi
+    jz 1f
+    lea true_text(%rip), %rsi
+    mov $5, %edx
+    jmp write_bytes
+1:
+    lea false_text(%rip), %rsi
+    mov $6, %edx
+    jmp write_bytes
+
+# The next byte of standard input in %eax, or -1 at the end of input.
+# Preserves %r8-%r10.
+read_byte:
+    mov input_position(%rip), %rcx
+    cmp input_length(%rip), %rcx
+    jb 1f
+    xor %eax, %eax                  # read(0, input_buffer, 4096)
+    xor %edi, %edi
+    lea input_buffer(%rip), %rsi
+    mov $4096, %edx
+    syscall
+    test %rax, %rax
+    jle 2f
+    mov %rax, input_length(%rip)
+    xor %ecx, %ecx
+1:
+    lea input_buffer(%rip), %rsi
+    movzbl (%rsi,%rcx), %eax
+    inc %rcx
+    mov %rcx, input_position(%rip)
+    ret
+2:
+    movq $0, input_position(%rip)
+    movq $0, input_length(%rip)
+    mov $-1, %eax
+    ret
+
+# Read a line containing an optionally negative decimal integer.
+read_int:
+    call flush_output
+    xor %r8, %r8                    # value
+    xor %r9, %r9                    # 1 if negative
+    xor %r10, %r10                  # number of digits
+    call read_byte
+    cmp $45, %eax
+    jne 2f
+    mov $1, %r9
+1:
+    call read_byte
+2:
+    cmp $48, %eax
+    jl 3f
+    cmp $57, %eax
+    jg 3f
+    imul $10, %r8, %r8
+    sub $48, %eax
+    add %rax, %r8
+    inc %r10
+    jmp 1b
+3:
+    test %r10, %r10
+    jz read_error
+    cmp $13, %eax
+    jne 4f
+    call read_byte
+4:
+    cmp $10, %eax
+    je 5f
+    cmp $-1, %eax
+    jne read_error
+5:
+    mov %r8, %rax
+    test %r9, %r9
+    jz 6f
+    neg %rax
+6:
+    ret
+
+read_error:
+    call flush_output
+    mov $1, %eax                    # write(2, read_error_text, ...)
+    mov $2, %edi
+    lea read_error_text(%rip), %rsi
+    mov $read_error_length, %edx
+    syscall
+    mov $60, %eax                   # exit(1)
+    mov $1, %edi
+    syscall
+"""
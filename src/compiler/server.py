@@ -0,0 +1,469 @@
+import asyncio
+from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import gc
+import json
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import sys
+from time import perf_counter
+from socketserver import ForkingTCPServer, StreamRequestHandler
+from traceback import format_exception
+from typing import Any, Callable
+
+from compiler.cache import CompileCache
+from compiler.stats import QUEUE_DEPTH, ServerStats, observe_phases
+
+Compiler = Callable[[str], bytes]
+
+listen_backlog = 128
+
+# Framed messages longer than this are rejected and the connection closed.
+max_message_size = 64 * 1024 * 1024
+# Requests that may be waiting for their response on a single connection
+# before the server stops reading more of them.
+max_pipelined_requests = 128
+
+# Compiled once in the parent before forking, so that lazily initialized
+# state is already in place and shared copy-on-write.
+warm_up_program = """
+var x = 1;
+while x < 10 do {
+    if x % 2 == 0 and not false then print_int(x) else x = x + 1;
+    x = x * 2 - 1
+}
+"""
+
+
+def warm_up(compile: Compiler) -> None:
+    """Run the compiler once and freeze the heap before forking workers.
+
+    gc.freeze() moves everything allocated so far out of the garbage
+    collector's reach, so that collections in forked workers do not touch,
+    and thereby copy, the pages they share with the parent."""
+    try:
+        compile(warm_up_program)
+    except Exception:
+        pass
+    gc.collect()
+    gc.freeze()
+
+
+def error_message(e: BaseException) -> str:
+    return "".join(format_exception(e))
+
+
+def handle_request(data: bytes, compile: Compiler,
+                   cache: CompileCache | None = None,
+                   stats: ServerStats | None = None) -> bytes:
+    """Answer one JSON request and return the JSON response."""
+    start = perf_counter()
+    if stats is not None:
+        stats.request_started()
+    result: dict[str, Any] = {}
+    try:
+        input = json.loads(data.decode())
+        if input["command"] == "compile":
+            source_code = input["code"]
+            if cache is not None:
+                executable = cache.get_or_compile(source_code, compile)
+            else:
+                executable = compile(source_code)
+            result["program"] = b64encode(executable).decode()
+        elif input["command"] == "ping":
+            pass
+        elif input["command"] == "stats" and stats is not None:
+            result.update(stats.snapshot(cache))
+        else:
+            result["error"] = "Unknown command: " + input['command']
+    except Exception as e:
+        result["error"] = error_message(e)
+    if stats is not None:
+        stats.request_finished(perf_counter() - start, "error" in result)
+    return json.dumps(result).encode()
+
+
+def run_server(host: str, port: int, compile: Compiler,
+               cache: CompileCache | None = None) -> None:
+    """Serve requests, forking a new process for every connection."""
+    stats = ServerStats()
+    observe_phases(stats.observe)
+
+    class Server(ForkingTCPServer):
+        allow_reuse_address = True
+        request_queue_size = 32
+
+    class Handler(StreamRequestHandler):
+        def handle(self) -> None:
+            input = self.rfile.read()
+            self.request.sendall(handle_request(input, compile, cache, stats))
+
+    print(f"Starting TCP server at {host}:{port}")
+    with Server((host, port), Handler) as server:
+        server.serve_forever()
+
+
+def create_listeners(host: str, port: int,
+                     unix_socket: str | None) -> list[socket.socket]:
+    """A TCP listening socket, followed by a Unix one if a path is given."""
+    listeners = [socket.create_server((host, port), backlog=listen_backlog)]
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        unix = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        unix.bind(unix_socket)
+        unix.listen(listen_backlog)
+        listeners.append(unix)
+    return listeners
+
+
+def accept_queue_length(listeners: list[socket.socket]) -> int:
+    """Connections waiting to be accepted on the TCP listening sockets.
+
+    Linux reports it in tcpi_unacked of TCP_INFO for a listening socket.
+    Unix sockets, and systems without TCP_INFO, count as empty."""
+    total = 0
+    for listener in listeners:
+        if listener.family == socket.AF_UNIX or not hasattr(socket, "TCP_INFO"):
+            continue
+        info = listener.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 32)
+        total += int.from_bytes(info[24:28], sys.byteorder)
+    return total
+
+
+def close_listeners(listeners: list[socket.socket],
+                    unix_socket: str | None) -> None:
+    for listener in listeners:
+        listener.close()
+    if unix_socket is not None and os.path.exists(unix_socket):
+        os.unlink(unix_socket)
+
+
+class PreforkServer:
+    """A fixed pool of worker processes accepting on shared sockets.
+
+    The listening sockets are created and the compiler warmed up in the
+    parent before the workers are forked. All workers wait on the same
+    listening sockets and the kernel hands each connection to one of them.
+
+    The parent only supervises: it replaces workers that die and stops all
+    of them when it is interrupted or terminated.
+
+    Connections that no worker is free to accept wait in the kernel's
+    accept queue, whose length is reported as queue_depth."""
+
+    def __init__(self, host: str, port: int, compile: Compiler, workers: int,
+                 unix_socket: str | None = None,
+                 cache: CompileCache | None = None) -> None:
+        if workers < 1:
+            raise Exception("at least one worker required")
+        self.compile = compile
+        self.workers = workers
+        self.cache = cache
+        self.unix_socket = unix_socket
+        self.listeners = create_listeners(host, port, unix_socket)
+        self.address: tuple[str, int] = self.listeners[0].getsockname()[:2]
+        self.stats = ServerStats(
+            measure_queue=lambda: accept_queue_length(self.listeners))
+        for listener in self.listeners:
+            # Several workers are woken for one connection; all but one of
+            # them must not block in accept().
+            listener.setblocking(False)
+
+    def serve_forever(self) -> None:
+        warm_up(self.compile)
+        observe_phases(self.stats.observe)
+        pids: set[int] = set()
+        previous_handler = signal.signal(
+            signal.SIGTERM, signal.default_int_handler)
+        try:
+            for _ in range(self.workers):
+                self._fork_worker(pids)
+            while True:
+                pid, _ = os.wait()
+                if pid in pids:
+                    pids.remove(pid)
+                    self._fork_worker(pids)
+        finally:
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    os.waitpid(pid, 0)
+                except (ProcessLookupError, ChildProcessError):
+                    pass
+            signal.signal(signal.SIGTERM, previous_handler)
+            self.close()
+
+    def close(self) -> None:
+        close_listeners(self.listeners, self.unix_socket)
+        self.listeners = []
+
+    def _fork_worker(self, pids: set[int]) -> None:
+        """Start a worker and add its pid to pids."""
+        # A signal arriving during fork() would be handled inside the at-fork
+        # hooks, which ignore the KeyboardInterrupt, so it waits until the
+        # worker is in pids to be stopped.
+        mask = signal.pthread_sigmask(
+            signal.SIG_BLOCK, {signal.SIGINT, signal.SIGTERM})
+        pid = os.fork()
+        if pid != 0:
+            pids.add(pid)
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+            return
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Ctrl-C reaches the whole process group; the parent stops us.
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+            self._work()
+        finally:
+            os._exit(0)
+
+    def _work(self) -> None:
+        selector = selectors.DefaultSelector()
+        for listener in self.listeners:
+            selector.register(listener, selectors.EVENT_READ)
+        while True:
+            for (key, _) in selector.select():
+                ready = key.fileobj
+                assert isinstance(ready, socket.socket)
+                try:
+                    connection, _ = ready.accept()
+                except BlockingIOError:
+                    continue  # another worker got it
+                with connection:
+                    try:
+                        self._serve_connection(connection)
+                    except OSError:
+                        pass
+
+    def _serve_connection(self, connection: socket.socket) -> None:
+        connection.setblocking(True)
+        chunks = []
+        while chunk := connection.recv(65536):
+            chunks.append(chunk)
+        response = handle_request(
+            b"".join(chunks), self.compile, self.cache, self.stats)
+        connection.sendall(response)
+
+
+def run_prefork_server(host: str, port: int, compile: Compiler, workers: int,
+                       unix_socket: str | None = None,
+                       cache: CompileCache | None = None) -> None:
+    server = PreforkServer(host, port, compile, workers, unix_socket, cache)
+    print(f"Starting TCP server at {host}:{server.address[1]} "
+          f"with {workers} workers")
+    if unix_socket is not None:
+        print(f"Listening on Unix socket {unix_socket}")
+    server.serve_forever()
+
+
+# The compiler of a process pool worker, set when the worker starts
+_worker_compile: Compiler | None = None
+
+
+def _init_pool_worker(compile: Compiler) -> None:
+    global _worker_compile
+    _worker_compile = compile
+    # Ctrl-C reaches the whole process group; the pool is shut down for us.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _compile_in_pool_worker(source_code: str) -> bytes:
+    assert _worker_compile is not None
+    return _worker_compile(source_code)
+
+
+def _start_pool_worker() -> None:
+    pass
+
+
+class AsyncServer:
+    """An asyncio server that keeps connections open for many requests.
+
+    Each request and response is a JSON message preceded by its length as a
+    4-byte big-endian integer. Clients may send any number of requests on
+    one connection without waiting for responses, which are sent back in
+    request order as soon as they are ready.
+
+    A connection whose first byte is "{" speaks the old protocol instead:
+    one unframed request, terminated by the client closing its end, and one
+    unframed response, after which the server closes the connection. A
+    length prefix can never start with "{", since that would be a message
+    of more than 2 GiB.
+
+    Compilation runs in a pool of forked worker processes, which is
+    replaced if one of them dies. The compile cache is read and written in
+    threads, as writing may evict files. Pings and invalid requests are
+    answered by the event loop directly."""
+
+    def __init__(self, host: str, port: int, compile: Compiler, workers: int,
+                 unix_socket: str | None = None,
+                 cache: CompileCache | None = None) -> None:
+        if workers < 1:
+            raise Exception("at least one worker required")
+        self.compile = compile
+        self.workers = workers
+        self.cache = cache
+        self.unix_socket = unix_socket
+        self.listeners = create_listeners(host, port, unix_socket)
+        self.address: tuple[str, int] = self.listeners[0].getsockname()[:2]
+        self.pool: ProcessPoolExecutor | None = None
+        self.stats = ServerStats(queued=True)
+
+    def serve_forever(self) -> None:
+        warm_up(self.compile)
+        observe_phases(self.stats.observe)
+        self.pool = self._create_pool()
+        previous_handler = signal.signal(
+            signal.SIGTERM, signal.default_int_handler)
+        try:
+            # Fork the workers now, before the event loop starts any threads.
+            self.pool.submit(_start_pool_worker).result()
+            asyncio.run(self._serve())
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            signal.signal(signal.SIGTERM, previous_handler)
+            self.close()
+
+    def close(self) -> None:
+        close_listeners(self.listeners, self.unix_socket)
+        self.listeners = []
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_pool_worker,
+            initargs=(self.compile,))
+
+    async def _compile(self, source_code: str) -> bytes:
+        """Compile in the pool. If a worker died, the request fails and the
+        broken pool is replaced with a new one for the requests after it."""
+        pool = self.pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, _compile_in_pool_worker, source_code)
+        except BrokenProcessPool:
+            # Only the first of the requests that were in the pool replaces it.
+            if self.pool is pool and pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._create_pool()
+            raise
+
+    async def _serve(self) -> None:
+        servers = [await asyncio.start_server(
+            self._handle_connection, sock=self.listeners[0])]
+        if self.unix_socket is not None:
+            servers.append(await asyncio.start_unix_server(
+                self._handle_connection, sock=self.listeners[1]))
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+    async def _respond(self, data: bytes) -> bytes:
+        start = perf_counter()
+        self.stats.request_started()
+        result: dict[str, Any] = {}
+        try:
+            input = json.loads(data.decode())
+            if input["command"] == "compile":
+                source_code = input["code"]
+                executable = None
+                loop = asyncio.get_running_loop()
+                if self.cache is not None:
+                    executable = await loop.run_in_executor(
+                        None, self.cache.get, source_code)
+                if executable is None:
+                    self.stats.add(QUEUE_DEPTH)
+                    try:
+                        executable = await self._compile(source_code)
+                    finally:
+                        self.stats.add(QUEUE_DEPTH, -1)
+                    if self.cache is not None:
+                        await loop.run_in_executor(
+                            None, self.cache.put, source_code, executable)
+                result["program"] = b64encode(executable).decode()
+            elif input["command"] == "ping":
+                pass
+            elif input["command"] == "stats":
+                result.update(self.stats.snapshot(self.cache))
+            else:
+                result["error"] = "Unknown command: " + input['command']
+        except Exception as e:
+            result["error"] = error_message(e)
+        self.stats.request_finished(perf_counter() - start, "error" in result)
+        return json.dumps(result).encode()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        try:
+            first = await reader.read(1)
+            if first == b"{":
+                writer.write(await self._respond(first + await reader.read()))
+                await writer.drain()
+            elif first:
+                await self._handle_framed(first, reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_framed(self, first: bytes, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> None:
+        pending: asyncio.Queue[asyncio.Future[bytes] | None] = asyncio.Queue(
+            max_pipelined_requests)
+
+        async def write_responses() -> None:
+            connected = True
+            # Keep taking responses after the client went away, so that the
+            # reading side never blocks on a full queue.
+            while (response := await pending.get()) is not None:
+                data = await response
+                if not connected:
+                    continue
+                try:
+                    writer.write(len(data).to_bytes(4, "big") + data)
+                    await writer.drain()
+                except ConnectionError:
+                    connected = False
+
+        writer_task = asyncio.create_task(write_responses())
+        try:
+            header = first + await reader.readexactly(3)
+            while True:
+                length = int.from_bytes(header, "big")
+                if length > max_message_size:
+                    error = {"error": f"Message too long: {length} bytes"}
+                    too_long = asyncio.get_running_loop().create_future()
+                    too_long.set_result(json.dumps(error).encode())
+                    await pending.put(too_long)
+                    break
+                data = await reader.readexactly(length)
+                await pending.put(asyncio.create_task(self._respond(data)))
+                header = await reader.read(1)
+                if not header:
+                    break
+                header += await reader.readexactly(3)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            await pending.put(None)
+            await writer_task
+
+
+def run_async_server(host: str, port: int, compile: Compiler, workers: int,
+                     unix_socket: str | None = None,
+                     cache: CompileCache | None = None) -> None:
+    server = AsyncServer(host, port, compile, workers, unix_socket, cache)
+    print(f"Starting asyncio server at {host}:{server.address[1]} "
+          f"with {workers} compile workers")
+    if unix_socket is not None:
+        print(f"Listening on Unix socket {unix_socket}")
+    server.serve_forever()
@@ -0,0 +1,173 @@
+from contextlib import AbstractContextManager, contextmanager
+from math import ceil, log2
+from multiprocessing import Lock, RawArray
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from compiler.cache import CompileCache
+
+# Compiler phases, in the order they run
+phases = ["tokenize", "parse", "typecheck", "optimize", "codegen", "assemble"]
+
+# Latency histograms have buckets growing by a factor of 2^(1/4), from 1 us
+# up to about 1000 s, so a percentile is never off by more than 19%.
+buckets_per_octave = 4
+bucket_count = 30 * buckets_per_octave
+
+counters = ["requests", "errors", "in_flight", "queue_depth"]
+REQUESTS = 0
+ERRORS = 1
+IN_FLIGHT = 2
+QUEUE_DEPTH = 3
+
+
+class Phase:
+    """A running compiler phase.
+
+    The code running the phase may set output to what the phase produced,
+    for observers that want to look at it."""
+    __slots__ = ["name", "output"]
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.output: Any = None
+
+
+PhaseObserver = Callable[[Phase], AbstractContextManager[None]]
+
+_phase_observer: PhaseObserver | None = None
+
+
+def observe_phases(observer: PhaseObserver | None) -> None:
+    """Run every phase started from now on inside observer(phase)."""
+    global _phase_observer
+    _phase_observer = observer
+
+
+@contextmanager
+def phase(name: str) -> Iterator[Phase]:
+    """Mark a compiler phase for whoever called observe_phases.
+
+    Phases may be nested."""
+    current = Phase(name)
+    observer = _phase_observer
+    if observer is None:
+        yield current
+        return
+    with observer(current):
+        yield current
+
+
+def bucket(seconds: float) -> int:
+    """The histogram bucket of a duration: bucket i holds durations up to
+    2^(i/4) microseconds."""
+    microseconds = seconds * 1e6
+    if microseconds <= 1:
+        return 0
+    return min(bucket_count - 1, ceil(log2(microseconds) * buckets_per_octave))
+
+
+def bucket_limit(index: int) -> float:
+    """The largest duration in a bucket, in seconds."""
+    return 2 ** (index / buckets_per_octave) / 1e6
+
+
+def percentile(counts: list[int], q: float) -> float | None:
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank = max(1, ceil(q * total))
+    seen = 0
+    for (index, count) in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return bucket_limit(index)
+    return bucket_limit(len(counts) - 1)
+
+
+class ServerStats:
+    """Request counters and latency histograms in shared memory.
+
+    Created before the server forks, so that every worker process updates
+    the same counters and any of them can answer a stats request for the
+    whole server. Updates take a lock shared by all processes; they are a
+    few array increments, so contention is negligible next to compiling.
+
+    There is a histogram of whole request latencies and one per compiler
+    phase. Phase durations reach the histograms by passing observe to
+    observe_phases."""
+
+    histograms = ["request"] + phases
+
+    def __init__(self, queued: bool = False,
+                 measure_queue: Callable[[], int] | None = None) -> None:
+        """queued says whether the server has a queue of compile requests
+        whose length it keeps in queue_depth. A server whose queue is kept
+        elsewhere, such as by the kernel, passes measure_queue instead, and
+        snapshots call it for queue_depth. Snapshots of servers with neither
+        leave queue_depth out."""
+        self.queued = queued
+        self.measure_queue = measure_queue
+        self._lock = Lock()
+        self._counters = RawArray("q", len(counters))
+        self._buckets = RawArray("q", len(self.histograms) * bucket_count)
+        self._offsets = {name: i * bucket_count
+                         for (i, name) in enumerate(self.histograms)}
+
+    def request_started(self) -> None:
+        with self._lock:
+            self._counters[REQUESTS] += 1
+            self._counters[IN_FLIGHT] += 1
+
+    def request_finished(self, seconds: float, failed: bool) -> None:
+        index = self._offsets["request"] + bucket(seconds)
+        with self._lock:
+            self._counters[IN_FLIGHT] -= 1
+            if failed:
+                self._counters[ERRORS] += 1
+            self._buckets[index] += 1
+
+    @contextmanager
+    def observe(self, phase: Phase) -> Iterator[None]:
+        """Time phases that have a histogram, for observe_phases."""
+        if phase.name not in self._offsets:
+            yield
+            return
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase.name, perf_counter() - start)
+
+    def add(self, counter: int, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def record(self, histogram: str, seconds: float) -> None:
+        index = self._offsets[histogram] + bucket(seconds)
+        with self._lock:
+            self._buckets[index] += 1
+
+    def snapshot(self, cache: CompileCache | None = None) -> dict[str, Any]:
+        """Current counters and latency percentiles, in milliseconds."""
+        with self._lock:
+            values = list(self._counters)
+            buckets = list(self._buckets)
+        result: dict[str, Any] = dict(zip(counters, values))
+        if self.measure_queue is not None:
+            result["queue_depth"] = self.measure_queue()
+        elif not self.queued:
+            del result["queue_depth"]
+        latencies: dict[str, Any] = {}
+        for (name, offset) in self._offsets.items():
+            counts = buckets[offset:offset + bucket_count]
+            latency: dict[str, Any] = {"count": sum(counts)}
+            for (label, q) in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]:
+                seconds = percentile(counts, q)
+                latency[f"{label}_ms"] = (
+                    None if seconds is None else round(seconds * 1000, 3))
+            latencies[name] = latency
+        result["latency"] = latencies
+        if cache is not None:
+            result["cache"] = cache.stats()
+        return result
@@ -1,14 +1,54 @@
 import re
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Iterator, TextIO
 
 from compiler.location import Loc
 
+keywords = ["if", "then", "else", "while", "var", "do"]
+word_operators = ["and", "or", "not"]
+operators = ["==", "<=", ">=", "!=", "+", "-", "*", "/", "<", ">", "=", "%"]
+punctuation = ["(", ")", "{", "}", ",", ";"]
 
-@dataclass
+# Integer token kinds. Literals and identifiers have one kind each, every
+# keyword, operator and punctuation character has a kind of its own.
+END = 0
+INT_LITERAL = 1
+BOOL_LITERAL = 2
+IDENTIFIER = 3
+INVALID = 4
+fixed_kinds = {
+    text: i + 5 for (i, text) in enumerate(keywords + word_operators + operators + punctuation)
+}
+
+kind_types = ["end", "int_literal", "bool_literal", "identifier", "invalid"]
+kind_types += ["keyword"] * len(keywords)
+kind_types += ["identifier"] * len(word_operators)
+kind_types += ["operator"] * len(operators)
+kind_types += ["punctuation"] * len(punctuation)
+
+
+def token_kind(type: str, text: str) -> int:
+    if type == "int_literal":
+        return INT_LITERAL
+    if type == "bool_literal":
+        return BOOL_LITERAL
+    if type == "end":
+        return END
+    return fixed_kinds.get(text, IDENTIFIER if type == "identifier" else INVALID)
+
+
+@dataclass(slots=True)
 class Token:
     loc: Loc
     type: str
     text: str
+    kind: int = field(default=-1, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.kind < 0:
+            self.kind = token_kind(self.type, self.text)
 
 
 @dataclass
@@ -29,41 +69,129 @@ regexes = [
     ("punctuation", r'[(){},;]'),
 ]
 
-keywords = ["if", "then", "else", "while", "var", "do"]
 
+master_pattern = re.compile('|'.join(f"(?P<{p[0]}>{p[1]})" for p in regexes))
 
-def tokenize(source_code: str) -> list[Token]:
-    result: list[Token] = []
+
+def tokenize_stream(source: str | TextIO, chunk_size: int = 1 << 16) -> Iterator[Token]:
+    """Yield tokens lazily from a string or a text stream.
+
+    Streams are read chunk_size characters at a time and only the part of
+    the source that has not been tokenized yet is kept in memory."""
+    if isinstance(source, str):
+        chunks: Iterator[str] = iter([source])
+    else:
+        chunks = iter(lambda: source.read(chunk_size), "")
+    buffer = ""
+    offset = 0  # source position of buffer[0]
     line = 0
     line_start = 0
-    matcher = '|'.join(f"(?P<{p[0]}>{p[1]})" for p in regexes)
-    for match in re.finditer(matcher, source_code):
-        match_type = match.lastgroup
-        if not match_type:
-            raise Exception("error")
-        match match_type:
-            case "whitespace":
-                pass
-            case "comment":
-                pass
-            case "newline":
-                line += 1
-                line_start = match.end()
-            case "multiline_comment":
-                line += match.group().count('\n')
-                last_index = match.group().rfind('\n')
-                if last_index != -1:
-                    line_start = match.start() + last_index
-            case "identifier":
-                if match.group() in keywords:
-                    match_type = "keyword"
-                result.append(Token(
-                    Loc(line, match.start() - line_start),
-                    match_type,
-                    match.group()))
-            case _:
-                result.append(Token(
-                    Loc(line, match.start() - line_start),
-                    match_type,
-                    match.group()))
-    return result
+    eof = False
+    while not eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            limit = len(buffer)
+        else:
+            buffer += chunk
+            # Only multiline comments span lines, so scan complete lines.
+            limit = buffer.rfind("\n") + 1
+        consumed = limit
+        for match in master_pattern.finditer(buffer, 0, limit):
+            match_type = match.lastgroup
+            if not match_type:
+                raise Exception("error")
+            match match_type:
+                case "whitespace":
+                    pass
+                case "comment":
+                    pass
+                case "newline":
+                    line += 1
+                    line_start = offset + match.end()
+                case "multiline_comment":
+                    line += match.group().count('\n')
+                    last_index = match.group().rfind('\n')
+                    if last_index != -1:
+                        line_start = offset + match.start() + last_index + 1
+                case "identifier":
+                    if match.group() in keywords:
+                        match_type = "keyword"
+                    yield Token(
+                        Loc(line, offset + match.start() - line_start),
+                        match_type,
+                        match.group())
+                case _:
+                    if (not eof and match.group() == "/"
+                            and buffer.startswith("*", match.end())):
+                        # A multiline comment that ends in a later chunk
+                        consumed = match.start()
+                        break
+                    yield Token(
+                        Loc(line, offset + match.start() - line_start),
+                        match_type,
+                        match.group())
+        buffer = buffer[consumed:]
+        offset += consumed
+
+
+def tokenize(source_code: str) -> list[Token]:
+    return list(tokenize_stream(source_code))
+
+
+class TokenBuffer:
+    """Compact token store for a whole source string.
+
+    Tokens are kept as integer kinds and start/end offsets into the source
+    in typed arrays. Text and locations are only computed when a token is
+    looked at, locations from an index of line start offsets. Indexing or
+    iterating yields ordinary Token objects."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        offset_type = "I" if len(source) < 1 << 32 else "Q"
+        self.kinds = array("B")
+        self.starts = array(offset_type)
+        self.ends = array(offset_type)
+        self.line_starts = array(offset_type, [0])
+        self.line_starts.extend(
+            m.end() for m in re.finditer("\n", source))
+
+        kinds = self.kinds
+        starts = self.starts
+        ends = self.ends
+        for match in master_pattern.finditer(source):
+            match_type = match.lastgroup
+            if match_type == "int_literal":
+                kinds.append(INT_LITERAL)
+            elif match_type == "bool_literal":
+                kinds.append(BOOL_LITERAL)
+            elif match_type == "identifier":
+                kinds.append(fixed_kinds.get(match.group(), IDENTIFIER))
+            elif match_type == "operator" or match_type == "punctuation":
+                kinds.append(fixed_kinds[match.group()])
+            else:
+                continue
+            starts.append(match.start())
+            ends.append(match.end())
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def text(self, index: int) -> str:
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def loc(self, index: int) -> Loc:
+        start = self.starts[index]
+        line = bisect_right(self.line_starts, start) - 1
+        return Loc(line, start - self.line_starts[line])
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self)
+        kind = self.kinds[index]
+        return Token(self.loc(index), kind_types[kind], self.text(index), kind)
+
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,272 @@
+import ast as py
+import importlib.util
+import marshal
+from types import CodeType
+from compiler.ast import *
+from compiler.console import current_console
+from compiler.resolver import resolve
+from compiler.typechecker import clear_types, typecheck
+from compiler.types import Unit
+
+Value = int | bool | None
+
+MAGIC = b"HYPY"
+
+arithmetic_operators: dict[str, type[py.operator]] = {
+    "+": py.Add,
+    "-": py.Sub,
+    "*": py.Mult,
+    "/": py.FloorDiv,
+    "%": py.Mod,
+}
+comparison_operators: dict[str, type[py.cmpop]] = {
+    "<": py.Lt,
+    ">": py.Gt,
+    "<=": py.LtE,
+    ">=": py.GtE,
+    "==": py.Eq,
+    "!=": py.NotEq,
+}
+
+
+def transpile(ast: Expression) -> py.Module:
+    """Translate a program to a Python module defining `program()`.
+
+    Every variable declaration becomes a local variable of its own, named
+    after the variable and its frame slot (`x_0`, `x_1`), so shadowing needs
+    no scopes at run time. Temporaries are named `_1`, `_2` and so on, which
+    no variable can be. Expressions that need statements, like an `if` with
+    a value, are computed into temporaries before the expression using them,
+    and operands evaluated earlier are saved first to keep evaluation order.
+
+    Python's `//` and `%` round like the interpreter, and Python ints are
+    unbounded like its ints, so the program behaves exactly as interpreted.
+    Printing and read_int call the global functions `write` and `read_int`,
+    which run_python takes from the current console.
+
+    The program is type checked first unless it has been already, so type
+    errors raise here. The types are removed again afterwards, so that the
+    tree is left as the caller gave it."""
+    if ast.type is None:
+        try:
+            typecheck(ast)
+            return transpile(ast)
+        finally:
+            clear_types(ast)
+    resolve(ast)
+    statements: list[py.stmt] = []
+    temporaries = 0
+    names: dict[int, str] = {}
+
+    def temporary() -> str:
+        nonlocal temporaries
+        temporaries += 1
+        return f"_{temporaries}"
+
+    def emit(statement: py.stmt, loc: Loc) -> None:
+        # Tracebacks through the generated code point at the source line.
+        statement.lineno = statement.end_lineno = max(loc.line, 0) + 1
+        statement.col_offset = statement.end_col_offset = max(loc.column, 0)
+        statements.append(statement)
+
+    def load(name: str) -> py.expr:
+        return py.Name(name, py.Load())
+
+    def assign(name: str, value: py.expr, loc: Loc) -> None:
+        emit(py.Assign([py.Name(name, py.Store())], value), loc)
+
+    def discard(value: py.expr, loc: Loc) -> None:
+        if not isinstance(value, (py.Constant, py.Name)):
+            emit(py.Expr(value), loc)
+
+    def visit_into(e: Expression) -> tuple[list[py.stmt], py.expr]:
+        """The statements and value of e, kept out of the current statements."""
+        nonlocal statements
+        outer = statements
+        statements = []
+        value = visit(e)
+        (inner, statements) = (statements, outer)
+        return (inner, value)
+
+    def body(inner: list[py.stmt]) -> list[py.stmt]:
+        return inner or [py.Pass()]
+
+    def operands(es: list[Expression]) -> list[py.expr]:
+        """Values of es, which are evaluated left to right."""
+        values: list[py.expr] = []
+        for e in es:
+            start = len(statements)
+            value = visit(e)
+            if len(statements) > start:
+                # The statements of e could change variables read by the
+                # operands before it, so save those first.
+                saved: list[py.stmt] = []
+                for (i, earlier) in enumerate(values):
+                    if isinstance(earlier, py.Constant) or is_temporary(earlier):
+                        continue
+                    name = temporary()
+                    saved.append(py.Assign([py.Name(name, py.Store())], earlier))
+                    values[i] = load(name)
+                for statement in saved:
+                    py.copy_location(statement, statements[start])
+                statements[start:start] = saved
+            values.append(value)
+        return values
+
+    def visit(e: Expression) -> py.expr:
+        value = visit_node(e)
+        if e.type == Unit:
+            discard(value, e.loc)
+            return py.Constant(None)
+        return value
+
+    def visit_node(e: Expression) -> py.expr:
+        match e:
+            case Literal():
+                return py.Constant(e.value)
+
+            case Identifier():
+                return load(names[e.slot])
+
+            case BinaryOp(op="=", left=Identifier(slot=slot)):
+                assign(names[slot], visit(e.right), e.loc)
+                return py.Constant(None)
+
+            case BinaryOp(op="and" | "or"):
+                left = visit(e.left)
+                (right_statements, right) = visit_into(e.right)
+                operator = py.And() if e.op == "and" else py.Or()
+                if not right_statements:
+                    return py.BoolOp(operator, [left, right])
+                result = temporary()
+                assign(result, left, e.loc)
+                condition = load(result)
+                if e.op == "or":
+                    condition = py.UnaryOp(py.Not(), condition)
+                right_statements.append(
+                    py.Assign([py.Name(result, py.Store())], right))
+                emit(py.If(condition, right_statements, []), e.loc)
+                return load(result)
+
+            case BinaryOp(op=op) if op in arithmetic_operators:
+                (left, right) = operands([e.left, e.right])
+                return py.BinOp(left, arithmetic_operators[op](), right)
+
+            case BinaryOp(op=op) if op in comparison_operators:
+                (left, right) = operands([e.left, e.right])
+                return py.Compare(left, [comparison_operators[op]()], [right])
+
+            case UnaryOp():
+                target = visit(e.target)
+                if e.op == "-":
+                    return py.UnaryOp(py.USub(), target)
+                return py.UnaryOp(py.Not(), target)
+
+            case VarDeclaration():
+                value = visit(e.value)
+                names[e.slot] = f"{e.name.replace('$', '_')}_{e.slot}"
+                assign(names[e.slot], value, e.loc)
+                return py.Constant(None)
+
+            case Block():
+                for sub in e.expressions[:-1]:
+                    discard(visit(sub), sub.loc)
+                if not e.expressions:
+                    return py.Constant(None)
+                return visit(e.expressions[-1])
+
+            case IfBlock():
+                condition = visit(e.condition)
+                (then_statements, then) = visit_into(e.then)
+                else_statements: list[py.stmt] = []
+                eelse: py.expr = py.Constant(None)
+                if e.eelse is not None:
+                    (else_statements, eelse) = visit_into(e.eelse)
+                if e.type == Unit:
+                    for (inner, value) in [(then_statements, then),
+                                           (else_statements, eelse)]:
+                        if not isinstance(value, (py.Constant, py.Name)):
+                            inner.append(py.Expr(value))
+                    emit(py.If(condition, body(then_statements),
+                               else_statements), e.loc)
+                    return py.Constant(None)
+                if not then_statements and not else_statements:
+                    return py.IfExp(condition, then, eelse)
+                result = temporary()
+                then_statements.append(
+                    py.Assign([py.Name(result, py.Store())], then))
+                else_statements.append(
+                    py.Assign([py.Name(result, py.Store())], eelse))
+                emit(py.If(condition, then_statements, else_statements), e.loc)
+                return load(result)
+
+            case While():
+                (condition_statements, condition) = visit_into(e.condition)
+                (action_statements, action) = visit_into(e.action)
+                if not isinstance(action, (py.Constant, py.Name)):
+                    action_statements.append(py.Expr(action))
+                if condition_statements:
+                    stop = py.If(py.UnaryOp(py.Not(), condition), [py.Break()], [])
+                    emit(py.While(py.Constant(True),
+                                  condition_statements + [stop] + action_statements,
+                                  []), e.loc)
+                else:
+                    emit(py.While(condition, body(action_statements), []), e.loc)
+                return py.Constant(None)
+
+            case FunctionCall():
+                args = operands(e.args)
+                if e.name == "read_int":
+                    return py.Call(load("read_int"), [], [])
+                return py.Call(load("write"), args, [])
+
+            case Expression():
+                return py.Constant(None)
+
+        raise Exception(f"{e.loc}: unknown ast node: {type(e)}")
+
+    result = visit(ast)
+    emit(py.Return(result), ast.loc)
+    module = py.parse("def program():\n    pass\n")
+    function = module.body[0]
+    assert isinstance(function, py.FunctionDef)
+    function.body = statements
+    return py.fix_missing_locations(module)
+
+
+def is_temporary(value: py.expr) -> bool:
+    # Temporaries are only assigned again after the value has been used.
+    # Variables can start with `_` too, but always have a name before it.
+    return isinstance(value, py.Name) and value.id[:1] == "_" \
+        and value.id[1:].isdigit()
+
+
+def compile_python(ast: Expression) -> CodeType:
+    """Transpile a program and compile it to a Python code object."""
+    return compile(transpile(ast), "<program>", "exec")
+
+
+def run_python(code: CodeType) -> Value:
+    """Run a code object from compile_python and return the program's value."""
+    console = current_console()
+    namespace: dict[str, object] = {"write": console.write,
+                                    "read_int": console.read_int}
+    exec(code, namespace)
+    return namespace["program"]()  # type: ignore
+
+
+def code_to_bytes(code: CodeType) -> bytes:
+    """Serialize a code object with marshal, for this version of Python only."""
+    return MAGIC + importlib.util.MAGIC_NUMBER + marshal.dumps(code)
+
+
+def code_from_bytes(data: bytes) -> CodeType:
+    if not data.startswith(MAGIC):
+        raise Exception("not a transpiled program")
+    version = data[len(MAGIC):len(MAGIC) + len(importlib.util.MAGIC_NUMBER)]
+    if version != importlib.util.MAGIC_NUMBER:
+        raise Exception("program was transpiled by another Python version")
+    code = marshal.loads(data[len(MAGIC) + len(version):])
+    if not isinstance(code, CodeType):
+        raise Exception("not a transpiled program")
+    return code
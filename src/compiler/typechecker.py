@@ -0,0 +1,181 @@
+from compiler.ast import *
+from compiler.operators import int_operators, short_circuit_operators
+from compiler.resolver import resolve
+from compiler.types import Bool, Int, Type, Unit
+
+arithmetic_operators = ["+", "-", "*", "/", "%"]
+equality_operators = ["==", "!="]
+
+# Parameter types and return type of each built-in function
+builtin_functions: dict[str, tuple[list[Type], Type]] = {
+    "print_int": ([Int], Unit),
+    "print_bool": ([Bool], Unit),
+    "read_int": ([], Int),
+}
+
+
+def children(e: Expression) -> list[Expression]:
+    """Subexpressions of e, in evaluation order."""
+    match e:
+        case BinaryOp():
+            return [e.left, e.right]
+        case Block():
+            return e.expressions
+        case UnaryOp():
+            return [e.target]
+        case VarDeclaration():
+            return [e.value]
+        case IfBlock():
+            if e.eelse is None:
+                return [e.condition, e.then]
+            return [e.condition, e.then, e.eelse]
+        case While():
+            return [e.condition, e.action]
+        case FunctionCall():
+            return e.args
+    return []
+
+
+def typecheck(ast: Expression) -> Type:
+    """Infer the type of every node and store it in its `type` field.
+
+    - Arithmetic and `<`, `>`, `<=`, `>=` take ints, `and`, `or` and `not`
+      take bools, and `==` and `!=` take two ints or two bools.
+    - Conditions must be bools. An `if` without `else` is Unit, and the two
+      branches of one with `else` must have the same type.
+    - A variable has the type of its initial value forever.
+    - A block has the type of its last expression, or Unit if it is empty.
+
+    Raises an Exception with the location of the first error, with the same
+    message the interpreter would give for it at run time where there is
+    one. Bools are not accepted as ints, unlike in the interpreter.
+
+    The tree is walked with an explicit stack, so arbitrarily deep programs
+    can be checked. Returns the type of the whole program."""
+    resolve(ast)
+    slot_types: dict[int, Type] = {}
+    # Nodes whose children have been checked are marked with True.
+    stack: list[tuple[Expression, bool]] = [(ast, False)]
+    while stack:
+        (e, ready) = stack.pop()
+        if not ready:
+            stack.append((e, True))
+            stack.extend((c, False) for c in reversed(children(e)))
+            continue
+        e.type = check(e, slot_types)
+    assert ast.type is not None
+    return ast.type
+
+
+def clear_types(ast: Expression) -> None:
+    """Undo typecheck: set the `type` of every node back to None."""
+    stack = [ast]
+    while stack:
+        e = stack.pop()
+        e.type = None
+        stack.extend(children(e))
+
+
+def check(e: Expression, slot_types: dict[int, Type]) -> Type:
+    """The type of e, whose children have been checked already."""
+    match e:
+        case Literal():
+            return Bool if isinstance(e.value, bool) else Int
+
+        case Identifier():
+            if e.slot < 0:
+                raise Exception(f"{e.loc}: unknown identifier")
+            return slot_types[e.slot]
+
+        case BinaryOp():
+            left = e.left.type
+            right = e.right.type
+            if e.op == "=":
+                if not isinstance(e.left, Identifier):
+                    raise Exception(
+                        f"{e.left.loc}: not an identifier, expected for =")
+                if left != right:
+                    raise Exception(
+                        f"{e.left.loc}: tried changing variable type "
+                        f"from {left} to {right}")
+                return Unit
+            if e.op in short_circuit_operators:
+                if left != Bool:
+                    raise Exception(
+                        f"{e.left.loc}: expected bool for {e.op} operator")
+                if right != Bool:
+                    raise Exception(
+                        f"{e.right.loc}: expected bool for {e.op} operator")
+                return Bool
+            if e.op in equality_operators:
+                if left not in (Int, Bool):
+                    raise Exception(
+                        f"{e.left.loc}: expected int or bool for {e.op} operator")
+                if right != left:
+                    raise Exception(
+                        f"{e.right.loc}: expected {left} for {e.op} operator")
+                return Bool
+            if e.op in int_operators:
+                if left != Int:
+                    raise Exception(
+                        f"{e.left.loc}: expected int for {e.op} operator")
+                if right != Int:
+                    raise Exception(
+                        f"{e.right.loc}: expected int for {e.op} operator")
+                return Int if e.op in arithmetic_operators else Bool
+            raise Exception(f"{e.loc}: unknown operator")
+
+        case UnaryOp():
+            if e.op == "-":
+                if e.target.type != Int:
+                    raise Exception(f"{e.loc}: expected int")
+                return Int
+            if e.op == "not":
+                if e.target.type != Bool:
+                    raise Exception(f"{e.loc}: expected bool")
+                return Bool
+            raise Exception(f"{e.loc}: unknown operator")
+
+        case VarDeclaration():
+            assert e.value.type is not None
+            slot_types[e.slot] = e.value.type
+            return Unit
+
+        case Block():
+            if not e.expressions:
+                return Unit
+            assert e.expressions[-1].type is not None
+            return e.expressions[-1].type
+
+        case IfBlock():
+            if e.condition.type != Bool:
+                raise Exception(f"{e.condition.loc}: expected bool")
+            if e.eelse is None:
+                return Unit
+            if e.then.type != e.eelse.type:
+                raise Exception(
+                    f"{e.loc}: if branches have different types: "
+                    f"{e.then.type} and {e.eelse.type}")
+            assert e.then.type is not None
+            return e.then.type
+
+        case While():
+            if e.condition.type != Bool:
+                raise Exception(f"{e.condition.loc}: expected bool")
+            return Unit
+
+        case FunctionCall():
+            if e.name not in builtin_functions:
+                raise Exception(f"{e.loc}: unknown function {e.name}")
+            (parameters, result) = builtin_functions[e.name]
+            if len(e.args) != len(parameters):
+                raise Exception(
+                    f"{e.loc}: invalid number of arguments for {e.name}")
+            for (arg, parameter) in zip(e.args, parameters):
+                if arg.type != parameter:
+                    kind = "an int" if parameter == Int else "a bool"
+                    raise Exception(
+                        f"{arg.loc}: argument for {e.name} is not {kind}")
+            return result
+
+    return Unit
@@ -0,0 +1,15 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Type:
+    """A type of the language: Int, Bool or Unit."""
+    name: str
+
+    def __str__(self) -> str:
+        return self.name
+
+
+Int = Type("Int")
+Bool = Type("Bool")
+Unit = Type("Unit")
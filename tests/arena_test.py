@@ -0,0 +1,67 @@
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.interpreter import interpret
+from compiler.arena import pack, unpack
+from compiler.location import L, Loc, NO_LOC
+from compiler.ast import *
+
+sample = """
+var n = 10;
+var sum = 0;
+while n > 0 do {
+    if n % 2 == 0 then sum = sum + f(n, 2) else { sum = sum - 1 };
+    n = n - 1;
+}
+-sum
+"""
+
+
+def test_roundtrip() -> None:
+    ast = parse(tokenize(sample))
+    arena = pack(ast)
+    unpacked = unpack(arena)
+    assert unpacked == ast
+    assert repr(unpacked) == repr(ast)
+
+
+def test_locations_kept() -> None:
+    ast = unpack(pack(parse(tokenize("1 +\n  2"))))
+    assert isinstance(ast, Block)
+    assert isinstance(ast.expressions[0], BinaryOp)
+    assert ast.expressions[0].loc == Loc(0, 2)
+    assert ast.expressions[0].right.loc == Loc(1, 2)
+    assert ast.expressions[0].right.loc != Loc(1, 3)
+
+
+def test_stripped_locations() -> None:
+    ast = parse(tokenize(sample))
+    arena = pack(ast)
+    size = arena.nbytes()
+    arena.strip_locations()
+    assert arena.nbytes() < size
+    unpacked = unpack(arena)
+    assert isinstance(unpacked, Block)
+    assert unpacked.expressions[0].loc is NO_LOC
+    assert str(NO_LOC) == "unknown location"
+    assert unpack(pack(ast, keep_locations=False)) == unpacked
+
+
+def test_deep_tree() -> None:
+    ast: Expression = Literal(L, 0)
+    for _ in range(50000):
+        ast = BinaryOp(L, ast, "+", Literal(L, 1))
+    assert interpret(unpack(pack(ast)), "vm") == 50000
+
+
+def test_nodes_are_slotted() -> None:
+    assert not hasattr(Literal(L, 1), "__dict__")
+    assert not hasattr(L, "__dict__")
+
+
+def test_operators_are_interned() -> None:
+    ast = parse(tokenize("a + b; c + d"))
+    assert isinstance(ast, Block)
+    first = ast.expressions[0]
+    second = ast.expressions[1]
+    assert isinstance(first, BinaryOp) and isinstance(second, BinaryOp)
+    assert first.op is second.op
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import pytest
+
+from compiler.batch import compile_batch, expand_inputs, format_result, read_manifest
+
+
+def fake_compile(source_code: str, input_file_name: str) -> bytes:
+    if "error" in source_code:
+        raise Exception(f"{input_file_name}: bad program")
+    return source_code.upper().encode()
+
+
+def write(path: Path, text: str) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def test_expand_inputs(tmp_path: Path) -> None:
+    a = write(tmp_path / "a.hy", "")
+    b = write(tmp_path / "sub" / "b.hy", "")
+    write(tmp_path / "c.txt", "")
+    missing = str(tmp_path / "missing.hy")
+    assert expand_inputs([str(tmp_path / "**" / "*.hy"), a, missing]) == [
+        a, b, missing]
+
+
+def test_read_manifest(tmp_path: Path) -> None:
+    manifest = write(tmp_path / "list.txt", "# programs\na.hy\n\nsub/*.hy\n")
+    assert read_manifest(manifest) == [
+        str(tmp_path / "a.hy"), str(tmp_path / "sub" / "*.hy")]
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_compile_batch(tmp_path: Path, jobs: int) -> None:
+    inputs = [write(tmp_path / f"p{i}.hy", f"program {i}") for i in range(20)]
+    inputs.append(write(tmp_path / "bad.hy", "error"))
+    out = tmp_path / "out"
+    results = list(compile_batch(inputs, str(out), fake_compile, jobs))
+    assert [r.input_file for r in results] == inputs
+    for i in range(20):
+        assert results[i].error is None
+        assert (out / f"p{i}").read_bytes() == f"PROGRAM {i}".encode()
+    assert results[20].error == f"{inputs[20]}: bad program"
+    assert not (out / "bad").exists()
+    assert format_result(results[20]).startswith("error")
+    assert format_result(results[0]).startswith("ok")
+
+
+def test_output_name_collision(tmp_path: Path) -> None:
+    inputs = [write(tmp_path / "x" / "a.hy", ""), write(tmp_path / "y" / "a.hy", "")]
+    with pytest.raises(Exception, match="would both be compiled"):
+        list(compile_batch(inputs, str(tmp_path / "out"), fake_compile))
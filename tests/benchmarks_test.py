@@ -0,0 +1,55 @@
+from benchmarks.__main__ import compare, parse_size
+from benchmarks.generator import ProgramShape, generate_program
+from compiler.interpreter import engines, interpret
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+
+def test_generated_programs_run() -> None:
+    shapes = [
+        ProgramShape(size=2000),
+        ProgramShape(size=2000, depth=30),
+        ProgramShape(size=2000, nesting=20),
+        ProgramShape(size=1000, trip_count=500, seed=3),
+    ]
+    for shape in shapes:
+        source = generate_program(shape)
+        assert len(source) >= shape.size
+        results = [interpret(parse(tokenize(source)), e) for e in engines]
+        assert isinstance(results[0], int)
+        assert results == [results[0]] * len(results)
+
+
+def test_generator_is_deterministic() -> None:
+    assert generate_program(ProgramShape(seed=1)) == generate_program(
+        ProgramShape(seed=1))
+    assert generate_program(ProgramShape(seed=1)) != generate_program(
+        ProgramShape(seed=2))
+
+
+def test_large_programs_repeat_blocks() -> None:
+    source = generate_program(ProgramShape(size=3 << 20, trip_count=1))
+    assert abs(len(source) - (3 << 20)) < (1 << 20)
+    assert source.startswith("{\n")
+
+
+def test_compare() -> None:
+    shape = {"size": 1}
+    baseline = {
+        "a": {"seconds": 1.0, "shape": shape},
+        "b": {"seconds": 1.0, "shape": shape},
+        "c": {"seconds": 1.0, "shape": {"size": 2}},
+    }
+    current = {
+        "a": {"seconds": 1.05, "shape": shape},
+        "b": {"seconds": 1.5, "shape": shape},
+        "c": {"seconds": 9.0, "shape": shape},
+        "d": {"seconds": 9.0, "shape": shape},
+    }
+    assert compare(baseline, current, 0.1) == ["b"]
+
+
+def test_parse_size() -> None:
+    assert parse_size("1KB") == 1000
+    assert parse_size("100M") == 100_000_000
+    assert parse_size("512") == 512
@@ -0,0 +1,76 @@
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.location import L
+from compiler.ast import *
+from compiler.bytecode import Bytecode, compile_bytecode, run_bytecode
+
+
+def run_code(src: str) -> int | bool | None:
+    return run_bytecode(compile_bytecode(parse(tokenize(src))))
+
+
+def test_serialization_roundtrip() -> None:
+    bytecode = compile_bytecode(parse(tokenize("""
+var n = 123456789123456789123456789;
+var b = true;
+var s = 0;
+while b do {
+    s = s + n % 10;
+    n = n / 10;
+    b = n > 0;
+}
+s
+""")))
+    data = bytecode.to_bytes()
+    loaded = Bytecode.from_bytes(data)
+    assert loaded == bytecode
+    assert run_bytecode(loaded) == 135
+
+
+def test_invalid_bytecode() -> None:
+    with pytest.raises(Exception) as exinfo:
+        Bytecode.from_bytes(b"not bytecode")
+    assert "not a bytecode file" in str(exinfo)
+
+
+def test_jumps() -> None:
+    assert run_code("if 1 < 2 then 3 else 4") == 3
+    assert run_code("if 1 > 2 then 3 else 4") == 4
+    assert run_code("if 1 > 2 then 3") == None
+    assert run_code("var i = 0; while i < 5 do i = i + 1; i") == 5
+
+
+def test_scopes() -> None:
+    assert run_code("var a = 1; { var a = 2; a = 3 }; a") == 1
+    assert run_code("var a = 1; { a = 3 }; a") == 3
+
+
+def test_errors() -> None:
+    with pytest.raises(Exception) as exinfo:
+        run_code("a")
+    assert "unknown identifier" in str(exinfo)
+    with pytest.raises(Exception) as exinfo:
+        run_code("1 == {}")
+    assert "expected int for == operator" in str(exinfo)
+    with pytest.raises(Exception) as exinfo:
+        run_code("if 1 then 2")
+    assert "expected bool" in str(exinfo)
+    with pytest.raises(Exception) as exinfo:
+        run_code("print_int(1, 2)")
+    assert "invalid number of arguments" in str(exinfo)
+
+
+def test_deep_nesting() -> None:
+    depth = 100000
+    ast: Expression = Literal(L, 0)
+    for _ in range(depth):
+        ast = BinaryOp(L, ast, "+", Literal(L, 1))
+    assert run_bytecode(compile_bytecode(ast)) == depth
+
+
+def test_disassemble() -> None:
+    text = compile_bytecode(parse(tokenize("var x = 1; x"))).disassemble()
+    assert "DECLARE 0 (x)" in text
+    assert "LOAD 0 (x)" in text
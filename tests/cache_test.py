@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+from pathlib import Path
+
+from compiler.cache import CompileCache
+
+
+def test_hit_and_miss(tmp_path: Path) -> None:
+    cache = CompileCache(tmp_path)
+    assert cache.get("1 + 2") is None
+    cache.put("1 + 2", b"program")
+    assert cache.get("1 + 2") == b"program"
+    assert cache.get("1 + 3") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["bytes"] == len(b"program")
+
+
+def test_survives_restart(tmp_path: Path) -> None:
+    CompileCache(tmp_path).put("x", b"abc")
+    cache = CompileCache(tmp_path)
+    assert cache.stats()["bytes"] == 3
+    assert cache.get("x") == b"abc"
+
+
+def test_compiler_version_is_part_of_key(tmp_path: Path) -> None:
+    cache = CompileCache(tmp_path)
+    cache.put("x", b"abc")
+    cache.version = "other"
+    assert cache.get("x") is None
+
+
+def test_get_or_compile(tmp_path: Path) -> None:
+    cache = CompileCache(tmp_path)
+    calls = []
+
+    def compile(source: str) -> bytes:
+        calls.append(source)
+        return source.encode()
+    assert cache.get_or_compile("a", compile) == b"a"
+    assert cache.get_or_compile("a", compile) == b"a"
+    assert calls == ["a"]
+
+
+def test_lru_eviction(tmp_path: Path) -> None:
+    cache = CompileCache(tmp_path, max_bytes=250)
+    for (i, name) in enumerate(["a", "b"]):
+        cache.put(name, b"x" * 100)
+        os.utime(cache._path(cache.key(name)), (i, i))
+    cache.get("a")  # a is now the most recently used
+    cache.put("c", b"x" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+
+
+def _worker(cache: CompileCache) -> None:
+    cache.get("shared")
+
+
+def test_counters_shared_across_fork(tmp_path: Path) -> None:
+    cache = CompileCache(tmp_path)
+    cache.put("shared", b"1")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_worker, args=(cache,))
+                 for _ in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert cache.stats()["hits"] == 4
@@ -0,0 +1,69 @@
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.closure import compile_program
+
+
+def run_code(src: str) -> int | bool | None:
+    return compile_program(parse(tokenize(src)))()
+
+
+def test_program_is_reusable() -> None:
+    program = compile_program(parse(tokenize("""
+var i = 0;
+var s = 0;
+while i < 100 do {
+    s = s + i;
+    i = i + 1;
+}
+s
+""")))
+    assert program() == 4950
+    assert program() == 4950
+
+
+def test_shadowing_in_loop() -> None:
+    c = """
+var x = 1;
+var s = 0;
+var i = 0;
+while i < 3 do {
+    s = s + x;
+    var x = 10;
+    s = s + x;
+    i = i + 1;
+}
+s
+"""
+    assert run_code(c) == 33
+
+
+def test_unknown_identifier() -> None:
+    with pytest.raises(Exception) as exinfo:
+        run_code("a + 1")
+    assert "unknown identifier" in str(exinfo)
+
+
+def test_type_errors() -> None:
+    with pytest.raises(Exception) as exinfo:
+        run_code("1 + {}")
+    assert "expected int" in str(exinfo)
+    with pytest.raises(Exception) as exinfo:
+        run_code("var a = 1; a = true")
+    assert "tried changing variable type" in str(exinfo)
+    with pytest.raises(Exception) as exinfo:
+        run_code("while 1 do 2")
+    assert "expected bool" in str(exinfo)
+
+
+def test_dead_branch_is_not_evaluated() -> None:
+    assert run_code("if false then foo(1) else 2") == 2
+    with pytest.raises(Exception) as exinfo:
+        run_code("if true then foo(1) else 2")
+    assert "unknown function" in str(exinfo)
+
+
+def test_print(capsys: pytest.CaptureFixture[str]) -> None:
+    run_code("print_int(1 + 2); print_bool(1 < 2)")
+    assert capsys.readouterr().out == "3\nTrue\n"
@@ -0,0 +1,151 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.codegen import generate_assembly
+from compiler.assembler import assemble
+from compiler.interpreter import interpret
+from benchmarks.generator import ProgramShape, generate_program
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("as") is None or shutil.which("ld") is None,
+    reason="binutils is not installed")
+
+
+def run_native(src: str, tmp_path: Path, stdin: str = "") -> str:
+    executable = tmp_path / "program"
+    executable.write_bytes(assemble(generate_assembly(parse(tokenize(src)))))
+    os.chmod(executable, 0o755)
+    process = subprocess.run(
+        [str(executable)], input=stdin, capture_output=True, text=True,
+        check=True)
+    return process.stdout
+
+
+def test_result_is_printed(tmp_path: Path) -> None:
+    assert run_native("1 + 2 * 3", tmp_path) == "7\n"
+    assert run_native("1 < 2", tmp_path) == "true\n"
+    assert run_native("var x = 1;", tmp_path) == ""
+
+
+def test_print_functions(tmp_path: Path) -> None:
+    src = """
+print_int(-9223372036854775807 - 1);
+print_int(0);
+print_bool(not true);
+print_bool(3 >= 3);
+"""
+    assert run_native(src, tmp_path) == (
+        "-9223372036854775808\n0\nfalse\ntrue\n")
+
+
+def test_division_rounds_down(tmp_path: Path) -> None:
+    src = """
+print_int(7 / 2); print_int(-7 / 2); print_int(7 / -2); print_int(-7 / -2);
+print_int(7 % 3); print_int(-7 % 3); print_int(7 % -3); print_int(-6 % 3);
+"""
+    expected = [7 // 2, -7 // 2, 7 // -2, -7 // -2, 7 % 3, -7 % 3, 7 % -3, -6 % 3]
+    assert run_native(src, tmp_path) == "".join(f"{n}\n" for n in expected)
+
+
+def test_loops_and_shadowing(tmp_path: Path) -> None:
+    src = """
+var x = 1;
+var s = 0;
+var i = 0;
+while i < 3 do {
+    s = s + x;
+    var x = 10;
+    s = s + x;
+    i = i + 1;
+}
+s
+"""
+    assert run_native(src, tmp_path) == "33\n"
+
+
+def test_short_circuit(tmp_path: Path) -> None:
+    src = """
+var x = 0;
+false and { x = 1; true };
+true or { x = 2; true };
+true and { x = x + 10; true };
+x
+"""
+    assert run_native(src, tmp_path) == "10\n"
+
+
+def test_evaluation_order(tmp_path: Path) -> None:
+    assert run_native("read_int() - read_int()", tmp_path, "10\n3\n") == "7\n"
+    # The left operand is read before the right one changes it.
+    assert run_native("var x = 1; x + { x = 5; x }", tmp_path) == "6\n"
+    assert run_native("var x = 1; x * { x = 3; 2 }", tmp_path) == "2\n"
+    assert run_native("var x = 6; x / { x = 2; 1 }", tmp_path) == "6\n"
+    assert run_native("var x = 1; x < { x = 5; 3 }", tmp_path) == "true\n"
+    assert run_native("var x = 1; ({ x = 0; x }) * { x = 1; x }", tmp_path) == "0\n"
+    assert run_native("var x = 1; (if x > 0 then x else 0) - { x = 5; 0 }",
+                      tmp_path) == "1\n"
+
+
+def test_read_int(tmp_path: Path) -> None:
+    src = """
+var total = 0;
+var n = read_int();
+while n > 0 do {
+    total = total + read_int();
+    n = n - 1;
+}
+print_int(total);
+"""
+    assert run_native(src, tmp_path, "3\n-5\n7\r\n100") == "102\n"
+
+
+def test_read_int_rejects_garbage(tmp_path: Path) -> None:
+    with pytest.raises(subprocess.CalledProcessError):
+        run_native("read_int()", tmp_path, "12abc\n")
+
+
+def test_large_output_is_flushed(tmp_path: Path) -> None:
+    src = "var i = 0; while i < 5000 do { print_int(i); i = i + 1; }"
+    assert run_native(src, tmp_path) == "".join(f"{i}\n" for i in range(5000))
+
+
+def test_many_live_variables(tmp_path: Path) -> None:
+    # More variables live across calls than there are registers
+    names = [f"v_{chr(ord('a') + i)}" for i in range(20)]
+    src = "".join(f"var {v} = read_int() * {i + 1};\n" for (i, v) in enumerate(names))
+    src += "var k = 0; while k < 3 do {\n"
+    src += "".join(f"    {v} = {v} + {names[(i + 1) % 20]} % 7;\n"
+                   for (i, v) in enumerate(names))
+    src += "    print_int(k); k = k + 1;\n}\n"
+    src += " + ".join(names)
+    values = [3 * i - 7 for i in range(20)]
+    variables = [v * (i + 1) for (i, v) in enumerate(values)]
+    for _ in range(3):
+        for i in range(20):
+            variables[i] += variables[(i + 1) % 20] % 7
+    stdin = "".join(f"{v}\n" for v in values)
+    assert run_native(src, tmp_path, stdin) == f"0\n1\n2\n{sum(variables)}\n"
+
+
+def test_generated_programs_match_interpreter(tmp_path: Path) -> None:
+    for seed in range(5):
+        src = generate_program(ProgramShape(size=2_000, seed=seed))
+        expected = interpret(parse(tokenize(src)))
+        assert run_native(src, tmp_path) == f"{expected}\n"
+
+
+def test_compile_errors() -> None:
+    for (src, message) in [
+        ("x + 1", "unknown identifier"),
+        ("foo(1)", "unknown function foo"),
+        ("print_int(1, 2)", "invalid number of arguments for print_int"),
+        ("99999999999999999999", "integer literal out of range"),
+    ]:
+        with pytest.raises(Exception, match=message):
+            generate_assembly(parse(tokenize(src)))
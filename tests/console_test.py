@@ -0,0 +1,109 @@
+import io
+
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.typechecker import typecheck
+from compiler.interpreter import interpret, engines
+from compiler.console import Console, current_console, read_ints, use_console
+
+
+class CountingWrites(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s: str) -> int:
+        self.writes += 1
+        return super().write(s)
+
+
+def test_read_ints_across_chunks() -> None:
+    text = "12 -345\n6\n\n  789 0"
+    for chunk_size in [1, 2, 3, 5, 100]:
+        assert list(read_ints(io.StringIO(text), chunk_size)) == [12, -345, 6, 789, 0]
+    assert list(read_ints(io.StringIO(""))) == []
+    with pytest.raises(ValueError):
+        list(read_ints(io.StringIO("1 two 3")))
+
+
+def test_output_is_buffered() -> None:
+    output = CountingWrites()
+    console = Console(output, flush_lines=3)
+    for value in [1, 2, True, 4]:
+        console.write(value)
+    assert (output.getvalue(), output.writes) == ("1\n2\nTrue\n", 1)
+    console.flush()
+    assert (output.getvalue(), output.writes) == ("1\n2\nTrue\n4\n", 2)
+
+    output = CountingWrites()
+    console = Console(output, flush_lines=0)
+    for value in range(1000):
+        console.write(value)
+    assert output.writes == 0
+    console.flush()
+    assert output.writes == 1
+
+
+def test_inputs_are_read_without_prompt(capsys: pytest.CaptureFixture[str]) -> None:
+    console = Console(inputs=[5, 6])
+    assert [console.read_int(), console.read_int()] == [5, 6]
+    with pytest.raises(EOFError, match="no more input"):
+        console.read_int()
+    assert capsys.readouterr().out == ""
+
+
+def test_output_is_flushed_before_prompting(monkeypatch: pytest.MonkeyPatch) -> None:
+    output = io.StringIO()
+    seen: list[str] = []
+
+    def prompt(text: str) -> str:
+        seen.append(output.getvalue())
+        return "3"
+    monkeypatch.setattr("builtins.input", prompt)
+    console = Console(output, flush_lines=0)
+    console.write(1)
+    assert console.read_int() == 3
+    assert seen == ["1\n"]
+
+
+def test_use_console() -> None:
+    default = current_console()
+    output = io.StringIO()
+    with pytest.raises(ZeroDivisionError):
+        with use_console(Console(output, flush_lines=0)):
+            interpret(parse(tokenize("print_int(1); 1 / 0")))
+    assert output.getvalue() == "1\n"
+    assert current_console() is default
+
+
+def test_replay_on_all_engines() -> None:
+    src = """
+var n = read_int();
+var sum = 0;
+while n > 0 do {
+    var x = read_int();
+    print_int(x);
+    print_bool(x > 2);
+    sum = sum + x;
+    n = n - 1;
+}
+sum
+"""
+    record: list[int] = []
+    output = io.StringIO()
+    with use_console(Console(output, read_ints(io.StringIO("3 1 5 2 9")),
+                             record=record)):
+        expected = interpret(parse(tokenize(src)))
+    assert expected == 8
+    assert record == [3, 1, 5, 2]
+    for engine in engines:
+        for typed in [False, True]:
+            ast = parse(tokenize(src))
+            if typed:
+                typecheck(ast)
+            replayed = io.StringIO()
+            with use_console(Console(replayed, record, flush_lines=0)):
+                assert interpret(ast, engine) == expected, engine
+            assert replayed.getvalue() == output.getvalue(), engine
@@ -1,14 +1,36 @@
+import sys
+import time
+from pathlib import Path
+
 import pytest
 
 from compiler.tokenizer import tokenize
 from compiler.parser import parse
-from compiler.interpreter import interpret
+from compiler.optimizer import optimize
+from compiler.typechecker import typecheck
+from compiler.interpreter import LimitExceeded, Limits, interpret, engines
+from compiler.__main__ import main
 
 
-def run_code(src: str) -> int | bool | None:
+def run_code(src: str, well_typed: bool = True) -> int | bool | None:
     tokens = tokenize(src)
     ast = parse(tokens)
-    return interpret(ast)
+    result = interpret(ast)
+    for engine in engines:
+        # The python engine only runs programs that pass the type checker.
+        if engine != "python" or well_typed:
+            assert interpret(ast, engine) == result, engine
+    assert interpret(optimize(ast)) == result
+    assert interpret(ast, limits=Limits(max_steps=10**6)) == result
+    if well_typed:
+        # Type checked programs take the paths without run time checks.
+        typed = parse(tokens)
+        typecheck(typed)
+        for engine in engines:
+            assert interpret(typed, engine) == result, engine
+            assert interpret(optimize(typed), engine) == result, engine
+        assert interpret(typed, limits=Limits(max_steps=10**6)) == result
+    return result
 
 
 def test_math() -> None:
@@ -92,3 +114,104 @@ while num > 0 do {
 sum
 """
     assert run_code(c) == 100
+
+
+def test_unknown_engine() -> None:
+    with pytest.raises(Exception) as exinfo:
+        interpret(parse(tokenize("1")), "nonexistent")
+    assert "unknown engine" in str(exinfo)
+
+
+def test_operands_evaluated_once() -> None:
+    c = """
+var a = 0;
+var b = 0 + { a = a + 1; a } * { a = a + 1; a };
+a * 10 + b
+"""
+    assert run_code(c) == 22
+
+
+def test_deep_expression() -> None:
+    c = "1" + " + 1" * 200
+    assert run_code(c) == 201
+    c = "(" * 40 + "1" + " + 1)" * 40
+    assert run_code(c) == 41
+
+
+def test_short_circuit() -> None:
+    c = """
+var a = 0;
+var b = false and { a = a + 1; true };
+var c = true or { a = a + 1; true };
+var d = true and { a = a + 1; false };
+var e = false or { a = a + 1; true };
+if not b and c and not d and e then a else 0 - 1
+"""
+    assert run_code(c) == 2
+    assert run_code("true or foo(1)", well_typed=False) == True
+    assert run_code("false and 1", well_typed=False) == False
+
+
+def test_short_circuit_type_errors() -> None:
+    for engine in engines:
+        with pytest.raises(Exception) as exinfo:
+            interpret(parse(tokenize("true and 1")), engine)
+        assert "expected bool for and operator" in str(exinfo)
+        with pytest.raises(Exception) as exinfo:
+            interpret(parse(tokenize("1 or true")), engine)
+        assert "expected bool for or operator" in str(exinfo)
+
+
+def test_operand_error_location() -> None:
+    for engine in engines:
+        with pytest.raises(Exception) as exinfo:
+            interpret(parse(tokenize("1 +\n{}")), engine)
+        assert "line 1, column 0: expected int for + operator" in str(exinfo)
+
+
+def test_typed_if_without_else_is_unit() -> None:
+    ast = parse(tokenize("if true then 1"))
+    assert interpret(ast) == 1
+    typecheck(ast)
+    for engine in engines:
+        assert interpret(ast, engine) is None, engine
+        assert interpret(optimize(ast), engine) is None, engine
+
+
+def test_limits() -> None:
+    spin = parse(tokenize("var i = 0;\nwhile true do i = i + 1"))
+    with pytest.raises(LimitExceeded, match="^line 1, column .*: step limit of 100 exceeded"):
+        interpret(spin, limits=Limits(max_steps=100))
+    with pytest.raises(LimitExceeded, match="time limit of 0.05 s exceeded"):
+        interpret(spin, limits=Limits(max_seconds=0.05))
+    grow = parse(tokenize("var x = 3; while true do x = x * x"))
+    with pytest.raises(LimitExceeded, match="column 31: int longer than 100 bits"):
+        interpret(grow, limits=Limits(max_int_bits=100))
+    deep = parse(tokenize("{ { { 1 } } }"))
+    assert interpret(deep, limits=Limits(max_scope_depth=4)) == 1
+    with pytest.raises(LimitExceeded, match="column 4: scope depth limit of 3 exceeded"):
+        interpret(deep, limits=Limits(max_scope_depth=3))
+    with pytest.raises(Exception, match="not supported by the vm engine"):
+        interpret(deep, "vm", Limits(max_steps=10))
+
+
+def test_limits_from_command_line(tmp_path: Path,
+                                  monkeypatch: pytest.MonkeyPatch) -> None:
+    # Squaring 23 times would take long to fold, before the limits apply.
+    names = "abcdefghijklmnopqrstuvw"
+    program = tmp_path / "squares.hy"
+    program.write_text("var a = 10;\n" + "".join(
+        f"var {b} = {a} * {a};\n" for (a, b) in zip(names, names[1:])) + "w")
+    monkeypatch.setattr(sys, "argv", [
+        "compiler", "interpret", "--max-int-bits=64", "--max-steps=1000",
+        str(program)])
+    start = time.perf_counter()
+    with pytest.raises(LimitExceeded, match="^line 5, .*: int longer than 64 bits"):
+        main()
+    assert time.perf_counter() - start < 5
+
+
+def test_limits_count_read_ints(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("builtins.input", lambda prompt: str(2 ** 70))
+    with pytest.raises(LimitExceeded, match="int longer than 64 bits"):
+        interpret(parse(tokenize("read_int()")), limits=Limits(max_int_bits=64))
@@ -0,0 +1,115 @@
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.ir import *
+
+
+def ir(src: str) -> str:
+    return format_ir(generate_ir(parse(tokenize(src))))
+
+
+def test_straight_line_code() -> None:
+    assert ir("var x = 1 + 2; print_int(-x); x") == """\
+entry:
+    $1 = 1
+    $2 = 2
+    $3 = $1 + $2
+    x = $3
+    $4 = -x
+    print_int($4)
+    print_int(x)
+    return
+"""
+
+
+def test_if_and_while_blocks() -> None:
+    assert ir("var i = 0; while i < 3 do if i == 1 then print_int(i); i") == """\
+entry:
+    $1 = 0
+    i = $1
+    goto while1_condition
+while1_condition:
+    $2 = 3
+    $3 = i < $2
+    if $3 goto while1_body else while1_end
+while1_body:
+    $4 = 1
+    $5 = i == $4
+    if $5 goto if1_then else if1_end
+if1_then:
+    print_int(i)
+    goto if1_end
+if1_end:
+    goto while1_condition
+while1_end:
+    print_int(i)
+    return
+"""
+
+
+def test_short_circuit_and_if_value() -> None:
+    assert ir("if true or read_int() > 1 then 1 else 2") == """\
+entry:
+    $3 = 1
+    $2 = $3
+    if $2 goto or1_end else or1_right
+or1_right:
+    $4 = read_int()
+    $5 = 1
+    $6 = $4 > $5
+    $2 = $6
+    goto or1_end
+or1_end:
+    if $2 goto if1_then else if1_else
+if1_then:
+    $7 = 1
+    $1 = $7
+    goto if1_end
+if1_else:
+    $8 = 2
+    $1 = $8
+    goto if1_end
+if1_end:
+    print_int($1)
+    return
+"""
+
+
+def test_shadowed_variables_are_renamed() -> None:
+    assert ir("var x = true; { var x = 2; x }; print_bool(x)") == """\
+entry:
+    $1 = 1
+    x = $1
+    $2 = 2
+    x.1 = $2
+    print_bool(x)
+    return
+"""
+
+
+def test_successors_uses_and_definition() -> None:
+    function = generate_ir(parse(tokenize("var i = 0; while i < 3 do i = i + 1")))
+    assert [function.successors(b) for b in function.blocks] == [
+        ["while1_condition"],
+        ["while1_body", "while1_end"],
+        ["while1_condition"],
+        [],
+    ]
+    condition = function.blocks[1].instructions[1]
+    assert uses(condition) == ["i", "$2"]
+    assert definition(condition) == "$3"
+    assert definition(function.blocks[1].instructions[2]) is None
+
+
+def test_errors() -> None:
+    for (src, message) in [
+        ("x + 1", "unknown identifier"),
+        ("foo(1)", "unknown function foo"),
+        ("print_int(1, 2)", "invalid number of arguments for print_int"),
+        ("1 = 2", "not an identifier, expected for ="),
+        ("print_int(true)", "argument for print_int is not an int"),
+        ("99999999999999999999", "integer literal out of range"),
+    ]:
+        with pytest.raises(Exception, match=message):
+            generate_ir(parse(tokenize(src)))
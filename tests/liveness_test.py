@@ -0,0 +1,42 @@
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.ir import generate_ir
+from compiler.liveness import Interval, analyze_liveness, live_intervals
+
+
+def test_liveness_around_loop() -> None:
+    function = generate_ir(parse(tokenize("""
+var s = 0;
+var i = 0;
+while i < 3 do {
+    s = s + i;
+    i = i + 1;
+}
+s
+""")))
+    liveness = analyze_liveness(function)
+    assert liveness.live_in["entry"] == set()
+    assert liveness.live_out["entry"] == {"s", "i"}
+    assert liveness.live_in["while1_condition"] == {"s", "i"}
+    assert liveness.live_in["while1_body"] == {"s", "i"}
+    assert liveness.live_in["while1_end"] == {"s"}
+    assert liveness.live_out["while1_end"] == set()
+
+
+def test_intervals_cover_loops() -> None:
+    function = generate_ir(parse(tokenize("""
+var i = 0;
+var t = 5;
+while i < t do i = i + 1;
+print_int(7)
+""")))
+    intervals = live_intervals(function, analyze_liveness(function))
+    # entry: 0 $1 = 0, 1 i = $1, 2 $2 = 5, 3 t = $2, 4 goto
+    # condition: 5 $3 = i < t, 6 if
+    # body: 7 $4 = 1, 8 $5 = i + $4, 9 i = $5, 10 goto
+    # end: 11 $6 = 7, 12 print_int($6), 13 return
+    assert intervals["$1"] == Interval(0, 1)
+    assert intervals["i"] == Interval(1, 10)
+    assert intervals["t"] == Interval(3, 10)
+    assert intervals["$3"] == Interval(5, 6)
+    assert intervals["$6"] == Interval(11, 12)
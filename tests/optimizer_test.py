@@ -0,0 +1,451 @@
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.optimizer import eliminate_dead_code, hoist_loop_invariants, optimize
+from compiler.typechecker import children, typecheck
+from compiler.interpreter import interpret, engines
+from compiler.location import L, Loc
+from compiler.ast import *
+
+
+def optimized(src: str) -> Expression:
+    return optimize(parse(tokenize(src)))
+
+
+def test_constant_folding() -> None:
+    assert optimized("1 + 2 * 3") == Block(L, [Literal(L, 7)])
+    assert optimized("-(2 - 5)") == Block(L, [Literal(L, 3)])
+    assert optimized("1 < 2 and 3 >= 3") == Block(L, [Literal(L, True)])
+
+
+def test_folding_keeps_location() -> None:
+    ast = optimized("1 +\n 2 * 3")
+    assert isinstance(ast, Block)
+    assert ast.expressions[0].loc == Loc(0, 2)
+    assert ast.expressions[0].loc != Loc(1, 3)
+
+
+def test_raising_operations_are_not_folded() -> None:
+    assert optimized("1 / 0") == Block(L, [
+        BinaryOp(L, Literal(L, 1), "/", Literal(L, 0))
+    ])
+    assert optimized("1 + {}") == Block(L, [
+        BinaryOp(L, Literal(L, 1), "+", Block(L, [Expression(L)]))
+    ])
+    assert optimize(UnaryOp(L, "not", Literal(L, 1))) == UnaryOp(
+        L, "not", Literal(L, 1))
+    assert optimized("true and 1") == Block(L, [
+        BinaryOp(L, Literal(L, True), "and", Literal(L, 1))
+    ])
+
+
+def test_folding_deep_programs() -> None:
+    terms = 3000
+    ast = optimized("var x = 1; x = 2; x" + " + x" * (terms - 1))
+    assert interpret(ast, "vm") == 2 * terms
+
+def test_constant_propagation() -> None:
+    assert optimized("var a = 2; var b = a * 3; b + 1") == Block(L, [
+        VarDeclaration(L, "a", Literal(L, 2)),
+        VarDeclaration(L, "b", Literal(L, 6)),
+        Literal(L, 7),
+    ])
+
+
+def test_no_propagation_of_assigned_variables() -> None:
+    assert optimized("var a = 2; a = 3; a") == Block(L, [
+        VarDeclaration(L, "a", Literal(L, 2)),
+        BinaryOp(L, Identifier(L, "a"), "=", Literal(L, 3)),
+        Identifier(L, "a"),
+    ])
+
+
+def test_propagation_respects_shadowing() -> None:
+    assert optimized("var a = 2; { var a = 3; a = 4; a }; a") == Block(L, [
+        VarDeclaration(L, "a", Literal(L, 2)),
+        Block(L, [
+            VarDeclaration(L, "a", Literal(L, 3)),
+            BinaryOp(L, Identifier(L, "a"), "=", Literal(L, 4)),
+            Identifier(L, "a"),
+        ]),
+        Literal(L, 2),
+    ])
+
+
+def test_algebraic_identities() -> None:
+    assert optimized("var x = 1; x = 2; x * 1 + 0") == Block(L, [
+        VarDeclaration(L, "x", Literal(L, 1)),
+        BinaryOp(L, Identifier(L, "x"), "=", Literal(L, 2)),
+        Identifier(L, "x"),
+    ])
+    assert optimized("var x = 1; x = 2; 0 + 1 * -(-x)") == Block(L, [
+        VarDeclaration(L, "x", Literal(L, 1)),
+        BinaryOp(L, Identifier(L, "x"), "=", Literal(L, 2)),
+        Identifier(L, "x"),
+    ])
+    b = BinaryOp(L, Literal(L, 1), "<", FunctionCall(L, "read_int", []))
+    assert optimize(UnaryOp(L, "not", UnaryOp(L, "not", b))) == b
+
+
+def test_identities_need_known_types() -> None:
+    # true + 0 is 1, so the addition must stay
+    assert optimized("var b = true; b = false; b + 0") == Block(L, [
+        VarDeclaration(L, "b", Literal(L, True)),
+        BinaryOp(L, Identifier(L, "b"), "=", Literal(L, False)),
+        BinaryOp(L, Identifier(L, "b"), "+", Literal(L, 0)),
+    ])
+    # the type of a function result is unknown
+    assert optimized("f(1) * 1") == Block(L, [
+        BinaryOp(L, FunctionCall(L, "f", [Literal(L, 1)]), "*", Literal(L, 1)),
+    ])
+
+
+def test_constant_if() -> None:
+    assert optimized("var d = false; if d then 1 else 2") == Block(L, [
+        VarDeclaration(L, "d", Literal(L, False)),
+        Literal(L, 2),
+    ])
+    assert optimized("if 1 > 2 then print_int(1)") == Block(L, [Expression(L)])
+
+
+def test_short_circuit() -> None:
+    assert optimized("false and f(1)") == Block(L, [
+        Literal(L, False)
+    ])
+    assert optimized("var b = true; b = false; true and b") == Block(L, [
+        VarDeclaration(L, "b", Literal(L, True)),
+        BinaryOp(L, Identifier(L, "b"), "=", Literal(L, False)),
+        BinaryOp(L, Literal(L, True), "and", Identifier(L, "b")),
+    ])
+
+
+def test_semantics_preserved() -> None:
+    c = """
+var n = 10;
+var step = 1;
+var i = 0;
+var sum = 0;
+while i < n do {
+    sum = sum + i * step + 0;
+    i = i + step;
+}
+if n > 5 then sum else 0
+"""
+    assert interpret(optimized(c)) == interpret(parse(tokenize(c))) == 45
+
+
+def hoisted(src: str) -> Expression:
+    ast = parse(tokenize(src))
+    typecheck(ast)
+    return optimize(ast)
+
+
+def test_loop_invariants_are_hoisted() -> None:
+    ast = hoisted("""
+var n = read_int();
+var i = 0;
+while i < n * 2 do {
+    print_int(i + (n - 1));
+    i = i + 1;
+}
+""")
+    assert ast == Block(L, [
+        VarDeclaration(L, "n", FunctionCall(L, "read_int", [])),
+        VarDeclaration(L, "i", Literal(L, 0)),
+        Block(L, [
+            VarDeclaration(L, "licm$1", BinaryOp(
+                L, Identifier(L, "n"), "*", Literal(L, 2))),
+            VarDeclaration(L, "licm$2", BinaryOp(
+                L, Identifier(L, "n"), "-", Literal(L, 1))),
+            While(L,
+                  BinaryOp(L, Identifier(L, "i"), "<", Identifier(L, "licm$1")),
+                  Block(L, [
+                      FunctionCall(L, "print_int", [BinaryOp(
+                          L, Identifier(L, "i"), "+", Identifier(L, "licm$2"))]),
+                      BinaryOp(L, Identifier(L, "i"), "=", BinaryOp(
+                          L, Identifier(L, "i"), "+", Literal(L, 1))),
+                  ])),
+        ]),
+    ])
+
+
+def test_variant_expressions_stay_in_loop() -> None:
+    src = """
+var n = read_int();
+var m = read_int();
+var i = 0;
+while i < 3 do {
+    var k = n * 2;
+    print_int(k + 1);
+    print_int(read_int() + n);
+    print_int(n / m);
+    n = n + 1;
+    i = i + 1;
+}
+"""
+    ast = hoisted(src)
+    assert isinstance(ast, Block)
+    assert isinstance(ast.expressions[-1], While)
+
+
+def test_nested_loop_invariants_move_out() -> None:
+    ast = hoisted("""
+var n = read_int();
+var i = 0;
+while i < 2 do {
+    var j = 0;
+    while j < 2 do { print_int(n * n); j = j + 1; }
+    i = i + 1;
+}
+""")
+    assert isinstance(ast, Block)
+    outer = ast.expressions[-1]
+    assert isinstance(outer, Block)
+    assert outer.expressions[0] == VarDeclaration(L, "licm$2", BinaryOp(
+        L, Identifier(L, "n"), "*", Identifier(L, "n")))
+
+
+def test_hoisting_deep_programs() -> None:
+    terms = 3000
+    ast = parse(tokenize("var n = read_int(); var i = 0; while i < 2 do {"
+                         "print_int(n" + " + n" * (terms - 1) + "); i = i + 1 }"))
+    typecheck(ast)
+    ast = hoist_loop_invariants(ast)
+    assert isinstance(ast, Block)
+    loop = ast.expressions[-1]
+    assert isinstance(loop, Block)
+    assert isinstance(loop.expressions[0], VarDeclaration)
+    assert loop.expressions[0].name == "licm$1"
+
+    # Each loop has its outer loop's counter times 2 to hoist.
+    depth = 1000
+    names = [f"i{k}".replace("0", "_") for k in range(depth + 1)]
+    ast = parse(tokenize("var i_ = read_int(); " + "".join(
+        f"var {i} = 0; while {i} < 2 do {{ {i} = {i} + 1; print_int({outer} * 2); "
+        for (outer, i) in zip(names, names[1:])) + "}" * depth))
+    typecheck(ast)
+    stack = [hoist_loop_invariants(ast)]
+    hoisted = 0
+    while stack:
+        e = stack.pop()
+        if isinstance(e, VarDeclaration) and e.name.startswith("licm$"):
+            hoisted += 1
+        stack += children(e)
+    assert hoisted == depth
+
+def test_untyped_loops_are_not_changed() -> None:
+    ast = optimized("var n = 1; var i = 0; while i < 2 do i = i + n * 2")
+    assert isinstance(ast, Block)
+    assert isinstance(ast.expressions[-1], While)
+
+
+def test_hoisting_preserves_semantics(monkeypatch: pytest.MonkeyPatch,
+                                      capsys: pytest.CaptureFixture[str]) -> None:
+    c = """
+var n = read_int();
+var total = 0;
+var i = 0;
+while i < n do {
+    var j = 0;
+    while j < n + 1 and total > -n * n do {
+        total = total + j * (n - 1) + i / 2;
+        if j % 2 == 0 then { var n = j; total = total - n * 3 }
+        j = j + 1;
+    }
+    i = i + 1;
+}
+total
+"""
+    monkeypatch.setattr("builtins.input", lambda prompt: "6")
+    expected = interpret(parse(tokenize(c)))
+    for engine in engines:
+        assert interpret(hoisted(c), engine) == expected, engine
+
+
+def test_dead_code_is_removed() -> None:
+    ast = hoisted("""
+var debug = false;
+var x = 1;
+x * 2;
+if debug then print_int(x);
+while false do print_int(x);
+var unused = x + 1;
+{ var y = 2; y = y + 1; }
+x
+""")
+    assert ast == Block(L, [Literal(L, 1)])
+
+
+def test_dead_stores_are_removed() -> None:
+    ast = hoisted("""
+var x = 1;
+x = 2;
+var y = read_int();
+var z = read_int();
+z = 3;
+x + z
+""")
+    assert ast == Block(L, [
+        VarDeclaration(L, "x", Literal(L, 0)),
+        BinaryOp(L, Identifier(L, "x"), "=", Literal(L, 2)),
+        FunctionCall(L, "read_int", []),
+        VarDeclaration(L, "z", FunctionCall(L, "read_int", [])),
+        BinaryOp(L, Identifier(L, "z"), "=", Literal(L, 3)),
+        BinaryOp(L, Identifier(L, "x"), "+", Identifier(L, "z")),
+    ])
+
+
+def test_stores_read_by_later_iterations_are_kept() -> None:
+    ast = hoisted("""
+var previous = 0;
+var i = 0;
+while i < 3 do {
+    print_int(previous);
+    previous = i;
+    var scratch = i * 2;
+    i = i + 1;
+}
+""")
+    assert isinstance(ast, Block)
+    loop = ast.expressions[-1]
+    assert isinstance(loop, While) and isinstance(loop.action, Block)
+    assert loop.action.expressions == [
+        FunctionCall(L, "print_int", [Identifier(L, "previous")]),
+        BinaryOp(L, Identifier(L, "previous"), "=", Identifier(L, "i")),
+        BinaryOp(L, Identifier(L, "i"), "=", BinaryOp(
+            L, Identifier(L, "i"), "+", Literal(L, 1))),
+    ]
+
+
+def test_dead_code_respects_shadowing() -> None:
+    ast = hoisted("""
+var x = read_int();
+{ var x = read_int(); print_int(x); }
+{ var x = read_int(); x = 5; }
+x
+""")
+    assert ast == Block(L, [
+        VarDeclaration(L, "x", FunctionCall(L, "read_int", [])),
+        Block(L, [
+            VarDeclaration(L, "x", FunctionCall(L, "read_int", [])),
+            FunctionCall(L, "print_int", [Identifier(L, "x")]),
+        ]),
+        Block(L, [FunctionCall(L, "read_int", [])]),
+        Identifier(L, "x"),
+    ])
+
+
+def test_dead_code_elimination_deep_programs() -> None:
+    terms = 3000
+    ast = parse(tokenize("var x = 1; x = 2; var y = x; { x" + " + x" * (terms - 1)
+                         + " }; x" + " + x" * (terms - 1)))
+    typecheck(ast)
+    ast = eliminate_dead_code(ast)
+    assert isinstance(ast, Block)
+    assert len(ast.expressions) == 3
+    assert interpret(ast, "vm") == 2 * terms
+
+def test_division_that_may_fail_is_kept() -> None:
+    ast = hoisted("var x = read_int(); 10 / x; 1")
+    assert isinstance(ast, Block)
+    assert ast.expressions[1] == BinaryOp(
+        L, Literal(L, 10), "/", Identifier(L, "x"))
+
+
+def test_common_subexpressions_are_computed_once() -> None:
+    ast = hoisted("var a = read_int(); var b = read_int(); print_int(a * b + a * b)")
+    assert isinstance(ast, Block)
+    assert ast.expressions[2:] == [
+        VarDeclaration(L, "cse$1", BinaryOp(
+            L, Identifier(L, "a"), "*", Identifier(L, "b"))),
+        FunctionCall(L, "print_int", [BinaryOp(
+            L, Identifier(L, "cse$1"), "+", Identifier(L, "cse$1"))]),
+    ]
+    ast = hoisted("""
+var x = read_int();
+var n = read_int();
+var y = x + 1;
+print_int(y);
+(x + 1) < n
+""")
+    assert isinstance(ast, Block)
+    assert ast.expressions[-1] == BinaryOp(
+        L, Identifier(L, "y"), "<", Identifier(L, "n"))
+
+
+def test_copies_are_propagated() -> None:
+    ast = hoisted("var x = read_int(); var t = x; print_int(t * 2)")
+    assert ast == Block(L, [
+        VarDeclaration(L, "x", FunctionCall(L, "read_int", [])),
+        FunctionCall(L, "print_int", [BinaryOp(
+            L, Identifier(L, "x"), "*", Literal(L, 2))]),
+    ])
+
+
+def test_reused_values_are_invalidated() -> None:
+    ast = hoisted("""
+var x = read_int();
+var y = x * 2;
+var t = x;
+x = read_int();
+print_int(y + t);
+x * 2
+""")
+    assert isinstance(ast, Block)
+    assert ast.expressions[-2:] == [
+        FunctionCall(L, "print_int", [BinaryOp(
+            L, Identifier(L, "y"), "+", Identifier(L, "t"))]),
+        BinaryOp(L, Identifier(L, "x"), "*", Literal(L, 2)),
+    ]
+    # Values computed in a block are gone after it, and ones from outside
+    # are not used where their variable is shadowed.
+    ast = hoisted("""
+var x = read_int();
+var y = x * 3;
+{ var z = x * 2; print_int(z); var y = read_int(); print_int(x * 3 + y) }
+print_int(y);
+x * 2
+""")
+    assert isinstance(ast, Block)
+    inner = ast.expressions[2]
+    assert isinstance(inner, Block)
+    assert inner.expressions[-1] == FunctionCall(L, "print_int", [BinaryOp(
+        L, BinaryOp(L, Identifier(L, "x"), "*", Literal(L, 3)),
+        "+", Identifier(L, "y"))])
+    assert ast.expressions[-1] == BinaryOp(
+        L, Identifier(L, "x"), "*", Literal(L, 2))
+
+
+def test_common_subexpressions_preserve_semantics(
+        monkeypatch: pytest.MonkeyPatch,
+        capsys: pytest.CaptureFixture[str]) -> None:
+    c = """
+var a = read_int();
+var b = read_int();
+var t = a;
+var i = 0;
+while i < 3 do {
+    print_int(a * b + a * b);
+    if a * b > 10 then a = a - 1 else { var a = t; b = a + b };
+    print_int(({ t = t + 1; t }) * b + t * b);
+    i = i + 1;
+}
+a * b + t
+"""
+    inputs = iter(["4", "3"] * len(engines) * 2)
+    monkeypatch.setattr("builtins.input", lambda prompt: next(inputs))
+    expected = interpret(parse(tokenize(c)))
+    output = capsys.readouterr().out
+    for engine in engines:
+        assert interpret(hoisted(c), engine) == expected, engine
+        assert capsys.readouterr().out == output, engine
+
+
+def test_optimizing_deep_programs() -> None:
+    terms = 3000
+    ast = parse(tokenize("var x = 1; x = 2; var s = 0; var i = 0;"
+                         "while i < 2 do { s = x" + " + x" * (terms - 1) + " + s;"
+                         "i = i + 1 }; s"))
+    typecheck(ast)
+    assert interpret(optimize(ast), "vm") == 4 * terms
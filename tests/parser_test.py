@@ -585,3 +585,58 @@ def test_while_complex() -> None:
                   Literal(L, 1)
               ]))
     ])
+
+
+def test_token_iterator() -> None:
+    tokens = [
+        Token(L, "int_literal", "1"),
+        Token(L, "operator", "+"),
+        Token(L, "int_literal", "2"),
+    ]
+    assert parse(iter(tokens)) == Block(
+        L, [BinaryOp(L, Literal(L, 1), '+', Literal(L, 2))])
+    assert len(tokens) == 3
+    assert parse(iter([])) == Expression(L)
+
+
+def test_deep_nesting() -> None:
+    depth = 100000
+    tokens = ([Token(L, "punctuation", "(")] * depth
+              + [Token(L, "operator", "-")] * depth
+              + [Token(L, "int_literal", "1")]
+              + [Token(L, "punctuation", ")")] * depth)
+    ast = parse(tokens)
+    assert isinstance(ast, Block)
+    e = ast.expressions[0]
+    for _ in range(depth):
+        assert isinstance(e, UnaryOp)
+        e = e.target
+    assert e == Literal(L, 1)
+
+
+def test_long_operator_chain() -> None:
+    tokens = [Token(L, "int_literal", "1")]
+    for _ in range(100000):
+        tokens += [Token(L, "operator", "="), Token(L, "int_literal", "1")]
+    ast = parse(tokens)
+    assert isinstance(ast, Block)
+    e = ast.expressions[0]
+    while isinstance(e, BinaryOp):
+        e = e.right
+    assert e == Literal(L, 1)
+
+
+def test_not_and_empty_call() -> None:
+    tokens = [
+        Token(L, "identifier", "not"),
+        Token(L, "bool_literal", "true"),
+        Token(L, "operator", "=="),
+        Token(L, "identifier", "f"),
+        Token(L, "punctuation", "("),
+        Token(L, "punctuation", ")"),
+    ]
+    assert parse(tokens) == Block(L, [BinaryOp(
+        L,
+        UnaryOp(L, "not", Literal(L, True)),
+        "==",
+        FunctionCall(L, "f", []))])
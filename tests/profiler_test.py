@@ -0,0 +1,46 @@
+from compiler.bytecode import compile_bytecode
+from compiler.parser import parse
+from compiler.profiler import Profiler, count_nodes
+from compiler.stats import phase
+from compiler.tokenizer import tokenize
+
+
+def test_count_nodes() -> None:
+    ast = parse(tokenize("var x = 1; if x < 2 then f(x, -x) else { x }"))
+    assert count_nodes(ast) == 13
+
+
+def test_phases() -> None:
+    with Profiler() as profiler:
+        with phase("tokenize") as p:
+            tokens = p.output = tokenize("var x = 1 + 2; x")
+        with phase("parse") as p:
+            ast = p.output = parse(tokens)
+        with phase("codegen") as p:
+            p.output = compile_bytecode(ast)
+    with phase("not profiled"):
+        pass
+    names = [p.name for p in profiler.phases]
+    assert names == ["tokenize", "parse", "codegen"]
+    tokenize_profile, parse_profile, codegen_profile = profiler.phases
+    assert tokenize_profile.tokens == 8
+    assert parse_profile.nodes == 6
+    assert codegen_profile.instructions is not None
+    assert all(p.wall_seconds > 0 for p in profiler.phases)
+    assert "8 tokens" in profiler.report()
+    assert profiler.to_json()["phases"][1]["nodes"] == 6
+
+
+def test_nested_phase_memory() -> None:
+    with Profiler() as profiler:
+        with phase("outer"):
+            with phase("inner"):
+                data = [0] * 100000
+            del data
+            with phase("small"):
+                pass
+    outer, inner, small = profiler.phases
+    assert (outer.depth, inner.depth, small.depth) == (0, 1, 1)
+    assert inner.peak_memory_bytes >= 800000
+    assert outer.peak_memory_bytes >= inner.peak_memory_bytes
+    assert small.peak_memory_bytes < 100000
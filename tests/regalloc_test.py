@@ -0,0 +1,61 @@
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.ir import IRFunction, generate_ir
+from compiler.liveness import analyze_liveness, live_intervals
+from compiler.regalloc import (
+    Allocation, allocate_registers, callee_saved_registers, call_positions)
+
+
+def check(function: IRFunction, allocation: Allocation) -> None:
+    """Overlapping intervals never share a register, except when one ends
+    where the other starts, and values live across calls are preserved."""
+    intervals = live_intervals(function, analyze_liveness(function))
+    calls = call_positions(function)
+    assert set(allocation.registers) | set(allocation.spilled) == set(intervals)
+    assert not set(allocation.registers) & set(allocation.spilled)
+    in_registers = list(allocation.registers.items())
+    for (i, (a, register)) in enumerate(in_registers):
+        for (b, other) in in_registers[i + 1:]:
+            if register == other:
+                x, y = intervals[a], intervals[b]
+                assert x.end <= y.start or y.end <= x.start, (a, b)
+        if any(intervals[a].start < c < intervals[a].end for c in calls):
+            assert register in callee_saved_registers, a
+
+
+def program_with_live_variables(n: int) -> str:
+    names = [f"v_{chr(ord('a') + i)}" for i in range(n)]
+    declarations = "".join(f"var {v} = read_int();\n" for v in names)
+    return declarations + "print_int(1);\n" + " + ".join(names)
+
+
+def test_few_variables_fit_in_registers() -> None:
+    function = generate_ir(parse(tokenize(program_with_live_variables(4))))
+    allocation = allocate_registers(function)
+    check(function, allocation)
+    assert allocation.spilled == {}
+    # Every variable is live across print_int(1).
+    assert all(allocation.registers[f"v_{c}"] in callee_saved_registers
+               for c in "abcd")
+
+
+def test_spills_when_out_of_registers() -> None:
+    function = generate_ir(parse(tokenize(program_with_live_variables(12))))
+    allocation = allocate_registers(function)
+    check(function, allocation)
+    assert len(allocation.spilled) == 12 - len(callee_saved_registers)
+
+
+def test_loops() -> None:
+    function = generate_ir(parse(tokenize("""
+var a = 1; var b = 2; var c = 3; var d = 4; var e = 5; var f = 6;
+var i = 0;
+while i < 10 do {
+    a = a + b * c - d;
+    if a > e then print_int(a) else f = f + 1;
+    i = i + 1;
+}
+a + f
+""")))
+    allocation = allocate_registers(function)
+    check(function, allocation)
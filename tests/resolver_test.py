@@ -0,0 +1,60 @@
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.resolver import resolve
+from compiler.ast import *
+
+
+def identifiers(ast: Expression) -> list[Identifier]:
+    match ast:
+        case Identifier():
+            return [ast]
+        case Block():
+            return [i for e in ast.expressions for i in identifiers(e)]
+        case BinaryOp():
+            return identifiers(ast.left) + identifiers(ast.right)
+        case VarDeclaration():
+            return identifiers(ast.value)
+        case While():
+            return identifiers(ast.condition) + identifiers(ast.action)
+        case FunctionCall():
+            return [i for e in ast.args for i in identifiers(e)]
+    return []
+
+
+def slots(src: str) -> tuple[int, list[int]]:
+    ast = parse(tokenize(src))
+    size = resolve(ast)
+    return (size, [i.slot for i in identifiers(ast)])
+
+
+def test_declarations_get_own_slots() -> None:
+    assert slots("var a = 1; var b = 2; a + b") == (2, [0, 1])
+
+
+def test_shadowing() -> None:
+    assert slots("var a = 1; { var a = a; a }; a") == (2, [0, 1, 0])
+
+
+def test_reference_before_declaration() -> None:
+    assert slots("var a = 1; { f(a); var a = 2; a }") == (2, [0, 1])
+    assert slots("{ a; var a = 2 }") == (1, [-1])
+
+
+def test_loop_body_reuses_slots() -> None:
+    size, found = slots("""
+var i = 0;
+while i < 10 do {
+    var x = i;
+    i = i + x;
+}
+""")
+    assert size == 2
+    assert found == [0, 0, 0, 0, 1]
+
+
+def test_redeclaration_in_same_block() -> None:
+    assert slots("var a = 1; var a = true; a") == (2, [1])
+
+
+def test_unknown_identifier() -> None:
+    assert slots("a = 1") == (0, [-1])
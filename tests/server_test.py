@@ -0,0 +1,188 @@
+import json
+import multiprocessing
+import os
+import socket
+import time
+from base64 import b64decode
+from pathlib import Path
+from typing import Any
+
+from compiler.cache import CompileCache
+from compiler.server import (
+    AsyncServer, PreforkServer, accept_queue_length, handle_request)
+
+
+def reverse(source_code: str) -> bytes:
+    if source_code == "bad":
+        raise Exception("compile error")
+    if source_code == "crash":
+        os._exit(1)
+    return source_code[::-1].encode()
+
+
+def request(family: socket.AddressFamily, address: str | tuple[str, int],
+            data: dict[str, str]) -> dict[str, str]:
+    with socket.socket(family, socket.SOCK_STREAM) as s:
+        s.connect(address)
+        s.sendall(json.dumps(data).encode())
+        s.shutdown(socket.SHUT_WR)
+        response = b""
+        while chunk := s.recv(65536):
+            response += chunk
+    result: dict[str, str] = json.loads(response)
+    return result
+
+
+def test_handle_request() -> None:
+    response = json.loads(handle_request(
+        b'{"command": "compile", "code": "abc"}', reverse))
+    assert b64decode(response["program"]) == b"cba"
+    assert json.loads(handle_request(b'{"command": "ping"}', reverse)) == {}
+    response = json.loads(handle_request(
+        b'{"command": "compile", "code": "bad"}', reverse))
+    assert "compile error" in response["error"]
+    response = json.loads(handle_request(b'{"command": "x"}', reverse))
+    assert response["error"] == "Unknown command: x"
+
+
+def serve(server: PreforkServer | AsyncServer) -> None:
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def test_prefork_server(tmp_path: Path) -> None:
+    unix_socket = str(tmp_path / "compiler.sock")
+    server = PreforkServer("127.0.0.1", 0, reverse, 3, unix_socket)
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, args=(server,))
+    process.start()
+    try:
+        for i in range(20):
+            code = f"program {i}"
+            response = request(socket.AF_INET, server.address,
+                               {"command": "compile", "code": code})
+            assert b64decode(response["program"]) == code[::-1].encode()
+        response = request(socket.AF_UNIX, unix_socket,
+                           {"command": "compile", "code": "xy"})
+        assert b64decode(response["program"]) == b"yx"
+        assert request(socket.AF_UNIX, unix_socket, {"command": "ping"}) == {}
+        stats = request(socket.AF_INET, server.address, {"command": "stats"})
+        assert stats["requests"] == 23
+        assert stats["in_flight"] == 1
+        assert stats["queue_depth"] == 0
+    finally:
+        process.terminate()
+        process.join(5)
+    assert process.exitcode == 0
+
+
+def test_prefork_queue_depth() -> None:
+    server = PreforkServer("127.0.0.1", 0, reverse, 2)
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, args=(server,))
+    process.start()
+
+    def connect_accepted() -> socket.socket:
+        s = socket.create_connection(server.address)
+        while accept_queue_length(server.listeners) > 0:
+            time.sleep(0.01)
+        return s
+
+    try:
+        # Both workers wait for a request on their connection.
+        with connect_accepted() as first, connect_accepted():
+            waiting = [socket.create_connection(server.address)
+                       for _ in range(3)]
+            first.sendall(json.dumps({"command": "stats"}).encode())
+            first.shutdown(socket.SHUT_WR)
+            stats = json.loads(first.makefile("rb").read())
+            assert stats["queue_depth"] == 3
+            for s in waiting:
+                s.close()
+    finally:
+        process.terminate()
+        process.join(5)
+    assert process.exitcode == 0
+
+
+def framed(data: dict[str, str]) -> bytes:
+    message = json.dumps(data).encode()
+    return len(message).to_bytes(4, "big") + message
+
+
+def read_framed(s: socket.socket) -> dict[str, Any]:
+    def read_exactly(n: int) -> bytes:
+        data = b""
+        while len(data) < n:
+            chunk = s.recv(n - len(data))
+            assert chunk
+            data += chunk
+        return data
+    length = int.from_bytes(read_exactly(4), "big")
+    result: dict[str, Any] = json.loads(read_exactly(length))
+    return result
+
+
+def test_async_server(tmp_path: Path) -> None:
+    unix_socket = str(tmp_path / "compiler.sock")
+    server = AsyncServer("127.0.0.1", 0, reverse, 2, unix_socket)
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, args=(server,))
+    process.start()
+    try:
+        with socket.create_connection(server.address) as s:
+            # Pipeline all requests before reading any response.
+            codes = [f"program {i}" for i in range(50)] + ["bad"]
+            s.sendall(b"".join(framed({"command": "compile", "code": code})
+                               for code in codes))
+            s.sendall(framed({"command": "ping"}))
+            for code in codes[:-1]:
+                response = read_framed(s)
+                assert b64decode(response["program"]) == code[::-1].encode()
+            assert "compile error" in read_framed(s)["error"]
+            assert read_framed(s) == {}
+
+        # Unframed requests still work.
+        response = request(socket.AF_INET, server.address,
+                           {"command": "compile", "code": "abc"})
+        assert b64decode(response["program"]) == b"cba"
+        assert request(socket.AF_UNIX, unix_socket, {"command": "ping"}) == {}
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(unix_socket)
+            s.sendall(framed({"command": "nope"}))
+            assert read_framed(s) == {"error": "Unknown command: nope"}
+            s.sendall(framed({"command": "stats"}))
+            stats = read_framed(s)
+            assert stats["requests"] == 56
+            assert stats["errors"] == 2
+            assert stats["queue_depth"] == 0
+    finally:
+        process.terminate()
+        process.join(5)
+    assert process.exitcode == 0
+
+
+def test_async_server_replaces_broken_pool(tmp_path: Path) -> None:
+    server = AsyncServer("127.0.0.1", 0, reverse, 2,
+                         cache=CompileCache(tmp_path / "cache"))
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, args=(server,))
+    process.start()
+    try:
+        with socket.create_connection(server.address) as s:
+            s.sendall(framed({"command": "compile", "code": "crash"}))
+            assert "BrokenProcessPool" in read_framed(s)["error"]
+            for _ in range(2):
+                s.sendall(framed({"command": "compile", "code": "abc"}))
+                assert b64decode(read_framed(s)["program"]) == b"cba"
+            s.sendall(framed({"command": "stats"}))
+            stats = read_framed(s)
+            assert stats["cache"]["hits"] == 1
+            assert stats["queue_depth"] == 0
+    finally:
+        process.terminate()
+        process.join(5)
+    assert process.exitcode == 0
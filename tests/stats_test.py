@@ -0,0 +1,68 @@
+import json
+import multiprocessing
+
+from compiler.server import handle_request
+from compiler.stats import (ServerStats, bucket, bucket_limit, percentile,
+                            observe_phases, phase)
+
+
+def test_buckets() -> None:
+    assert bucket(0) == 0
+    assert bucket(1e-6) == 0
+    for seconds in [3e-6, 1e-3, 0.25, 7.0]:
+        index = bucket(seconds)
+        assert bucket_limit(index - 1) < seconds <= bucket_limit(index)
+    assert bucket(1e9) == bucket(1e10)
+
+
+def test_percentile() -> None:
+    assert percentile([0, 0, 0], 0.5) is None
+    counts = [0] * 10
+    counts[2] = 90
+    counts[8] = 10
+    assert percentile(counts, 0.5) == bucket_limit(2)
+    assert percentile(counts, 0.9) == bucket_limit(2)
+    assert percentile(counts, 0.95) == bucket_limit(8)
+
+
+def test_phases() -> None:
+    stats = ServerStats()
+    observe_phases(stats.observe)
+    try:
+        with phase("parse"):
+            with phase("not histogrammed"):
+                pass
+    finally:
+        observe_phases(None)
+    with phase("parse"):
+        pass
+    assert stats.snapshot()["latency"]["parse"]["count"] == 1
+
+
+def _requests(stats: ServerStats) -> None:
+    for _ in range(10):
+        handle_request(b'{"command": "ping"}', lambda s: b"", None, stats)
+    handle_request(b'{"command": "nope"}', lambda s: b"", None, stats)
+
+
+def test_aggregates_across_processes() -> None:
+    stats = ServerStats()
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_requests, args=(stats,))
+                 for _ in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    response = json.loads(handle_request(
+        b'{"command": "stats"}', lambda s: b"", None, stats))
+    assert response["requests"] == 34
+    assert response["errors"] == 3
+    assert response["in_flight"] == 1
+    # Without a queue there is no queue depth.
+    assert "queue_depth" not in response
+    assert response["latency"]["request"]["count"] == 33
+    assert response["latency"]["request"]["p99_ms"] > 0
+    assert response["latency"]["codegen"] == {
+        "count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    assert "cache" not in response
@@ -1,4 +1,6 @@
-from compiler.tokenizer import tokenize, Token
+import io
+
+from compiler.tokenizer import tokenize, tokenize_stream, Token, TokenBuffer, fixed_kinds, IDENTIFIER, INT_LITERAL
 from compiler.location import L, Loc
 
 
@@ -116,3 +118,56 @@ def test_all() -> None:
         Token(Loc(4, 6), "int_literal", "8"),
         Token(Loc(4, 7), "punctuation", ","),
     ]
+
+
+def test_stream_matches_string() -> None:
+    for sample in [sample1, sample2, sample4, sample5, sample7, sample8]:
+        expected = tokenize(sample)
+        for chunk_size in [1, 2, 3, 7, 100]:
+            tokens = list(tokenize_stream(io.StringIO(sample), chunk_size))
+            assert [(t.loc.line, t.loc.column, t.type, t.text) for t in tokens] == [
+                (t.loc.line, t.loc.column, t.type, t.text) for t in expected]
+
+
+def test_stream_is_lazy() -> None:
+    class Source(io.StringIO):
+        reads = 0
+
+        def read(self, size: int | None = -1) -> str:
+            self.reads += 1
+            return super().read(size)
+
+    source = Source("var x = 1;\n" * 1000)
+    tokens = tokenize_stream(source, 64)
+    assert next(tokens) == Token(Loc(0, 0), "keyword", "var")
+    assert source.reads == 1
+
+
+def test_location_after_multiline_comment() -> None:
+    assert tokenize("/*\n*/ if") == [Token(Loc(1, 3), "keyword", "if")]
+    assert list(TokenBuffer("/*\n*/ if")) == [
+        Token(Loc(1, 3), "keyword", "if")]
+
+
+def test_token_buffer() -> None:
+    for sample in [sample1, sample2, sample4, sample5, sample6, sample7, sample8]:
+        expected = tokenize(sample)
+        buffer = TokenBuffer(sample)
+        assert len(buffer) == len(expected)
+        assert [(t.loc.line, t.loc.column, t.type, t.text) for t in buffer] == [
+            (t.loc.line, t.loc.column, t.type, t.text) for t in expected]
+
+
+def test_token_kinds() -> None:
+    buffer = TokenBuffer("x = 12 + y;")
+    assert list(buffer.kinds) == [
+        IDENTIFIER,
+        fixed_kinds["="],
+        INT_LITERAL,
+        fixed_kinds["+"],
+        IDENTIFIER,
+        fixed_kinds[";"],
+    ]
+    assert buffer.text(2) == "12"
+    assert buffer[-1] == Token(Loc(0, 10), "punctuation", ";")
+    assert Token(L, "keyword", "while").kind == fixed_kinds["while"]
@@ -0,0 +1,116 @@
+import ast as py
+import importlib.util
+
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.interpreter import interpret
+from compiler.transpiler import (
+    MAGIC, code_from_bytes, code_to_bytes, compile_python, run_python, transpile)
+from benchmarks.generator import ProgramShape, generate_program
+
+
+def run_code(src: str) -> int | bool | None:
+    return run_python(compile_python(parse(tokenize(src))))
+
+
+def test_generated_source() -> None:
+    module = transpile(parse(tokenize("""
+var x = 1;
+{ var x = x + 1; print_int(x); }
+while x < 10 do x = x * 2;
+x
+""")))
+    assert py.unparse(module) == """\
+def program():
+    x_0 = 1
+    x_1 = x_0 + 1
+    write(x_1)
+    while x_0 < 10:
+        x_0 = x_0 * 2
+    return x_0"""
+
+
+def test_values() -> None:
+    assert run_code("7 / 2 + -7 / 2 + 7 % -2") == 3 - 4 - 1
+    assert run_code("1 < 2 and not (3 == 4)") is True
+    assert run_code("if 1 > 2 then 1 else 2") == 2
+    assert run_code("if true then 1") is None
+    assert run_code("var x = 1;") is None
+    assert run_code("{}") is None
+
+
+def test_evaluation_order() -> None:
+    # The block on the right changes x after the left operand read it.
+    assert run_code("var x = 1; x + { x = 10; x }") == 11
+    assert run_code("var x = 1; x * 2 - { x = 10; x }") == -8
+    assert run_code("var x = 1; x < { x = 10; 5 }") is True
+
+
+def test_statements_inside_expressions() -> None:
+    assert run_code("""
+var s = 0;
+var i = 0;
+while { i = i + 1; i <= 3 } do
+    s = s + if i == 2 then { var t = i * 10; t } else i;
+s
+""") == 24
+    assert run_code("""
+var calls = 0;
+var a = false and { calls = calls + 1; true };
+var b = true or { calls = calls + 1; true };
+var c = true and { calls = calls + 1; false };
+var d = false or { calls = calls + 1; true };
+if not a and b and not c and d then calls else -1
+""") == 2
+
+
+def test_print_and_read(capsys: pytest.CaptureFixture[str],
+                        monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("builtins.input", lambda prompt: "21")
+    assert run_code("var x = read_int(); print_bool(x > 20); print_int(x * 2)") is None
+    assert capsys.readouterr().out == "True\n42\n"
+
+
+def test_type_errors_raise_before_running() -> None:
+    with pytest.raises(Exception, match="expected int for \\+ operator"):
+        compile_python(parse(tokenize("if false then 1 + true")))
+
+
+def test_marshal_round_trip() -> None:
+    code = compile_python(parse(tokenize("var x = 6; x * 7")))
+    data = code_to_bytes(code)
+    assert run_python(code_from_bytes(data)) == 42
+    with pytest.raises(Exception, match="not a transpiled program"):
+        code_from_bytes(b"HYBC" + data[4:])
+    old_version = (int.from_bytes(importlib.util.MAGIC_NUMBER[:2], "little")
+                   - 1).to_bytes(2, "little") + importlib.util.MAGIC_NUMBER[2:]
+    with pytest.raises(Exception, match="another Python version"):
+        code_from_bytes(MAGIC + old_version + data[len(MAGIC) + 4:])
+
+
+def test_matches_interpreter() -> None:
+    for seed in range(5):
+        src = generate_program(ProgramShape(size=2_000, seed=seed))
+        assert run_code(src) == interpret(parse(tokenize(src)))
+
+
+def test_unused_values_are_evaluated(monkeypatch: pytest.MonkeyPatch) -> None:
+    inputs = iter(["1", "2", "3", "4"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(inputs))
+    assert run_code("read_int(); read_int()") == 2
+    assert run_code("""
+var i = 0;
+while i < 1 do { i = i + 1; read_int() + 1 };
+read_int()
+""") == 4
+    with pytest.raises(ZeroDivisionError):
+        run_code("var x = 1; 1 / 0; x")
+
+
+def test_caller_tree_is_not_type_checked() -> None:
+    ast = parse(tokenize("if true then 1"))
+    assert run_python(compile_python(ast)) is None
+    assert ast.type is None
+    assert interpret(ast) == 1
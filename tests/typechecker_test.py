@@ -0,0 +1,78 @@
+import pytest
+
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.ast import *
+from compiler.typechecker import typecheck
+from compiler.types import Bool, Int, Type, Unit
+
+
+def check(src: str) -> Type:
+    return typecheck(parse(tokenize(src)))
+
+
+def test_types() -> None:
+    assert check("1 + 2 * 3") == Int
+    assert check("1 < 2 and not false") == Bool
+    assert check("true == false") == Bool
+    assert check("var x = 1;") == Unit
+    assert check("var x = 1; x = 2") == Unit
+    assert check("{ var b = true; b }") == Bool
+    assert check("{}") == Unit
+    assert check("if true then 1 else 2") == Int
+    assert check("if true then 1") == Unit
+    assert check("while false do 1") == Unit
+    assert check("read_int()") == Int
+    assert check("print_bool(1 != 2)") == Unit
+
+
+def test_nodes_are_annotated() -> None:
+    ast = parse(tokenize("var x = 1; if x > 0 then print_int(-x)"))
+    typecheck(ast)
+    assert isinstance(ast, Block)
+    declaration, if_block = ast.expressions
+    assert isinstance(declaration, VarDeclaration)
+    assert isinstance(if_block, IfBlock)
+    assert isinstance(if_block.then, FunctionCall)
+    assert (declaration.type, declaration.value.type) == (Unit, Int)
+    assert (if_block.type, if_block.condition.type) == (Unit, Bool)
+    assert if_block.then.args[0].type == Int
+
+
+def test_shadowing() -> None:
+    assert check("var x = 1; { var x = true; x }") == Bool
+    assert check("var x = 1; { var x = true; }; x") == Int
+
+
+def test_errors() -> None:
+    for (src, message) in [
+        ("x", "line 0, column 0: unknown identifier"),
+        ("1 + true", "line 0, column 4: expected int for \\+ operator"),
+        ("true < 1", "line 0, column 0: expected int for < operator"),
+        ("1 and true", "line 0, column 0: expected bool for and operator"),
+        ("1 == true", "line 0, column 5: expected Int for == operator"),
+        ("print_int(1) == print_int(2)", "line 0, column 0: expected int or bool for == operator"),
+        ("-true", "line 0, column 0: expected int"),
+        ("not 1", "line 0, column 0: expected bool"),
+        ("var x = 1; x = true", "line 0, column 11: tried changing variable type from Int to Bool"),
+        ("1 = 1", "line 0, column 0: not an identifier, expected for ="),
+        ("if 1 then 2", "line 0, column 3: expected bool"),
+        ("if true then 1 else false", "if branches have different types: Int and Bool"),
+        ("while 1 do 2", "line 0, column 6: expected bool"),
+        ("print_int(true)", "line 0, column 10: argument for print_int is not an int"),
+        ("print_bool(1)", "line 0, column 11: argument for print_bool is not a bool"),
+        ("read_int(1)", "invalid number of arguments for read_int"),
+        ("foo()", "unknown function foo"),
+    ]:
+        with pytest.raises(Exception, match=message):
+            check(src)
+
+
+def test_errors_in_code_that_never_runs() -> None:
+    with pytest.raises(Exception, match="expected int"):
+        check("if false then 1 + true")
+
+
+def test_deep_nesting() -> None:
+    assert check("{" * 5000 + "1" + "}" * 5000) == Int
+    assert check("1" + " + 1" * 5000) == Int